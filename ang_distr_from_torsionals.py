@@ -9,14 +9,13 @@ Date: OCT/2016
 
 import argparse
 import os
-import matplotlib as mpl
-mpl.use('Agg')
-import matplotlib.pyplot as plt
+from dicedeps import mpl, plt
 import numpy as np
-from scipy.interpolate import UnivariateSpline
-from distutils.spawn import find_executable
+from shutil import which
 
 def get_pdf(data, nbins):
+  from scipy.interpolate import UnivariateSpline
+
   p, x = np.histogram(data, density = True, bins = nbins)
   x = x[:-1] + (x[1] - x[0])/2   # convert bin edges to centers
   f = UnivariateSpline(x, p, s=0)
@@ -67,7 +66,7 @@ if __name__ == '__main__':
       f.write("%f\t%f\n" % (v, pdf(v)))
 
   # plot
-  if find_executable('latex') and find_executable('dvipng'):
+  if which('latex') and which('dvipng'):
     mpl.rcParams.update({'font.size':18, 'text.usetex':True, 'font.family':'serif', 'ytick.major.pad':4})
   else:
     mpl.rcParams.update({'font.size':18, 'font.family':'serif', 'ytick.major.pad':4})    
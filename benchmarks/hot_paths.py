@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the hot paths of the tools with synthetic DICE fixtures.
+
+Writes a DICE .out, .e12, .gr, .xyz trajectory of boxes, GROMACS .pdb
+trajectory and .txt/.dfr of a chain (sizes multiplied by --scale) and times
+the readers of DiceWin, get_potential_curve, the fit of fit_torsional, the
+conversion of pdb2xyz and the trajectory scripts. For each one, the best wall
+time of a few repetitions, the throughput (frames/s and MB/s of input; the
+"frames" of the .out and .e12 are the steps, of the scan its points and of the
+fit the number of fits) and the peak memory allocated (tracemalloc, in a
+separate run) are reported, and can be written as JSON and compared with a
+previous run to find regressions.
+
+The cache of dicetop is disabled, so every repetition parses its inputs as a
+new run of the tool would.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ['DICETOOLS_CACHE'] = 'off'
+
+import numpy as np
+import dicetop
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+# water, used as the solvent of the boxes
+WATER = [(8, 0.0, 0.0, 0.0, -0.834, 0.1521, 3.1507), (1, 0.9572, 0.0, 0.0, 0.417, 0.0, 0.0),
+         (1, -0.2400, 0.9266, 0.0, 0.417, 0.0, 0.0)]
+# methanol, the solute of the boxes
+METHANOL = [(6, 0.0, 0.0, 0.0, 0.145, 0.066, 3.5), (8, 1.43, 0.0, 0.0, -0.683, 0.17, 3.12),
+            (1, 1.75, 0.9, 0.0, 0.418, 0.0, 0.0)]
+SYMBOLS = {1: 'H', 6: 'C', 8: 'O'}
+
+
+class Sink:
+  """
+  Output that only counts the bytes written.
+  """
+
+  def __init__(self):
+    self.size = 0
+
+  def write(self, data):
+    self.size += len(data)
+    return len(data)
+
+
+def write_txt(fname, molecules):
+  with open(fname, 'w') as f:
+    f.write("*\n%d\n" % len(molecules))
+    for title, atoms in molecules:
+      f.write("%d %s\n" % (len(atoms), title))
+      for k, atom in enumerate(atoms):
+        f.write("%d %d %10.5f %10.5f %10.5f %8.4f %8.4f %8.4f\n" % ((k+1,) + tuple(atom)))
+      f.write("$end\n")
+
+
+def make_chain(directory, natoms):
+  """
+  .txt and .dfr of a zig-zag chain of natoms carbons, with a flexible fragment between two rigid ones sharing the bonds
+  between them, as written by fragGen. The dihedral 3-4-5-6 (around the bond shared by the first two) is scanned.
+  """
+  atoms = [(6, 1.25*i, 0.85*(i % 2), 0.3*((i//2) % 2), 0.0, 0.066, 3.5) for i in range(natoms)]
+  txt = os.path.join(directory, "chain.txt")
+  dfr = os.path.join(directory, "chain.dfr")
+  write_txt(txt, [("chain", atoms)])
+
+  with open(dfr, 'w') as f:
+    f.write("$atoms fragments\n")
+    f.write("1\t[ 1\t2\t3\t4\t5\t] R\n")
+    f.write("2\t[ " + "\t".join(str(i) for i in range(4, natoms-1)) + "\t] F\n")
+    f.write("3\t[ %d\t%d\t%d\t%d\t] R\n" % (natoms-3, natoms-2, natoms-1, natoms))
+    f.write("$end atoms fragments\n\n$fragment connection\n1\t2\n2\t3\n$end fragment connection\n\n$bond\n")
+    f.write("".join("%d %d  \t0.0\t1.5\n" % (i, i+1) for i in range(1, natoms)))
+    f.write("$end bond\n\n$angle\n")
+    f.write("".join("%d %d %d   \tharmonic\t50.0\t109.5\n" % (i, i+1, i+2) for i in range(1, natoms-1)))
+    f.write("$end angle\n\n$dihedral\n")
+    f.write("".join("%d %d %d %d   \tAMBER\t1.0\t0.5\t0.3\t0.0\t180.0\t0.0\n" % (i, i+1, i+2, i+3) for i in range(1, natoms-2)))
+    f.write("$end dihedral\n\n$improper dihedral\n$end improper dihedral\n")
+  return txt, dfr
+
+
+def make_out(fname, nsteps, rng):
+  labels = ["NMOVE", "E", "ELJ", "ECL", "EINTRA", "ACCEPT", "DENS"]
+  values = rng.normal(size=(nsteps, len(labels)-1))
+  with open(fname, 'w') as f:
+    f.write(" Synthetic DICE output\n\n Number of MC steps                     = %12d\n\n" % nsteps)
+    f.write("".join("%12s" % lab for lab in labels) + "\n")
+    f.write(" " + "-"*84 + "\n")
+    for step in range(0, nsteps, 10000):
+      rows = values[step:step+10000]
+      f.write("".join(("%12d" + "%12.4f"*rows.shape[1] + "  #   \n") % ((step+k+1,) + tuple(row)) for k, row in enumerate(rows)))
+    f.write("\n End of the simulation\n")
+
+
+def make_eij(fname, nsteps, nblocks, rng):
+  header = "NMOVE      E12       ELJ       ECL\n"
+  with open(fname, 'w') as f:
+    f.write(header)
+    for block in range(nblocks):
+      if block:
+        f.write(header)
+      values = rng.normal(size=(nsteps, 3))
+      f.write("".join("%9d %9.3f %9.3f %9.3f\n" % ((k+1,) + tuple(row)) for k, row in enumerate(values)))
+
+
+def make_gr(fname, npairs, npoints):
+  r = 0.05 * np.arange(1, npoints+1)
+  with open(fname, 'w') as f:
+    f.write(" Synthetic RDFs\n")
+    for pair in range(npairs):
+      f.write("# RDF between site %d C of molecule type 1 and 1 O of molecule type 2\n" % (pair+1))
+      gr = 1 + np.exp(-(r - 3)**2) * np.sin(r + pair)
+      f.write("".join("%12.4f%12.5f%12.5f\n" % row for row in zip(r, gr, np.cumsum(gr) * 0.01)))
+      # a blank line ends the pair, as in the .gr of DICE
+      f.write("\n")
+
+
+def box_frames(nframes, nwater, rng):
+  """
+  Yield the box lengths and coordinates (centered in the origin) of frames with a methanol and nwater waters.
+  """
+  side = (nwater * 30.) ** (1/3.)
+  box = np.array([side, side, side])
+  offsets = np.array([a[1:4] for a in METHANOL + WATER*nwater])
+  for _ in range(nframes):
+    centers = rng.uniform(-side/2, side/2, size=(nwater+1, 3))
+    centers = np.vstack((np.repeat(centers[:1], 3, axis=0), np.repeat(centers[1:], 3, axis=0)))
+    yield box, centers + offsets
+
+
+def make_xyz(fname, nframes, nwater, rng):
+  symbols = [SYMBOLS[a[0]] for a in METHANOL + WATER*nwater]
+  line = "%4s %14.6f %14.6f %14.6f\n"
+  with open(fname, 'w') as f:
+    for k, (box, coords) in enumerate(box_frames(nframes, nwater, rng)):
+      f.write("%12d\n Configuration number :%9dL = %10.4f%10.4f%10.4f\n" % ((len(coords), 10*k) + tuple(box)))
+      f.write("".join(line % (s, x, y, z) for s, (x, y, z) in zip(symbols, coords.tolist())))
+
+
+def make_pdb(fname, nframes, nwater, rng):
+  atoms = METHANOL + WATER*nwater
+  line = "ATOM  %5d %4s %3s %5d    %8.3f%8.3f%8.3f  1.00  0.00          %2s\n"
+  names = [(SYMBOLS[a[0]], "MOL" if i < 3 else "SOL", 1 + (i+2)//3) for i, a in enumerate(atoms)]
+  with open(fname, 'w') as f:
+    for k, (box, coords) in enumerate(box_frames(nframes, nwater, rng)):
+      coords = coords + box/2
+      f.write("REMARK    GENERATED BY TRJCONV\nTITLE     Synthetic t= %.5f step= %d\n" % (k, 10*k))
+      f.write("REMARK    THIS IS A SIMULATION BOX\n")
+      f.write("CRYST1%9.3f%9.3f%9.3f  90.00  90.00  90.00 P 1           1\nMODEL %8d\n" % (tuple(box) + (k+1,)))
+      f.write("".join(line % ((i+1) % 100000, s, res, resid % 100000, x, y, z, s)
+                      for i, ((s, res, resid), (x, y, z)) in enumerate(zip(names, coords.tolist()))))
+      f.write("TER\nENDMDL\n")
+
+
+def make_fixtures(directory, scale, seed=0):
+  """
+  Write all the fixtures in directory. Return their names and sizes.
+  """
+  rng = np.random.default_rng(seed)
+  n = lambda x: max(1, int(round(x * scale)))
+  sizes = {'out_steps': n(100000), 'eij_steps': n(50000), 'eij_blocks': 4, 'gr_pairs': n(20), 'gr_points': 400,
+           'frames': n(400), 'waters': 300, 'chain_atoms': 30, 'scan_points': n(360), 'fits': n(20)}
+  fix = {'sizes': sizes}
+  fix['out'] = os.path.join(directory, "run.out")
+  make_out(fix['out'], sizes['out_steps'], rng)
+  fix['eij'] = os.path.join(directory, "run.e12")
+  make_eij(fix['eij'], sizes['eij_steps'], sizes['eij_blocks'], rng)
+  fix['gr'] = os.path.join(directory, "run.gr")
+  make_gr(fix['gr'], sizes['gr_pairs'], sizes['gr_points'])
+  fix['xyz'] = os.path.join(directory, "boxes.xyz")
+  make_xyz(fix['xyz'], sizes['frames'], sizes['waters'], rng)
+  fix['pdb'] = os.path.join(directory, "traj.pdb")
+  make_pdb(fix['pdb'], sizes['frames'], sizes['waters'], rng)
+  fix['system'] = os.path.join(directory, "system.txt")
+  write_txt(fix['system'], [("methanol", METHANOL), ("water", WATER)])
+  fix['txt'], fix['dfr'] = make_chain(directory, sizes['chain_atoms'])
+  return fix
+
+
+def case_read_out(fix):
+  from dicereaders import read_out
+  read_out(fix['out'])
+  return fix['out'], fix['sizes']['out_steps']
+
+
+def case_read_eij(fix):
+  from dicereaders import read_dice_file
+  read_dice_file(fix['eij'])
+  return fix['eij'], fix['sizes']['eij_steps'] * fix['sizes']['eij_blocks']
+
+
+def case_read_gr(fix):
+  from dicereaders import read_dice_file
+  read_dice_file(fix['gr'])
+  return fix['gr'], None
+
+
+def case_potential_curve(fix):
+  from plot_eff_tors import get_potential_curve
+  points = np.linspace(-np.pi, np.pi, fix['sizes']['scan_points'], endpoint=False)
+  with contextlib.redirect_stdout(io.StringIO()):
+    get_potential_curve(fix['txt'], fix['dfr'], 3, 4, 5, 6, points, "", False, False, False, False)
+  return None, len(points)
+
+
+def case_fit_torsional(fix):
+  from fit_torsional import fit_func, fit_torsions
+  rng = np.random.default_rng(1)
+  phi = np.linspace(-np.pi, np.pi, 72)
+  f0s = [0., 0., 0., 0., 0., 0., np.pi/3, 2*np.pi/3, np.pi]
+  target = [1.2, -0.4, 0.8, 0.3, 0.5, -0.2, 1.2, -0.4, 0.8]
+  weights = np.ones(len(phi))
+  weights[::12] = 0.1
+  for k in range(fix['sizes']['fits']):
+    en = fit_func(phi, *target, *f0s) + rng.normal(scale=0.05, size=len(phi))
+    # the first and the last dihedral share their parameters in half of the fits, as found by equal_parameters
+    fit_torsions(phi, en, [0.5]*9, f0s, 5., weights, [[0, 2]] if k % 2 else False)
+  return None, fix['sizes']['fits']
+
+
+def case_pdb2xyz(fix):
+  import pdb2xyz
+  natoms = 3 * (fix['sizes']['waters'] + 1)
+  elements = [SYMBOLS[a[0]] for a in METHANOL + WATER*fix['sizes']['waters']]
+  if hasattr(pdb2xyz, 'convert'):
+    with open(fix['pdb'], 'rb') as f:
+      pdb2xyz.convert(f, Sink(), natoms, elements)
+  else:
+    # the reader of a configuration at a time, before the conversion by frames
+    with open(fix['pdb'], 'r') as f:
+      out = Sink()
+      while not pdb2xyz.process_config(f, out, natoms, elements):
+        pass
+  return fix['pdb'], fix['sizes']['frames']
+
+
+def case_separate_configs(fix):
+  from diceframes import FrameSelection
+  from separate_configs_box import print_configs
+  print_configs(fix['xyz'], FrameSelection(stride=10), Sink())
+  return fix['xyz'], fix['sizes']['frames']
+
+
+def case_get_solute(fix):
+  from get_solute_xyz import get_solute
+  get_solute(fix['xyz'], 3, Sink())
+  return fix['xyz'], fix['sizes']['frames']
+
+
+def case_get_conf_traj(fix):
+  from diceframes import find_configurations
+  find_configurations(fix['xyz'], range(0, 10*fix['sizes']['frames'], fix['sizes']['frames']))
+  return fix['xyz'], fix['sizes']['frames']
+
+
+def case_compute_rdf(fix):
+  from diceboxes import BoxLayout
+  from diceframes import FrameSelection
+  from compute_rdf import compute_rdfs
+  layout = BoxLayout(fix['system'], [1, fix['sizes']['waters']])
+  pairs = [(layout.site(1, 2), layout.site(2, 1), False), (layout.site(2, 1), layout.site(2, 1), True)]
+  compute_rdfs(fix['xyz'], FrameSelection(), pairs, rmax=8., nproc=1)
+  return fix['xyz'], fix['sizes']['frames']
+
+
+def case_solvation_shell(fix):
+  from diceboxes import BoxLayout
+  from diceframes import FrameSelection, read_frames
+  from solvation_shell import Shell, chunks, shell_chunk
+  shell = Shell(BoxLayout(fix['system'], [1, fix['sizes']['waters']]), 1, 2)
+  for task in chunks(read_frames(fix['xyz'], FrameSelection()), shell, 100):
+    shell_chunk(task)
+  return fix['xyz'], fix['sizes']['frames']
+
+
+CASES = {
+    'read_out': case_read_out,
+    'read_eij': case_read_eij,
+    'read_gr': case_read_gr,
+    'get_potential_curve': case_potential_curve,
+    'fit_torsional': case_fit_torsional,
+    'pdb2xyz': case_pdb2xyz,
+    'separate_configs_box': case_separate_configs,
+    'get_solute_xyz': case_get_solute,
+    'get_conf_traj': case_get_conf_traj,
+    'compute_rdf': case_compute_rdf,
+    'solvation_shell': case_solvation_shell,
+}
+
+
+def measure(case, fix, repeat):
+  """
+  Best wall time of repeat runs of case, throughput and peak memory (MB) allocated in one more run.
+  """
+  times = []
+  for _ in range(repeat):
+    dicetop._memory.clear()
+    start = time.perf_counter()
+    fname, frames = case(fix)
+    times.append(time.perf_counter() - start)
+
+  dicetop._memory.clear()
+  tracemalloc.start()
+  case(fix)
+  peak = tracemalloc.get_traced_memory()[1]
+  tracemalloc.stop()
+
+  best = min(times)
+  result = {'seconds': round(best, 4), 'peak_mb': round(peak / 2**20, 2)}
+  if fname:
+    size = os.path.getsize(fname) / 2**20
+    result['input_mb'] = round(size, 2)
+    result['mb_per_s'] = round(size / best, 2)
+  if frames:
+    result['frames'] = frames
+    result['frames_per_s'] = round(frames / best, 1)
+  return result
+
+
+def compare(results, baseline, tolerance):
+  """
+  Names of the cases slower than in the baseline by more than tolerance (a fraction of the time of the baseline).
+  """
+  slower = []
+  for name, result in results.items():
+    old = baseline.get('cases', {}).get(name, {}).get('seconds')
+    if old and 'seconds' in result:
+      result['vs_baseline'] = round(result['seconds'] / old, 3)
+      if result['seconds'] > old * (1 + tolerance):
+        slower.append(name)
+  return slower
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Times the hot paths of the tools with synthetic DICE fixtures and reports the throughput and peak memory.")
+  parser.add_argument("cases", nargs='*', metavar="case", help="cases to run (default: all), among " + ", ".join(sorted(CASES)))
+  parser.add_argument("--scale", type=float, default=1., help="multiply the size of the fixtures by this (default = 1)")
+  parser.add_argument("--repeat", type=int, default=3, help="repetitions of each measure, the best is reported (default = 3)")
+  parser.add_argument("--fixtures", help="write the fixtures to this directory and keep them (default: a temporary directory)")
+  parser.add_argument("--json", help="also write the results to this file")
+  parser.add_argument("--baseline", help="JSON of a previous run: fail if a case became slower than it by more than --tolerance")
+  parser.add_argument("--tolerance", type=float, default=0.2, help="fraction of the time of the baseline accepted as noise (default = 0.2)")
+  args = parser.parse_args()
+
+  unknown = [name for name in args.cases if name not in CASES]
+  if unknown:
+    parser.error("unknown cases: " + ", ".join(unknown))
+
+  directory = args.fixtures or tempfile.mkdtemp(prefix="dicetools_bench_")
+  os.makedirs(directory, exist_ok=True)
+  try:
+    start = time.perf_counter()
+    fix = make_fixtures(directory, args.scale)
+    print("Fixtures written to {} in {:.1f} s\n".format(directory, time.perf_counter() - start))
+
+    print("{:<24}{:>10}{:>12}{:>12}{:>10}".format('case', 's', 'frames/s', 'MB/s', 'peak MB'))
+    results = {}
+    for name in args.cases or CASES:
+      try:
+        result = measure(CASES[name], fix, args.repeat)
+      except (Exception, SystemExit) as e:
+        results[name] = {'error': '{}: {}'.format(type(e).__name__, e)}
+        print("{:<24}{:>10}  failed: {}".format(name, '-', results[name]['error']))
+        continue
+      results[name] = result
+      print("{:<24}{:>10.3f}{:>12}{:>12}{:>10.1f}".format(name, result['seconds'], result.get('frames_per_s', '-'),
+                                                        result.get('mb_per_s', '-'), result['peak_mb']))
+  finally:
+    if not args.fixtures:
+      shutil.rmtree(directory, ignore_errors=True)
+
+  report = {'python': platform.python_version(), 'numpy': np.__version__, 'machine': platform.machine(),
+            'scale': args.scale, 'repeat': args.repeat, 'sizes': fix['sizes'], 'cases': results}
+  if resource:
+    # kilobytes in Linux
+    report['maxrss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024., 1)
+
+  failed = any('error' in result for result in results.values())
+  if args.baseline:
+    with open(args.baseline, 'r') as f:
+      slower = compare(results, json.load(f), args.tolerance)
+    report['slower'] = slower
+    if slower:
+      print("\nSlower than the baseline: " + ", ".join(slower))
+      failed = True
+
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump(report, f, indent=2)
+
+  sys.exit(1 if failed else 0)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark of the command-line tools.
+
+Runs every tool with --help and imports every module in a fresh interpreter,
+reporting the best wall time of a few repetitions and the heavy dependencies
+(matplotlib, scipy, openbabel, pandas, PyQt5, MDAnalysis, mdtraj) that were
+loaded. None of them should be needed just to start a tool, so the benchmark
+fails if any is imported or if a tool takes more than --max-ms to start.
+"""
+
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = ['matplotlib', 'scipy', 'pybel', 'openbabel', 'pandas', 'PyQt5', 'MDAnalysis', 'mdtraj', 'rmsd']
+
+# the GUI needs PyQt5 and matplotlib to build the window
+SKIP = ['dicewin']
+
+PROBE = """
+import runpy, sys
+sys.argv = [{script!r}, '--help']
+try:
+  {action}
+except SystemExit:
+  pass
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+sys.__stdout__.write('\\n@@' + ','.join(heavy) + '\\n')
+"""
+
+
+def tools():
+  names = sorted(os.path.splitext(os.path.basename(f))[0] for f in glob.glob(os.path.join(ROOT, '*.py')))
+  return [name for name in names if name not in SKIP]
+
+
+def probe(name, mode):
+  """
+  Run the tool with --help (mode 'help') or only import it (mode 'import') in a new interpreter.
+  Return the wall time in ms and the heavy modules loaded.
+  """
+  script = os.path.join(ROOT, name + '.py')
+  if mode == 'help':
+    action = "runpy.run_path({!r}, run_name='__main__')".format(script)
+  else:
+    action = "import {}".format(name)
+  code = PROBE.format(script=script, action=action, heavy=HEAVY)
+
+  start = time.perf_counter()
+  proc = subprocess.run([sys.executable, '-c', code], cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                        universal_newlines=True)
+  elapsed = (time.perf_counter() - start) * 1000
+
+  marker = proc.stdout.rfind('@@')
+  if marker < 0:
+    error = proc.stderr.strip().splitlines()
+    return elapsed, None, error[-1] if error else 'exit code {}'.format(proc.returncode)
+  heavy = [m for m in proc.stdout[marker + 2:].strip().split(',') if m]
+  return elapsed, heavy, None
+
+
+def baseline(repeat):
+  start = time.perf_counter()
+  for _ in range(repeat):
+    subprocess.run([sys.executable, '-c', 'pass'])
+  return (time.perf_counter() - start) * 1000 / repeat
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Measures the start-up time of the tools and checks that they do not import heavy dependencies before they are needed.")
+  parser.add_argument("tools", nargs='*', help="tools to be measured (default: all the scripts of the repository)")
+  parser.add_argument("--mode", choices=['help', 'import'], default='help', help="run the tools with --help or just import them (default = help)")
+  parser.add_argument("--repeat", type=int, default=3, help="repetitions of each measure, the best is reported (default = 3)")
+  parser.add_argument("--max-ms", type=float, help="fail if a tool takes longer than this to start (excluding the interpreter start-up)")
+  parser.add_argument("--json", help="also write the results to this file")
+  args = parser.parse_args()
+
+  python_ms = baseline(args.repeat)
+  print("Interpreter start-up: {:.1f} ms (subtracted below)\n".format(python_ms))
+  print("{:<32}{:>10}  {}".format('tool', 'ms', 'heavy modules'))
+
+  results = {}
+  failed = False
+  for name in args.tools or tools():
+    times = []
+    for _ in range(args.repeat):
+      elapsed, heavy, error = probe(name, args.mode)
+      if error:
+        break
+      times.append(elapsed)
+
+    if error:
+      results[name] = {'error': error}
+      print("{:<32}{:>10}  {}".format(name, '-', 'failed: ' + error))
+      failed = True
+      continue
+
+    ms = max(min(times) - python_ms, 0.0)
+    results[name] = {'ms': round(ms, 1), 'heavy': heavy}
+    slow = args.max_ms is not None and ms > args.max_ms
+    failed = failed or slow or bool(heavy)
+    print("{:<32}{:>10.1f}  {}{}".format(name, ms, ', '.join(heavy) or '-', '  (too slow)' if slow else ''))
+
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump({'python_ms': round(python_ms, 1), 'mode': args.mode, 'tools': results}, f, indent=2)
+
+  sys.exit(1 if failed else 0)
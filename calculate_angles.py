@@ -8,12 +8,7 @@ Date: OCT/2016
 """
 
 import argparse
-try: 
-  import pybel
-  import openbabel
-except:
-  from openbabel import pybel
-  from openbabel import openbabel
+from dicedeps import openbabel, pybel
 import os
 
 def get_dihedrals(fname, a1, a2, a3):
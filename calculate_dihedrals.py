@@ -9,12 +9,7 @@ Date: JUL/2016
 
 import argparse
 import sys
-try: 
-  import pybel
-  import openbabel
-except:
-  from openbabel import pybel
-  from openbabel import openbabel
+from dicedeps import openbabel, pybel
 import os
 
 def get_dihedrals(fname, a1, a2, a3, a4):
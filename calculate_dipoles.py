@@ -9,34 +9,22 @@ Date: NOV/2016
 
 import argparse
 import numpy as np
-try:
-  import pybel
-except:
-  from openbabel import pybel
+from dicedeps import pybel
+from dicetop import load_txt
 
 def eA_to_D(val):
   return val/0.20819434
 
 def get_dipole_moments(xyzfile, txtfile):
   # read charges from .txt file
-  charges = {}
-  with open(txtfile,'r') as f:
-    f.readline()
-    f.readline()
-    natoms = int(f.readline().split()[0])
-    for i in range(natoms):
-      line = f.readline()
-      charges[i] = float(line.split()[5])
+  charges = load_txt(txtfile).molecules[0].charges
 
   # for every configuration calculate the dipole moment
   for mol in pybel.readfile("xyz", xyzfile):
     mol.OBMol.Center()
-    tdip = np.zeros(3)
-    for i, atom in enumerate(mol):
-      # get dipole
-      dipole = [charges[i] * x for x in atom.coords]
-      # sum the dipoles
-      tdip = np.add(tdip, dipole)
+    coords = np.array([atom.coords for atom in mol])
+    # sum the dipoles of the atoms
+    tdip = charges[:len(coords)] @ coords
 
     # print to screen
     print("%f" % np.linalg.norm(eA_to_D(tdip)))
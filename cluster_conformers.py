@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Clusters the conformations of a solute trajectory (e.g. the output of
+get_solute_xyz.py) by their dihedral angles, to find the representative
+conformations of a CBMC run.
+
+Each frame is described by the cosine and sine of its dihedrals, so the
+periodicity of the angles is respected. The clusters are found in a grid of
+rotamer states (each dihedral split in a number of bins) or by mini-batch
+k-means. The dihedrals are computed for chunks of frames and kept in a
+temporary file, so the memory used does not grow with the number of frames.
+
+Writes the population and the center of each cluster, the cluster of each
+frame and the medoid of each cluster (the frame closest to the center), read
+directly from the trajectory.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import numpy as np
+from diceframes import FrameSelection, add_selection_arguments, read_frames, read_series, selection_from_args
+from dicetop import load_dfr
+
+CHUNK = 20000
+
+
+def parse_coordinates(blocks):
+  """
+  Coordinates (nframes x natoms x 3) of a list of xyz frames (bytes) with the same number of atoms.
+  """
+  natoms = int(blocks[0].split(b"\n", 1)[0])
+  atoms = b"".join(block.split(b"\n", 2)[2] for block in blocks)
+  table = np.array(atoms.split()).reshape(len(blocks), natoms, 4)
+  return table[:, :, 1:].astype(np.float64)
+
+
+def dihedral_angles(coords, dihedrals):
+  """
+  Dihedral angles (degrees, in [-180, 180]) of all the frames of coords for the dihedrals (n x 4 array of 0-based
+  atoms).
+  """
+  p0, p1, p2, p3 = [coords[:, dihedrals[:, i], :] for i in range(4)]
+  b0 = p0 - p1
+  b1 = p2 - p1
+  b2 = p3 - p2
+  b1 /= np.linalg.norm(b1, axis=2, keepdims=True)
+  v = b0 - np.sum(b0*b1, axis=2, keepdims=True)*b1
+  w = b2 - np.sum(b2*b1, axis=2, keepdims=True)*b1
+  x = np.sum(v*w, axis=2)
+  y = np.sum(np.cross(b1, v)*w, axis=2)
+  return np.degrees(np.arctan2(y, x))
+
+
+def dfr_dihedrals(dfrfile):
+  """
+  One dihedral (0-based atoms) around each bond connecting two fragments of the .dfr, the first of the file.
+  """
+  dfr = load_dfr(dfrfile)
+  fragments = dfr.fragments_by_id()
+  middles = set()
+  for f1, f2 in dfr.connections.atoms.tolist():
+    shared = np.intersect1d(fragments[f1], fragments[f2])
+    if len(shared) == 2:
+      middles.add(tuple(sorted(shared.tolist())))
+
+  dihedrals = []
+  for atoms in dfr.dihedrals.atoms.tolist():
+    middle = tuple(sorted(atoms[1:3]))
+    if middle in middles:
+      middles.discard(middle)
+      dihedrals.append(atoms)
+  return np.array(dihedrals, dtype=np.int64).reshape(-1, 4) - 1
+
+
+def features(angles):
+  rad = np.radians(angles)
+  return np.hstack((np.cos(rad), np.sin(rad)))
+
+
+def chunks(angles):
+  for first in range(0, len(angles), CHUNK):
+    yield first, np.asarray(angles[first:first+CHUNK], dtype=np.float64)
+
+
+def write_angles(trajfile, selection, dihedrals, out):
+  """
+  Write the dihedrals of the frames selected to out (float32, one row per frame). Return the selected frames.
+  """
+  frames = []
+  blocks = []
+
+  def flush():
+    if blocks:
+      out.write(dihedral_angles(parse_coordinates(blocks), dihedrals).astype(np.float32).tobytes())
+      del blocks[:]
+
+  for frame, block in read_frames(trajfile, selection):
+    frames.append(frame)
+    blocks.append(block)
+    if len(blocks) == CHUNK:
+      flush()
+  flush()
+  return np.array(frames, dtype=np.int64)
+
+
+def grid_states(angles, nbins):
+  # the bins are centered in 180 (trans) and its multiples of 360/nbins
+  width = 360. / nbins
+  return (np.floor((angles - 180. + width/2.) / width).astype(np.int64) % nbins).astype(np.uint8)
+
+
+def grid_clusters(angles, nbins):
+  """
+  Clusters of the rotamer states. Return a function giving the cluster of the frames of a chunk of angles, the
+  number of clusters.
+  """
+  counts = {}
+  for _, chunk in chunks(angles):
+    states, inverse, nstate = np.unique(grid_states(chunk, nbins), axis=0, return_inverse=True, return_counts=True)
+    for state, n in zip(states, nstate):
+      key = state.tobytes()
+      counts[key] = counts.get(key, 0) + int(n)
+
+  # clusters in decreasing order of population
+  order = sorted(counts, key=lambda key: -counts[key])
+  cluster_of = {key: i for i, key in enumerate(order)}
+
+  def assign(chunk):
+    states, inverse = np.unique(grid_states(chunk, nbins), axis=0, return_inverse=True)
+    return np.array([cluster_of[state.tobytes()] for state in states], dtype=np.int64)[inverse.ravel()]
+
+  return assign, len(order)
+
+
+def kmeans_clusters(angles, k, batch=1000, iterations=200, seed=0):
+  """
+  Mini-batch k-means (Sculley, 2010) of the cosines and sines of the angles. Return a function giving the cluster of
+  the frames of a chunk of angles, the number of clusters.
+  """
+  rng = np.random.default_rng(seed)
+  n = len(angles)
+  k = min(k, n)
+
+  # k-means++ initialization with a sample of the frames
+  sample = features(np.asarray(angles[np.sort(rng.choice(n, min(n, 50*k), replace=False))], dtype=np.float64))
+  centers = [sample[rng.integers(len(sample))]]
+  dist = np.sum((sample - centers[0])**2, axis=1)
+  for _ in range(1, k):
+    prob = dist / dist.sum() if dist.sum() > 0 else None
+    centers.append(sample[rng.choice(len(sample), p=prob)])
+    dist = np.minimum(dist, np.sum((sample - centers[-1])**2, axis=1))
+  centers = np.array(centers)
+
+  counts = np.zeros(k)
+  for _ in range(iterations):
+    x = features(np.asarray(angles[np.sort(rng.choice(n, min(n, batch), replace=False))], dtype=np.float64))
+    nearest = np.argmin(((x[:, None, :] - centers[None, :, :])**2).sum(axis=2), axis=1)
+    for c, xi in zip(nearest, x):
+      counts[c] += 1
+      centers[c] += (xi - centers[c]) / counts[c]
+
+  def assign(chunk):
+    x = features(chunk)
+    return np.argmin(((x[:, None, :] - centers[None, :, :])**2).sum(axis=2), axis=1)
+
+  return assign, k
+
+
+def summarize(angles, assign, nclusters):
+  """
+  Cluster of each frame, population, circular mean of the angles and medoid (index of the frame closest to the
+  mean) of each cluster, in decreasing order of population.
+  """
+  labels = np.empty(len(angles), dtype=np.int64)
+  population = np.zeros(nclusters, dtype=np.int64)
+  sums = np.zeros((nclusters, 2*angles.shape[1]))
+  for first, chunk in chunks(angles):
+    labels[first:first+len(chunk)] = assign(chunk)
+    lab = labels[first:first+len(chunk)]
+    population += np.bincount(lab, minlength=nclusters)
+    np.add.at(sums, lab, features(chunk))
+
+  ndih = angles.shape[1]
+  center = np.degrees(np.arctan2(sums[:, ndih:], sums[:, :ndih]))
+  unit = features(center)
+
+  best = np.full(nclusters, np.inf)
+  medoid = np.full(nclusters, -1, dtype=np.int64)
+  for first, chunk in chunks(angles):
+    lab = labels[first:first+len(chunk)]
+    dist = np.sum((features(chunk) - unit[lab])**2, axis=1)
+    order = np.lexsort((dist, lab))
+    lab_sorted = lab[order]
+    firsts = order[np.r_[True, lab_sorted[1:] != lab_sorted[:-1]]]
+    for i in firsts:
+      if dist[i] < best[lab[i]]:
+        best[lab[i]] = dist[i]
+        medoid[lab[i]] = first + i
+
+  # renumber in decreasing order of population, dropping the empty clusters
+  order = [c for c in np.argsort(-population, kind='stable') if population[c] > 0]
+  newlabel = np.full(nclusters, -1, dtype=np.int64)
+  newlabel[order] = np.arange(len(order))
+  return newlabel[labels], population[order], center[order], medoid[order]
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Clusters the conformations of a solute trajectory by their dihedral angles.")
+  parser.add_argument("trajfile", nargs='?', help="the xyz trajectory of the solute (e.g. from get_solute_xyz.py)")
+  parser.add_argument("-d", "--dihedral", type=int, nargs=4, action='append', metavar=('A1', 'A2', 'A3', 'A4'), help="atoms (1-based) of a dihedral, can be repeated")
+  parser.add_argument("--dfr", help="use one dihedral around each bond connecting fragments of this .dfr")
+  parser.add_argument("--dat", nargs='+', help="use the dihedrals already calculated in these files (one per dihedral, one angle per frame, as written by calculate_dihedrals.py) instead of the trajectory")
+  parser.add_argument("-m", "--method", choices=['grid', 'kmeans'], default='grid', help="grid of rotamer states or mini-batch k-means (default = grid)")
+  parser.add_argument("--bins", type=int, default=3, help="states of each dihedral in the grid method, centered in 180 (default = 3: trans, gauche+ and gauche-)")
+  parser.add_argument("-k", "--clusters", type=int, default=10, help="number of clusters of k-means (default = 10)")
+  parser.add_argument("--seed", type=int, default=0, help="seed of the random numbers used by k-means (default = 0)")
+  parser.add_argument("--extract-from", help="trajectory the medoids are extracted from (e.g. the whole boxes, with the same frames of trajfile), default is trajfile")
+  parser.add_argument("-o", "--output", default="clusters", help="base name of the outputs (default = clusters)")
+  add_selection_arguments(parser)
+  args = parser.parse_args()
+
+  if not args.dat and not (args.trajfile and (args.dihedral or args.dfr)):
+    parser.error("give the trajectory and the dihedrals (-d or --dfr), or the angles with --dat")
+
+  tmp = None
+  if args.dat:
+    angles = np.column_stack([read_series(fname) for fname in args.dat])
+    selection = selection_from_args(args)
+    frames = selection.indexes(len(angles))
+    angles = angles[frames]
+  else:
+    dihedrals = np.array(args.dihedral or [], dtype=np.int64).reshape(-1, 4) - 1
+    if args.dfr:
+      dihedrals = np.vstack((dihedrals, dfr_dihedrals(args.dfr)))
+    if not len(dihedrals):
+      sys.exit("No dihedrals were found to describe the conformations")
+
+    # the angles are kept in a temporary file, read in chunks
+    fd, tmp = tempfile.mkstemp(suffix='.dihedrals')
+    with os.fdopen(fd, 'wb') as out:
+      frames = write_angles(args.trajfile, selection_from_args(args), dihedrals, out)
+    angles = np.memmap(tmp, dtype=np.float32, mode='r', shape=(len(frames), len(dihedrals))) if len(frames) else np.zeros((0, len(dihedrals)))
+
+  if not len(frames):
+    sys.exit("No frames were selected")
+
+  try:
+    if args.method == 'grid':
+      assign, nclusters = grid_clusters(angles, args.bins)
+    else:
+      assign, nclusters = kmeans_clusters(angles, args.clusters, seed=args.seed)
+    labels, population, center, medoid = summarize(angles, assign, nclusters)
+  finally:
+    if tmp:
+      del angles
+      os.remove(tmp)
+
+  with open(args.output+"_clusters.dat", 'w') as f:
+    f.write("# {} frames, {} clusters ({})\n".format(len(frames), len(population), args.method))
+    f.write("# cluster  population  fraction  medoid  " + "  ".join("phi%d" % (i+1) for i in range(center.shape[1])) + "\n")
+    for c in range(len(population)):
+      f.write("%9d %11d %9.5f %7d  " % (c+1, population[c], population[c]/len(frames), frames[medoid[c]]) + "  ".join("%8.2f" % x for x in center[c]) + "\n")
+
+  with open(args.output+"_frames.dat", 'w') as f:
+    f.write("# frame cluster\n")
+    for first in range(0, len(frames), CHUNK):
+      np.savetxt(f, np.column_stack((frames[first:first+CHUNK], labels[first:first+CHUNK]+1)), fmt="%d")
+
+  source = args.extract_from or args.trajfile
+  if source:
+    # medoids in the order of the clusters
+    medoid_frames = frames[medoid]
+    blocks = dict(read_frames(source, FrameSelection(frames=medoid_frames)))
+    with open(args.output+"_medoids.xyz", 'wb') as f:
+      for frame in medoid_frames.tolist():
+        f.write(blocks[frame])
+
+  print("%d frames in %d clusters, written to %s_clusters.dat" % (len(frames), len(population), args.output))
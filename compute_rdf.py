@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Computes site-site radial distribution functions from the boxes of a DICE
+.xyz trajectory, for pairs of sites that were not asked to DICE in the run.
+
+The box lengths are read from the comment line of each frame ("L = ..."),
+the distances use the minimum image convention and the pairs closer than the
+largest r are found with cell lists (diceboxes.py). The frames are split in
+chunks processed in parallel. The RDFs are written in the layout of the .gr
+files of DICE (r, G(r) and N(r) for each pair), so they can be opened by
+DiceWin and rdf_tools.py.
+"""
+
+import argparse
+import os
+import sys
+import numpy as np
+from diceboxes import BoxLayout, close_pairs, map_chunks, parse_box
+from diceio import compression
+from diceframes import add_selection_arguments, read_frames, selection_from_args
+
+
+def rdf_counts(blocks, pairs, rmax, dr):
+  """
+  Histograms of the distances of each pair of sites in the frames blocks (bytes). pairs has, for each pair, the atoms
+  (0-based) of the two sites and whether they are in the same molecules. Return the histograms (npairs x nbins), the
+  sum over the frames of nA*nB/V of each pair and the number of frames.
+  """
+  nbins = int(round(rmax / dr))
+  counts = np.zeros((len(pairs), nbins), dtype=np.int64)
+  ideal = np.zeros(len(pairs))
+  for block in blocks:
+    _, coords, box = parse_box(block)
+    if box is None:
+      raise ValueError("The frames have no box lengths (L =) in the comment line")
+    volume = np.prod(box)
+    for k, (atomsA, atomsB, same) in enumerate(pairs):
+      i, j, r = close_pairs(coords[atomsA], coords[atomsB], box, rmax)
+      if same:
+        # no pairs of sites of the same molecule
+        r = r[i != j]
+      counts[k] += np.bincount(np.minimum((r / dr).astype(np.int64), nbins-1), minlength=nbins)
+      ideal[k] += len(atomsA) * (len(atomsB) - same) / volume
+  return counts, ideal, len(blocks)
+
+
+def _rdf_chunk(task):
+  return rdf_counts(*task)
+
+
+def chunked(frames, size):
+  chunk = []
+  for _, block in frames:
+    chunk.append(block)
+    if len(chunk) == size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+
+def compute_rdfs(trajfile, selection, pairs, rmax=None, dr=0.1, nproc=None, chunk=100):
+  """
+  RDFs of the pairs of sites (as in rdf_counts) in the frames of trajfile selected. rmax is half of the smallest box
+  length of the first frame by default. Return the r, G(r) (npairs x nbins), N(r) (npairs x nbins) and the number
+  of frames.
+  """
+  frames = read_frames(trajfile, selection)
+  first = next(frames, None)
+  if first is None:
+    raise ValueError("No frames were selected")
+  if rmax is None:
+    box = parse_box(first[1])[2]
+    if box is None:
+      raise ValueError("The frames have no box lengths (L =) in the comment line")
+    rmax = box.min() / 2.
+  nbins = int(round(rmax / dr))
+  rmax = nbins * dr
+
+  def tasks():
+    yield [first[1]], pairs, rmax, dr
+    for blocks in chunked(frames, chunk):
+      yield blocks, pairs, rmax, dr
+
+  counts = np.zeros((len(pairs), nbins), dtype=np.int64)
+  ideal = np.zeros(len(pairs))
+  nframes = 0
+  for c, i, n in map_chunks(_rdf_chunk, tasks(), nproc):
+    counts += c
+    ideal += i
+    nframes += n
+
+  r = (np.arange(nbins) + 0.5) * dr
+  shell = 4./3. * np.pi * dr**3 * ((np.arange(nbins) + 1)**3 - np.arange(nbins)**3)
+  with np.errstate(invalid='ignore', divide='ignore'):
+    gr = np.where(ideal[:, None] > 0, counts / (ideal[:, None] * shell), 0.)
+  # N(r) counts the sites up to the middle of each bin
+  natomsA = np.array([len(atomsA) for atomsA, _, _ in pairs])
+  nr = (np.cumsum(counts, axis=1) - counts/2.) / (natomsA[:, None] * nframes)
+  return r, gr, nr, nframes
+
+
+def write_gr(fname, title, labels, r, gr, nr):
+  """
+  Write the RDFs in the layout of the DICE .gr files, with a blank line after each pair. labels has, for each pair,
+  the site (1-based), its symbol and the molecule type (1-based) of the two sites.
+  """
+  with open(fname, 'w') as f:
+    f.write(" %s\n" % title)
+    for k, (siteA, symA, typeA, siteB, symB, typeB) in enumerate(labels):
+      f.write("# RDF between site %d %s of molecule type %d and %d %s of molecule type %d\n" % (siteA, symA, typeA, siteB, symB, typeB))
+      f.write("".join("%12.4f%12.5f%12.5f\n" % row for row in zip(r, gr[k], nr[k])))
+      f.write("\n")
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Computes site-site radial distribution functions from the boxes of a DICE .xyz trajectory.")
+  parser.add_argument("trajfile", help="the xyz trajectory with the whole boxes (with the box lengths in the comment lines)")
+  parser.add_argument("txtfile", help="the DICE .txt of the simulation")
+  parser.add_argument("nmol", type=int, nargs='+', help="number of molecules of each type of the .txt, in the order of the box")
+  parser.add_argument("-p", "--pair", type=int, nargs=4, action='append', metavar=('TYPE1', 'SITE1', 'TYPE2', 'SITE2'),
+                      help="RDF between the site SITE1 (1-based atom of the molecule) of the molecules of type TYPE1 and the site SITE2 of type TYPE2, can be repeated "
+                      "(default = all the sites of type 1 with all the sites of type 2)")
+  parser.add_argument("--rmax", type=float, default=None, help="largest r of the RDFs (default = half of the smallest box length)")
+  parser.add_argument("--dr", type=float, default=0.1, help="width of the bins of r (default = 0.1)")
+  parser.add_argument("-nproc", "--nproc", type=int, default=None, help="number of processes (default = number of CPUs)")
+  parser.add_argument("--chunk", type=int, default=100, help="frames processed at once by each process (default = 100)")
+  parser.add_argument("-o", "--output", default=None, help="the .gr written (default = name of the trajectory with the extension .gr)")
+  add_selection_arguments(parser)
+  args = parser.parse_args()
+
+  layout = BoxLayout(args.txtfile, args.nmol)
+  specs = args.pair
+  if not specs:
+    typeB = 2 if len(layout.sizes) > 1 else 1
+    specs = [[1, siteA, typeB, siteB] for siteA in range(1, layout.sizes[0]+1) for siteB in range(1, layout.sizes[typeB-1]+1)]
+
+  try:
+    pairs = [(layout.site(t1, s1), layout.site(t2, s2), t1 == t2) for t1, s1, t2, s2 in specs]
+  except ValueError as e:
+    sys.exit(str(e))
+
+  selection = selection_from_args(args)
+  try:
+    r, gr, nr, nframes = compute_rdfs(args.trajfile, selection, pairs, args.rmax, args.dr, args.nproc, args.chunk)
+  except ValueError as e:
+    sys.exit(str(e))
+
+  # symbols of the sites from the first frame
+  symbols = parse_box(next(read_frames(args.trajfile, selection))[1])[0]
+  if len(symbols) != layout.natoms:
+    print("Warning: the boxes have %d atoms, but %d were expected from the .txt" % (len(symbols), layout.natoms))
+  labels = [(s1, symbols[a[0]].decode(), t1, s2, symbols[b[0]].decode(), t2) for (t1, s1, t2, s2), (a, b, _) in zip(specs, pairs)]
+
+  base = os.path.splitext(args.trajfile)[0] if compression(args.trajfile) else args.trajfile
+  output = args.output or os.path.splitext(base)[0] + ".gr"
+  write_gr(output, "RDFs of %s (%d frames)" % (os.path.basename(args.trajfile), nframes), labels, r, gr, nr)
+  print("RDFs of %d pairs in %d frames written to %s" % (len(pairs), nframes, output))
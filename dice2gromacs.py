@@ -9,20 +9,10 @@ Date: JAN/2019
 import os
 import sys
 import argparse
-import tempfile
-try: 
-  import pybel
-  import openbabel
-  ob3 = False
-except:
-  from openbabel import pybel
-  from openbabel import openbabel
-  ob3 = True
+from dicedeps import is_ob3, openbabel, pybel
+from dicetop import load_dfr, load_txt
+from dicebatch import pair_files, read_manifest, report, run_batch
 from math import sqrt
-try:
-  from Queue import Queue
-except:
-  from queue import Queue
 
 # from https://stackoverflow.com/a/11541495
 def extant_file(x):
@@ -44,192 +34,94 @@ def cal2j(num):
   return round(num*4.184, 4)
 
 
-def read_bonds(fd):
-  line = fd.readline()
-
-  dfrBonds = {}
-  while "$end" not in line:
-    bnd = line.split()[0]+" "+line.split()[1]
-    if bnd not in dfrBonds:
-      dfrBonds[bnd] = [float(x) for x in line.split()[2:]]
+def terms_dict(terms, convert):
+  # the parameters of each term, by its atoms ("1 2"), a repeated term has its parameters appended
+  terms_dict = {}
+  for atoms, params in zip(terms.atoms.tolist(), terms.params):
+    key = " ".join(str(x) for x in atoms)
+    if key not in terms_dict:
+      terms_dict[key] = convert(params)
     else:
-      dfrBonds[bnd].append([float(x) for x in line.split()[2:]])
-
-    line = fd.readline()
-
-  return dfrBonds
-
-
-def read_angles(fd):
-  line = fd.readline()
-
-  dfrAngles = {}
-  while "$end" not in line:
-    ang = line.split()[0]+" "+line.split()[1]+" "+line.split()[2]
-    if ang not in dfrAngles:
-      dfrAngles[ang] = [float(x) for x in line.split()[4:]]
-    else:
-      dfrAngles[ang].append([float(x) for x in line.split()[4:]])
-
-    line = fd.readline()
-
-  return dfrAngles
+      terms_dict[key].append(convert(params))
 
-
-def read_dihedrals(fd):
-  line = fd.readline()
-
-  dfrDihedrals = {}
-  while "$end" not in line:
-    dih = line.split()[0]+" "+line.split()[1]+" "+line.split()[2]+" "+line.split()[3]
-    if dih not in dfrDihedrals:
-      dfrDihedrals[dih] = line.split()[4:]
-    else:
-      dfrDihedrals[dih].append(line.split()[4:])
-
-    line = fd.readline()
-
-  return dfrDihedrals
-
-
-def read_improper(fd):
-  line = fd.readline()
-
-  dfrImpDih = {}
-  while "$end" not in line:
-    idih = line.split()[0]+" "+line.split()[1]+" "+line.split()[2]+" "+line.split()[3]
-    if idih not in dfrImpDih:
-      dfrImpDih[idih] = line.split()[4:]
-    else:
-      dfrImpDih[idih].append(line.split()[4:])
-
-    line = fd.readline()
-
-  return dfrImpDih
+  return terms_dict
 
 
 def read_dfr_dof(dfrfile):
-  with open(dfrfile, 'r') as f:
-    while True:
-      line = f.readline()
-
-      if not line:
-        break
-
-      if "$bond" in line:
-        dfrBonds = read_bonds(f)
-      elif "$angle" in line:
-        dfrAngles = read_angles(f)
-      elif "$dihedral" in line:
-        dfrDihedrals = read_dihedrals(f)
-      elif "$improper" in line:
-        dfrImpDih = read_improper(f)
+  dfr = load_dfr(dfrfile)
 
   # check if everything was found and raise error if not
-  try:
-    dfrBonds
-  except:
+  if dfr.bonds is None:
     print("Error: The bonds section was not found in the .dfr, please check your topology.")
     sys.exit(0)
-  try:
-    dfrAngles
-  except:
+  if dfr.angles is None:
     print("Error: The angles section was not found in the .dfr, please check your topology.")
     sys.exit(0)
-  try:
-    dfrDihedrals
-  except:
+  if dfr.dihedrals is None:
     print("Error: The dihedrals section was not found in the .dfr, please check your topology.")
     sys.exit(0)
 
+  dfrBonds = terms_dict(dfr.bonds, lambda params: [float(x) for x in params])
+  # the first parameter of the angles is the type of potential
+  dfrAngles = terms_dict(dfr.angles, lambda params: [float(x) for x in params[1:]])
+  dfrDihedrals = terms_dict(dfr.dihedrals, list)
+  dfrImpDih = terms_dict(dfr.impropers, list) if dfr.impropers is not None else {}
+
   return dfrBonds, dfrAngles, dfrDihedrals, dfrImpDih
 
 def read_txt_to_mol(txtfile):
-  # lists to store the charges and LJ parameters
-  q = []
-  eps = []
-  sig = []
-
-  # convert the .txt to a .xyz to read in pybel mol to perceive all the bonds, angles, dihedrals..
-  fd, temp_path = tempfile.mkstemp(suffix=".xyz")
-  fxyz = os.fdopen(fd,'w')
+  txt = load_txt(txtfile)
+  if len(txt.molecules) != 1:
+    print("Your .txt should have only one molecule, the one present in the .dfr")
+    sys.exit(0)
+  molecule = txt.molecules[0]
+
   # table to convert atomic number to symbols
-  if not ob3:
+  if not is_ob3():
     etab = openbabel.OBElementTable()
-  
-  with open(txtfile, 'r') as f:
-    line = f.readline()
-    combrule = line.strip()
-  
-    line = f.readline()
-    if int(line.strip()) != 1:
-      print("Your .txt should have only one molecule, the one present in the .dfr")
-      sys.exit(0)
-  
-    line = f.readline()
-    natoms = int(line.split()[0])
-    
-    # write .xyz header
-    fxyz.write("%d\nGenerated from %s\n" % (natoms,txtfile))
-    
-    for i in range(natoms):
-      # write the atomic symbol and coordinates
-      line = f.readline()
-      atnum = int(line.split()[1])
-      x, y, z = [float(x) for x in line.split()[2:5]]
-      if ob3:
-        fxyz.write("%s\t%f\t%f\t%f\n" % (openbabel.GetSymbol(atnum), x, y, z))
-      else:
-        fxyz.write("%s\t%f\t%f\t%f\n" % (etab.GetSymbol(atnum), x, y, z))
+    symbols = [etab.GetSymbol(atnum) for atnum in molecule.atomic_numbers.tolist()]
+  else:
+    symbols = [openbabel.GetSymbol(atnum) for atnum in molecule.atomic_numbers.tolist()]
 
-      # store the parameters
-      qv, epsv, sigv = [float(x) for x in line.split()[5:]]
-      q.append(qv)
-      eps.append(epsv)
-      sig.append(sigv)
-  
-  fxyz.close()
+  # read the .txt as a .xyz in a pybel mol to perceive all the bonds, angles, dihedrals..
+  xyz = "%d\nGenerated from %s\n" % (len(molecule), txtfile)
+  xyz += "".join("%s\t%f\t%f\t%f\n" % (sym, x, y, z) for sym, (x, y, z) in zip(symbols, molecule.coords.tolist()))
+  mol = pybel.readstring("xyz", xyz)
 
-  # read filel to a mol, remove temp and return
-  mol = pybel.readfile("xyz", temp_path).__next__()
-  os.remove(temp_path)
+  # lists with the charges and LJ parameters
+  q = molecule.charges.tolist()
+  eps = molecule.epsilons.tolist()
+  sig = molecule.sigmas.tolist()
 
   return mol, q, eps, sig
 
 
-def get_pairs(mol):
-  infty = -1
-
-  distPairs = []
-  # run BFS exploration for each atom to find the distance to others
-  for atom in mol.atoms:
-    q = Queue()
-
-    vis = [False] * len(mol.atoms)
-    dist = [infty] * len(mol.atoms)
+def pairs_14(natoms, bonds):
+  """
+  Pairs (i < j, 1-based) of atoms separated by exactly three bonds, i.e. the ends of the dihedral paths i-a-b-j that
+  are not also bonded or separated by two bonds (as in the small rings), in increasing order.
+  """
+  neighbors = [set() for _ in range(natoms+1)]
+  for a, b in bonds:
+    neighbors[a].add(b)
+    neighbors[b].add(a)
 
-    vis[atom.idx-1] = True
-    dist[atom.idx-1] = 0
-    q.put(atom)
+  pairs = set()
+  for a, b in bonds:
+    for i in neighbors[a]:
+      if i == b:
+        continue
+      for j in neighbors[b]:
+        if j != a and j != i:
+          pairs.add((min(i, j), max(i, j)))
 
-    while not q.empty():
-      k = q.get()
-      # mark children as visited and queue them
-      children = [pybel.Atom(x) for x in openbabel.OBAtomAtomIter(k.OBAtom)]
-      for child in children:
-        if not vis[child.idx-1]:
-          vis[child.idx-1] = True
-          dist[child.idx-1] = dist[k.idx-1] + 1
-          q.put(child)
+  # the ends of a dihedral path may be closer through another path
+  return sorted((i, j) for i, j in pairs if j not in neighbors[i] and not (neighbors[i] & neighbors[j]))
 
-    for i in range(len(mol.atoms)):
-      if (dist[i] == 3):
-        pair1 = "%d %d" % (atom.idx, i+1)
-        pair2 = "%d %d" % (i+1, atom.idx)
-        if (pair1 not in distPairs) and (pair2 not in distPairs):
-          distPairs.append(pair1)
 
-  return distPairs
+def get_pairs(mol):
+  bonds = [(bond.GetBeginAtomIdx(), bond.GetEndAtomIdx()) for bond in openbabel.OBMolBondIter(mol.OBMol)]
+  return ["%d %d" % pair for pair in pairs_14(len(mol.atoms), bonds)]
 
 
 def read_parameters(dfrfile, txtfile):
@@ -273,7 +165,7 @@ def read_parameters(dfrfile, txtfile):
 
 def itp_from_params(mol, q, eps, sig, dfrBonds, dfrAngles, dfrDihedrals, dfrImpDih):
   # table to convert atomic number to symbols
-  if not ob3:
+  if not is_ob3():
     etab = openbabel.OBElementTable()
 
   # !!! units are converted as the reverse of: http://chembytes.wikidot.com/oplsaagro2tnk and based on GROMACS manual
@@ -289,7 +181,7 @@ def itp_from_params(mol, q, eps, sig, dfrBonds, dfrAngles, dfrDihedrals, dfrImpD
 """
   # write the atomtypes
   for i, atom in enumerate(mol.atoms):
-    if ob3:
+    if is_ob3():
       fcontent += "att_%03d   %s%03d   %7.4f   0.000    A    %.5e    %.5e\n" % (i+1, openbabel.GetSymbol(atom.atomicnum), i+1, atom.atomicmass, a2nm(sig[i]), cal2j(eps[i]))
     else:
       fcontent += "att_%03d   %s%03d   %7.4f   0.000    A    %.5e    %.5e\n" % (i+1, etab.GetSymbol(atom.atomicnum), i+1, atom.atomicmass, a2nm(sig[i]), cal2j(eps[i]))
@@ -306,7 +198,7 @@ UNL              3
 
   # write the atoms
   for i, atom in enumerate(mol.atoms):
-    if ob3:
+    if is_ob3():
       fcontent += "%6d   att_%03d   1   UNL    %s%03d   1    %.4f   %7.4f\n" % (i+1, i+1, openbabel.GetSymbol(atom.atomicnum), i+1, q[i], atom.atomicmass)
     else:
       fcontent += "%6d   att_%03d   1   UNL    %s%03d   1    %.4f   %7.4f\n" % (i+1, i+1, etab.GetSymbol(atom.atomicnum), i+1, q[i], atom.atomicmass)
@@ -449,29 +341,22 @@ def gen_top(ffname, itpname):
   return fcontent
 
 
-if __name__ == '__main__':
-  parser = argparse.ArgumentParser(description="Receives the DICE input files .dfr and .txt to generate the GROMACS input files .itp and .gro.")
-  parser.add_argument("dfrfile", type=extant_file, help="the DICE .dfr")
-  parser.add_argument("txtfile", type=extant_file, help="the DICE .txt")
-  parser.add_argument("force_field", help='select either "opls" or "amber" to generate the inputs accordingly')
-
-  args = parser.parse_args()
-
-  if args.force_field.lower() not in ["opls", "amber"]:
-    print("Error: Invalid force field (%s). Select opls or amber." % args.force_field)
-    sys.exit(0)
-
+def convert(dfrfile, txtfile, force_field, topname="topology.top"):
+  """
+  Write the .itp (with the name of the .dfr), the topology topname and the .gro (with the name of the .txt, the
+  molecule in the center of a box).
+  """
   # read the geometry into a pybel mol, the LJ+Coulomb into lists and the dfr paramaters into dictionaries
-  mol, q, eps, sig, dfrBonds, dfrAngles, dfrDihedrals, dfrImpDih = read_parameters(args.dfrfile, args.txtfile)
+  mol, q, eps, sig, dfrBonds, dfrAngles, dfrDihedrals, dfrImpDih = read_parameters(dfrfile, txtfile)
 
   # generate .itp and write
   fcontent = itp_from_params(mol, q, eps, sig, dfrBonds, dfrAngles, dfrDihedrals, dfrImpDih)
-  with open(os.path.splitext(args.dfrfile)[0]+".itp", "w") as f:
+  with open(os.path.splitext(dfrfile)[0]+".itp", "w") as f:
     f.write(fcontent)
 
   # generate .top and write
-  fcontent = gen_top(args.force_field, os.path.splitext(args.dfrfile)[0]+".itp")
-  with open("topology.top", "w") as f:
+  fcontent = gen_top(force_field, os.path.splitext(dfrfile)[0]+".itp")
+  with open(topname, "w") as f:
     f.write(fcontent)
 
   # get the molecule diameter
@@ -494,4 +379,63 @@ if __name__ == '__main__':
   mol.OBMol.Translate(arr)
 
   # write .gro
-  mol.write("gro", os.path.splitext(args.txtfile)[0]+".gro", overwrite=True)
+  mol.write("gro", os.path.splitext(txtfile)[0]+".gro", overwrite=True)
+
+  print("The files %s, %s and %s were successfully generated." % (os.path.splitext(dfrfile)[0]+".itp", topname, os.path.splitext(txtfile)[0]+".gro"))
+
+
+def batch_molecules(batch):
+  """
+  .dfr and .txt of each molecule of a batch: a directory (each .dfr with the .txt of the same name) or a manifest
+  with a .dfr and a .txt in each line.
+  """
+  if os.path.isdir(batch):
+    entries = pair_files(batch, ".dfr", [".txt"])
+  else:
+    entries = read_manifest(batch)
+
+  molecules = []
+  for entry in entries:
+    if len(entry) != 2:
+      print("Skipping %s: a .dfr and a .txt are needed for each molecule" % (" ".join(entry)))
+      continue
+    molecules.append(entry)
+  return molecules
+
+
+def convert_molecule(dfrfile, txtfile, force_field):
+  # in a batch each molecule has its own topology, named after the .dfr
+  convert(dfrfile, txtfile, force_field, os.path.splitext(dfrfile)[0]+".top")
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Receives the DICE input files .dfr and .txt to generate the GROMACS input files .itp and .gro.")
+  parser.add_argument("dfrfile", type=extant_file, nargs="?", help="the DICE .dfr")
+  parser.add_argument("txtfile", type=extant_file, nargs="?", help="the DICE .txt")
+  parser.add_argument("force_field", help='select either "opls" or "amber" to generate the inputs accordingly')
+  parser.add_argument("--batch", "-b", type=extant_file, help="convert many molecules: a directory (each .dfr with the .txt of the same name) or a file with a .dfr and a .txt in each line. Each molecule gets its own .top (named after the .dfr) and the molecules are converted in parallel.")
+  parser.add_argument("-nproc", "--nproc", type=int, default=None, help="number of processes used by --batch (default = number of CPUs)")
+  parser.add_argument("--verbose", "-v", help="with --batch, also show the messages of the molecules converted successfully.", action="store_true")
+
+  args = parser.parse_args()
+
+  if args.batch and (args.dfrfile or args.txtfile):
+    parser.error("give either the .dfr and .txt files or --batch")
+  if not args.batch and not (args.dfrfile and args.txtfile):
+    parser.error("the .dfr and .txt files are required (or use --batch)")
+
+  if args.force_field.lower() not in ["opls", "amber"]:
+    print("Error: Invalid force field (%s). Select opls or amber." % args.force_field)
+    sys.exit(0)
+
+  if args.batch:
+    molecules = batch_molecules(args.batch)
+    if not molecules:
+      print("No molecules were found in %s" % (args.batch))
+      sys.exit(1)
+    results = run_batch(convert_molecule, [tuple(mol) + (args.force_field,) for mol in molecules], args.nproc, pybel._load)
+    if report([os.path.basename(mol[0]) for mol in molecules], results, args.verbose):
+      sys.exit(1)
+    sys.exit(0)
+
+  convert(args.dfrfile, args.txtfile, args.force_field)
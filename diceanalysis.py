@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Analyses of DiceWin without the interface: histograms, autocorrelation and
+its exponential fits, integral of the RDFs and effective potential.
+
+Nothing here imports PyQt5 or matplotlib, so the functions can be used by
+DiceWin and by dicewin_batch.py in machines without a display.
+"""
+
+import numpy as np
+
+EXP_LABELS = [
+    'A1*exp(-t/B1)', 'A1*exp(-t/B1)+A2*exp(-t/B2)',
+    'A1*exp(-t/B1)+A2*exp(-t/B2)+A3*exp(-t/B3)'
+]
+
+
+def exponential1(C, t):
+  return C[0] * np.exp(-t / C[1])
+
+
+def exponential2(C, t):
+  return C[0] * np.exp(-t / C[1]) + C[2] * np.exp(-t / C[3])
+
+
+def exponential3(C, t):
+  return C[0] * np.exp(-t / C[1]) + C[2] * np.exp(-t / C[3]) + C[4] * np.exp(
+      -t / C[5])
+
+
+EXPONENTIALS = [exponential1, exponential2, exponential3]
+
+
+def estimated_autocorrelation(x):
+  """
+  (Array) -> Array
+  Calculate the autocorrelation. Algorithm from: http://stackoverflow.com/q/14297012/190597
+  The values that are not finite (the overflowed fields of the DICE files) are dropped, as the lines were skipped
+  when the files were read.
+  """
+  x = np.asarray(x, dtype=np.float64)
+  x = x[np.isfinite(x)]
+  n = len(x)
+  variance = x.var()
+  x = x - x.mean()
+  r = np.correlate(x, x, mode='full')[-n:]
+  result = r / (variance * (np.arange(n, 0, -1)))
+  return result
+
+
+def fit_autocorrelation(t, ct, guess, LT):
+  """
+  (Array, Array, List, Int) -> Array
+  Fit the sum of len(guess)//2 exponentials to the first LT points of C(t) with ODR (ordinary least squares).
+  Return the fitted coefficients [A1, B1, A2, B2, ...].
+  """
+  from scipy.odr import ODR, Model, RealData
+
+  guess = [float(k) for k in guess]
+  if len(guess) not in (2, 4, 6):
+    raise ValueError("The guess should have 2, 4 or 6 coefficients")
+
+  dataReal = RealData(t[:LT], ct[:LT])
+  modelOdr = ODR(dataReal, Model(EXPONENTIALS[len(guess)//2 - 1]), guess)
+  modelOdr.set_job(fit_type=2)
+  return modelOdr.run().beta
+
+
+def default_guess(nexp, LT):
+  """
+  Initial coefficients for the fit when none is given: the amplitudes share C(0) = 1 and the
+  characteristic times are spread up to a fourth of the largest t.
+  """
+  guess = []
+  for k in range(nexp):
+    guess += [1.0 / nexp, max(LT, 1) / (4.0 * (nexp - k))]
+  return guess
+
+
+def histogram(values, numbins=50):
+  """
+  (Array, Int) -> Array, Array, Array, Float, Float
+  Normalized histogram of values, as drawn by DiceWin. Return the frequencies, the bin edges, the bin centers,
+  the mean and the standard deviation (ddof=0). The values that are not finite are dropped.
+  """
+  values = np.asarray(values, dtype=np.float64)
+  values = values[np.isfinite(values)]
+  n, bins = np.histogram(values, numbins, weights=np.full(len(values), 1 / len(values)))
+  binCenter = bins[:-1] + np.abs(np.diff(bins)) * 0.5
+  return n, bins, binCenter, float(values.mean()), float(values.std(ddof=0))
+
+
+def gaussian(x, binwidth, mean, stdDev):
+  """
+  Normal distribution of the given mean and standard deviation scaled by the bin width of the histogram.
+  """
+  x = np.asarray(x, dtype=np.float64)
+  return binwidth * ((1 / (stdDev * np.sqrt(2 * 3.14))) * np.exp(-0.5 * (
+      (x - mean) / stdDev)**2))
+
+
+def rdf_integral(r, nr, x):
+  """
+  (Array, Array, Float or Array) -> Float or Array, Float or Array
+  Integral N(r) of the RDF at the points of the grid closest to x. Return the r of these points and N(r).
+  """
+  r = np.asarray(r, dtype=np.float64)
+  nr = np.asarray(nr, dtype=np.float64)
+  index = np.round((np.asarray(x) - r[0]) / (r[1] - r[0])).astype(int)
+  if np.any((index < 0) | (index >= len(r))):
+    raise IndexError("r outside of the range of the RDF")
+  return r[index], nr[index]
+
+
+def ueff(gr, T=298.0):
+  """
+  (Array, Float) -> Array
+  Effective potential -RT ln G(r) (kcal/mol). Points with G(r) < 1e-20 are set to 0.
+  """
+  gr = np.asarray(gr, dtype=np.float64)
+  with np.errstate(invalid='ignore'):
+    return np.where(gr < 1e-20, 0.0, -1.985e-3 * T * np.log(np.maximum(gr, 1e-20)))
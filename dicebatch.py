@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Conversion of many molecules at once, used by the batch modes of
+gromacs2dice.py and dice2gromacs.py.
+
+The input files of each molecule come from a manifest or from the files of a
+directory. The conversions run in worker processes and the messages printed
+by each one are collected, so an error in one molecule is reported without
+stopping the others.
+"""
+
+import contextlib
+import io
+import multiprocessing as mp
+import os
+import traceback
+
+
+def read_manifest(fname):
+  """
+  Read a manifest with the input files of one molecule in each line, separated by spaces. Empty lines and the
+  text after # are ignored and relative paths are relative to the directory of the manifest.
+  """
+  root = os.path.dirname(os.path.abspath(fname))
+  entries = []
+  with open(fname, 'r') as f:
+    for line in f:
+      files = line.split('#')[0].split()
+      if files:
+        entries.append([os.path.join(root, x) for x in files])
+  return entries
+
+
+def pair_files(directory, ext, partner_exts):
+  """
+  For each file of directory with the extension ext, the file itself and the file with the same name and the first
+  of the extensions partner_exts found. Files without a partner are returned alone.
+  """
+  entries = []
+  for fname in sorted(os.listdir(directory)):
+    base, fext = os.path.splitext(os.path.join(directory, fname))
+    if fext.lower() != ext:
+      continue
+    partner = next((base + pext for pext in partner_exts if os.path.isfile(base + pext)), None)
+    entries.append([base + fext, partner] if partner else [base + fext])
+  return entries
+
+
+def _run(task):
+  func, args = task
+  out = io.StringIO()
+  error = None
+  try:
+    with contextlib.redirect_stdout(out):
+      func(*args)
+  except SystemExit:
+    # the conversions print the reason and exit
+    lines = out.getvalue().strip().splitlines()
+    error = lines[-1] if lines else "stopped"
+  except Exception:
+    error = traceback.format_exc().strip().splitlines()[-1]
+  return out.getvalue(), error
+
+
+def _initialize(initializer, *initargs):
+  # errors here (e.g. a missing dependency) are left to be reported by each conversion: a pool whose workers fail
+  # to start would keep replacing them forever
+  try:
+    initializer(*initargs)
+  except Exception:
+    pass
+
+
+def run_batch(func, argslist, nproc=None, initializer=None, initargs=()):
+  """
+  Call func(*args) for each args of argslist in nproc worker processes (the number of CPUs by default). initializer
+  is called once in each worker. Yield the messages printed and the error (None if the conversion succeeded) of each
+  call, in the order of argslist.
+  """
+  tasks = [(func, args) for args in argslist]
+  nproc = min(nproc or os.cpu_count() or 1, len(tasks))
+
+  if nproc <= 1:
+    if initializer:
+      _initialize(initializer, *initargs)
+    for task in tasks:
+      yield _run(task)
+    return
+
+  pool = mp.Pool(nproc, _initialize if initializer else None, (initializer,) + tuple(initargs))
+  try:
+    for result in pool.imap(_run, tasks):
+      yield result
+  finally:
+    pool.close()
+    pool.join()
+
+
+def report(names, results, verbose=False):
+  """
+  Print one line for each molecule (and the messages of the failed ones, or of all with verbose). Return the number
+  of failures.
+  """
+  failed = 0
+  for name, (log, error) in zip(names, results):
+    if error:
+      failed += 1
+      print("FAILED  %s: %s" % (name, error))
+    else:
+      print("OK      %s" % name)
+    if log.strip() and (error or verbose):
+      print("        " + log.strip().replace("\n", "\n        "))
+
+  print("\n%d molecules converted, %d failed" % (len(names) - failed, failed))
+  return failed
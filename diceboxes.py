@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Periodic boxes of the DICE .xyz trajectories: the coordinates and the box
+lengths (the "L =" of the comment line) of each frame, the atoms of each
+molecule of the .txt and the pairs of atoms closer than a cutoff.
+
+The pairs are found with cell lists: the box is split in cells at least as
+large as the cutoff, so only the atoms of the 27 cells around each atom are
+compared, with the minimum image convention.
+"""
+
+import collections
+import itertools
+import multiprocessing as mp
+import os
+import re
+import numpy as np
+from dicetop import load_txt
+
+BOX_LENGTHS = re.compile(rb"L\s*=\s*(\S+)\s+(\S+)\s+(\S+)")
+
+# pairs compared at once when the box is too small for the cell lists
+BLOCK = 1000000
+
+
+def box_lengths(comment):
+  """
+  Lengths of the box from the comment line of a DICE frame, None if they are not there.
+  """
+  match = BOX_LENGTHS.search(comment)
+  return np.array(match.groups(), dtype=np.float64) if match else None
+
+
+def parse_box(block):
+  """
+  Symbols, coordinates (natoms x 3) and box lengths of a frame (bytes) of a DICE trajectory.
+  """
+  header, comment, atoms = block.split(b"\n", 2)
+  table = np.array(atoms.split()).reshape(int(header), 4)
+  return table[:, 0], table[:, 1:].astype(np.float64), box_lengths(comment)
+
+
+class BoxLayout:
+  """
+  Atoms of the box of a DICE simulation, with nmol[i] molecules of the type i+1 of the .txt placed one after the
+  other.
+  """
+
+  def __init__(self, txtfile, nmol):
+    molecules = load_txt(txtfile).molecules
+    if len(nmol) != len(molecules):
+      raise ValueError("%s has %d molecule types, but the number of molecules of %d was given" % (txtfile, len(molecules), len(nmol)))
+    self.molecules = molecules
+    self.sizes = [len(mol) for mol in molecules]
+    self.nmol = list(nmol)
+    self.first = []
+    atom = 0
+    for size, n in zip(self.sizes, self.nmol):
+      self.first.append(atom)
+      atom += size*n
+    self.natoms = atom
+
+  def site(self, moltype, site):
+    """
+    Atoms (0-based) of the site (1-based atom of the molecule) of all the molecules of the type moltype (1-based).
+    """
+    if not 0 < moltype <= len(self.sizes) or not 0 < site <= self.sizes[moltype-1]:
+      raise ValueError("Molecule type %d has no site %d" % (moltype, site))
+    size = self.sizes[moltype-1]
+    return self.first[moltype-1] + site - 1 + size*np.arange(self.nmol[moltype-1])
+
+  def molecule_type(self, moltype):
+    """
+    Atoms (0-based) of all the molecules of the type moltype (1-based), and the molecule (0-based, counted in the
+    type) of each one.
+    """
+    size = self.sizes[moltype-1]
+    atoms = self.first[moltype-1] + np.arange(size*self.nmol[moltype-1])
+    return atoms, np.arange(len(atoms)) // size
+
+
+def minimum_image(d, box):
+  d -= box*np.round(d/box)
+  return d
+
+
+def _all_pairs(a, b, box, cutoff):
+  step = max(1, BLOCK // max(len(b), 1))
+  for first in range(0, len(a), step):
+    d = minimum_image(a[first:first+step, None, :] - b[None, :, :], box)
+    r = np.sqrt(np.sum(d*d, axis=2))
+    i, j = np.nonzero(r < cutoff)
+    yield first + i, j, r[i, j]
+
+
+def _cell_pairs(a, b, box, cutoff, ncell):
+  size = box / ncell
+  ca = np.floor((a - box*np.floor(a/box)) / size).astype(np.int64) % ncell
+  cb = np.floor((b - box*np.floor(b/box)) / size).astype(np.int64) % ncell
+  idb = (cb[:, 0]*ncell[1] + cb[:, 1])*ncell[2] + cb[:, 2]
+
+  # atoms of b sorted by cell, the ones of each cell starting at start[cell]
+  order = np.argsort(idb, kind='stable')
+  count = np.bincount(idb, minlength=int(np.prod(ncell)))
+  start = np.cumsum(count) - count
+
+  for shift in itertools.product((-1, 0, 1), repeat=3):
+    cn = (ca + shift) % ncell
+    idn = (cn[:, 0]*ncell[1] + cn[:, 1])*ncell[2] + cn[:, 2]
+    n = count[idn]
+    total = int(n.sum())
+    if not total:
+      continue
+    i = np.repeat(np.arange(len(a)), n)
+    j = order[np.repeat(start[idn] - np.cumsum(n) + n, n) + np.arange(total)]
+    d = minimum_image(a[i] - b[j], box)
+    r = np.sqrt(np.sum(d*d, axis=1))
+    close = r < cutoff
+    yield i[close], j[close], r[close]
+
+
+def close_pairs(a, b, box, cutoff):
+  """
+  Pairs of points of a and b (n x 3 arrays) closer than cutoff in the periodic box of lengths box (the cutoff should
+  not be larger than half of the box). Return the indexes in a, the indexes in b and the distances of the pairs.
+  """
+  a = np.asarray(a, dtype=np.float64)
+  b = np.asarray(b, dtype=np.float64)
+  box = np.asarray(box, dtype=np.float64)
+  ncell = np.floor(box / cutoff).astype(np.int64)
+  if (ncell < 3).any():
+    # the 27 cells around an atom would repeat cells, compare all the pairs
+    parts = list(_all_pairs(a, b, box, cutoff))
+  else:
+    parts = list(_cell_pairs(a, b, box, cutoff, ncell))
+  if not parts:
+    return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+  i, j, r = (np.concatenate(x) for x in zip(*parts))
+  return i, j, r
+
+
+def map_chunks(func, tasks, nproc=None):
+  """
+  Yield func(task) for each task of the iterable tasks, in order, computed by nproc worker processes (the number of
+  CPUs by default). Only a few tasks per process are read ahead, so the frames of a long trajectory are not all kept
+  in memory waiting for the workers.
+  """
+  nproc = nproc or os.cpu_count() or 1
+  if nproc <= 1:
+    for task in tasks:
+      yield func(task)
+    return
+
+  with mp.Pool(nproc) as pool:
+    pending = collections.deque()
+    for task in tasks:
+      pending.append(pool.apply_async(func, (task,)))
+      if len(pending) >= 2*nproc:
+        yield pending.popleft().get()
+    while pending:
+      yield pending.popleft().get()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Heavy dependencies of the tools, imported only when they are first used.
+
+Importing matplotlib, scipy or openbabel takes from tenths of a second to a
+second, which is paid even by --help or by the runs that never plot. The
+modules here are placeholders that import the real module in the first
+attribute access, so the scripts can keep using pybel.readfile, plt.plot, etc.
+"""
+
+import importlib
+
+
+class LazyModule:
+  """
+  Module imported in the first attribute access. names are tried in order (to support the
+  module layouts of different versions), setup(module) is called once after the import and
+  before() is called before it.
+  """
+
+  def __init__(self, *names, setup=None, before=None):
+    self._names = names
+    self._setup = setup
+    self._before = before
+    self._module = None
+
+  def _load(self):
+    if self._module is None:
+      if self._before:
+        self._before()
+      error = None
+      for name in self._names:
+        try:
+          module = importlib.import_module(name)
+          break
+        except ImportError as e:
+          error = e
+      else:
+        raise error
+      if self._setup:
+        self._setup(module)
+      self._module = module
+    return self._module
+
+  def __getattr__(self, attr):
+    if attr.startswith('__'):
+      raise AttributeError(attr)
+    return getattr(self._load(), attr)
+
+  def __repr__(self):
+    if self._module is None:
+      return "<lazy module '{}' (not imported)>".format(self._names[0])
+    return repr(self._module)
+
+
+# openbabel 2 has the modules pybel and openbabel, openbabel 3 moved them to the package openbabel
+pybel = LazyModule('pybel', 'openbabel.pybel')
+openbabel = LazyModule('openbabel.openbabel', 'openbabel')
+
+pd = LazyModule('pandas')
+
+# force matplotlib to not use any Xwindows backend
+mpl = LazyModule('matplotlib', setup=lambda module: module.use('Agg'))
+plt = LazyModule('matplotlib.pyplot', before=lambda: mpl._load())
+
+
+def is_ob3():
+  """
+  True if the openbabel found is version 3 or newer (imports it).
+  """
+  return pybel._load().__name__ == 'openbabel.pybel'
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Selection of frames of the DICE .xyz trajectories: ranges with stride, lists
+of frames and windows of per-frame data (e.g. a dihedral from a .dat or the
+energy from the .e12).
+
+The byte offset of each frame is found once, jumping over the atom lines when
+they all have the same width, and kept in the cache of dicetop (keyed by the
+name, size and modification time of the trajectory). The selected frames are
+then read directly with seek. Compressed trajectories cannot be seeked and are
+read sequentially, stopping after the last selected frame.
+"""
+
+import mmap
+import os
+import re
+import numpy as np
+from dicedeps import pd
+from diceio import compression, open_file
+from dicereaders import is_eij, read_eij
+from dicetop import cache_key, cached
+
+CONF_NUMBER = re.compile(rb"Configuration number\s*:\s*(\d+)")
+
+
+def parse_frames(sel):
+  """
+  Convert a list of frames as "0,10,20-30" (0-based, inclusive ranges) to a sorted array of frames.
+  """
+  frames = set()
+  for part in sel.split(','):
+    if '-' in part.strip()[1:]:
+      first, last = part.rsplit('-', 1)
+      frames.update(range(int(first), int(last)+1))
+    elif part.strip():
+      frames.add(int(part))
+  return np.array(sorted(frames), dtype=np.int64)
+
+
+def read_series(fname, column=None):
+  """
+  Values of a column of a file with one row per frame (a .dat with one value per line, the .e12 or any file of
+  whitespace separated columns, with or without a line of labels). column is a label or a 1-based number, by
+  default the last column. The blocks of the .eij files (one for each simulation output, each one starting with a
+  NMOVE line) are joined in order.
+  """
+  if is_eij(fname.split('.')[-1]):
+    table = pd.concat(read_eij(fname)[1], ignore_index=True)
+  else:
+    with open(fname, 'r') as f:
+      first = ''
+      for first in f:
+        if first.strip() and not first.lstrip().startswith('#'):
+          break
+    try:
+      float(first.split()[0])
+      header = None
+    except (ValueError, IndexError):
+      header = 0
+
+    table = pd.read_csv(fname, sep=r'\s+', header=header, comment='#', index_col=False)
+  if column is None:
+    key = table.columns[-1]
+  elif column in table.columns:
+    key = column
+  elif str(column).isdigit() and 0 < int(column) <= len(table.columns):
+    key = table.columns[int(column)-1]
+  else:
+    raise KeyError("%s has no column %s" % (fname, column))
+  return pd.to_numeric(table[key], errors='coerce').to_numpy(dtype=np.float64)
+
+
+def window_mask(values, low, high):
+  """
+  True where low <= value <= high. When low > high the window wraps around, as for angles (e.g. 150 to -150).
+  """
+  with np.errstate(invalid='ignore'):
+    if low <= high:
+      return (values >= low) & (values <= high)
+    return (values >= low) | (values <= high)
+
+
+class FrameSelection:
+  """
+  Frames (0-based) from start to stop (exclusive, None for the end of the trajectory) every stride frames, or the
+  frames of a list, keeping only the ones where all the masks (one boolean for each frame) are True.
+  """
+
+  def __init__(self, start=0, stop=None, stride=1, frames=None, masks=()):
+    if stride < 1:
+      raise ValueError("The stride should be positive")
+    self.start = start
+    self.stop = stop
+    self.stride = stride
+    self.frames = None if frames is None else np.unique(np.asarray(frames, dtype=np.int64))
+    self.masks = [np.asarray(mask, dtype=bool) for mask in masks]
+
+  def bound(self):
+    """
+    Frames after this number are never selected (None if the selection goes to the end of the trajectory).
+    """
+    bounds = [len(mask) for mask in self.masks]
+    if self.frames is not None:
+      bounds.append(int(self.frames[-1]) + 1 if len(self.frames) else 0)
+    elif self.stop is not None:
+      bounds.append(self.stop)
+    return min(bounds) if bounds else None
+
+  def indexes(self, nframes):
+    """
+    Selected frames of a trajectory with nframes frames, in increasing order.
+    """
+    bound = self.bound()
+    n = nframes if bound is None else min(nframes, bound)
+    if self.frames is not None:
+      idx = self.frames[(self.frames >= 0) & (self.frames < n)]
+    else:
+      idx = np.arange(self.start, n, self.stride, dtype=np.int64)
+    for mask in self.masks:
+      idx = idx[mask[idx]]
+    return idx
+
+  def contains(self, frame):
+    # only for selections without bound, the others use indexes
+    return frame >= self.start and (frame - self.start) % self.stride == 0
+
+
+def scan_frames(mm):
+  """
+  Offsets of the beginning of each frame of the trajectory in the buffer mm, followed by the offset of the end of
+  the last one (an incomplete frame at the end is left out).
+  """
+  offsets = [0]
+  size = len(mm)
+  width = None
+  pos = 0
+  while pos < size:
+    eol = mm.find(b"\n", pos)
+    header = mm[pos:eol+1] if eol != -1 else b""
+    if not header.strip():
+      break
+    natoms = int(header)
+    start = mm.find(b"\n", eol+1) + 1
+    if start == 0:
+      break
+
+    end = None
+    if width:
+      # all the atom lines had the same width so far: jump over them and check that a frame starts there
+      guess = start + natoms*width
+      if guess <= size and mm[guess-1:guess] == b"\n" and (guess == size or mm[guess:guess+len(header)] == header):
+        end = guess
+    if end is None:
+      end = start
+      widths = set()
+      for _ in range(natoms):
+        eol = mm.find(b"\n", end)
+        if eol == -1:
+          return np.array(offsets, dtype=np.int64)
+        widths.add(eol + 1 - end)
+        end = eol + 1
+      if width is None and len(widths) == 1:
+        width = widths.pop()
+
+    offsets.append(end)
+    pos = end
+
+  return np.array(offsets, dtype=np.int64)
+
+
+def index_frames(fname):
+  """
+  Offsets of the frames of an uncompressed trajectory (see scan_frames), cached.
+  """
+  stat = os.stat(fname)
+  key = cache_key('frames', ("%s\0%d\0%d" % (os.path.realpath(fname), stat.st_size, stat.st_mtime_ns)).encode())
+
+  def build():
+    with open(fname, 'rb') as f:
+      if stat.st_size == 0:
+        return np.zeros(1, dtype=np.int64)
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return scan_frames(mm)
+
+  return cached(key, build)
+
+
+def stream_frames(f, last=None):
+  """
+  Yield the number and the bytes of each frame read sequentially from the binary file f, up to the frame last.
+  """
+  frame = 0
+  while last is None or frame <= last:
+    header = f.readline()
+    if not header.strip():
+      return
+    lines = [header] + [f.readline() for _ in range(int(header)+1)]
+    if not lines[-1].endswith(b"\n"):
+      return
+    yield frame, b"".join(lines)
+    frame += 1
+
+
+def read_frames(fname, selection):
+  """
+  Yield the number and the bytes of each frame of the trajectory fname selected by selection (a FrameSelection).
+  """
+  if compression(fname):
+    bound = selection.bound()
+    with open_file(fname, 'rb') as f:
+      if bound is None:
+        for frame, block in stream_frames(f):
+          if selection.contains(frame):
+            yield frame, block
+      else:
+        selected = set(selection.indexes(bound).tolist())
+        last = max(selected) if selected else -1
+        for frame, block in stream_frames(f, last):
+          if frame in selected:
+            yield frame, block
+    return
+
+  offsets = index_frames(fname)
+  with open(fname, 'rb') as f:
+    for frame in selection.indexes(len(offsets) - 1).tolist():
+      f.seek(offsets[frame])
+      yield frame, f.read(offsets[frame+1] - offsets[frame])
+
+
+def configuration_number(comment):
+  match = CONF_NUMBER.search(comment)
+  return int(match.group(1)) if match else None
+
+
+def find_configurations(fname, numbers):
+  """
+  Frames (0-based) with the configuration numbers given (read from the comment lines). The numbers increase along a
+  DICE trajectory, so each one is found with a binary search over the frames, reading only their comment lines.
+  """
+  numbers = sorted(set(numbers))
+  if compression(fname):
+    with open_file(fname, 'rb') as f:
+      found = {configuration_number(block.split(b"\n", 2)[1]): frame for frame, block in stream_frames(f)}
+    return [found[n] for n in numbers if n in found]
+
+  offsets = index_frames(fname)
+  nframes = len(offsets) - 1
+  frames = []
+  with open(fname, 'rb') as f:
+    def number(frame):
+      f.seek(offsets[frame])
+      f.readline()
+      return configuration_number(f.readline())
+
+    for n in numbers:
+      low, high = 0, nframes
+      while low < high:
+        mid = (low + high) // 2
+        value = number(mid)
+        if value is not None and value < n:
+          low = mid + 1
+        else:
+          high = mid
+      if low < nframes and number(low) == n:
+        frames.append(low)
+      else:
+        # not in increasing order (e.g. concatenated runs), look at every frame
+        frames.extend(frame for frame in range(nframes) if number(frame) == n)
+  return sorted(set(frames))
+
+
+def add_selection_arguments(parser):
+  group = parser.add_argument_group("frame selection")
+  group.add_argument("--start", type=int, default=None, help="first frame selected (0-based, default = 0)")
+  group.add_argument("--stop", type=int, default=None, help="frames from this one on are not selected (0-based, default = end of the trajectory)")
+  group.add_argument("--stride", type=int, default=None, help="select one frame every this number of frames (default = 1)")
+  group.add_argument("--frames", help="select these frames (0-based) instead of a range, e.g. 0,10,20-30")
+  group.add_argument("--where", nargs=3, action='append', metavar=('FILE[:COLUMN]', 'MIN', 'MAX'),
+                     help="select only the frames whose value in FILE (one row per frame, e.g. a .dat with the dihedrals or the .e12) is between MIN and MAX. "
+                     "COLUMN is a label or number of column (default = last one). If MIN > MAX the window wraps around, as for angles (e.g. 150 -150). Can be repeated")
+  group.add_argument("--rows-per-frame", type=int, default=1, help="rows of the --where files for each frame, the last of each group is used (default = 1)")
+  return group
+
+
+def where_masks(where, rows_per_frame=1):
+  masks = []
+  for spec, low, high in where or []:
+    fname, column = spec, None
+    if not os.path.isfile(spec) and ':' in spec:
+      fname, column = spec.rsplit(':', 1)
+    values = read_series(fname, column)[rows_per_frame-1::rows_per_frame]
+    masks.append(window_mask(values, float(low), float(high)))
+  return masks
+
+
+def selection_from_args(args, start=0, stop=None, stride=1):
+  """
+  FrameSelection of the options added by add_selection_arguments. start, stop and stride are used when the options
+  are not given.
+  """
+  frames = parse_frames(args.frames) if args.frames else None
+  return FrameSelection(args.start if args.start is not None else start,
+                        args.stop if args.stop is not None else stop,
+                        args.stride if args.stride is not None else stride,
+                        frames, where_masks(args.where, args.rows_per_frame))
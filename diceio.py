@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Shared file opening for the trajectory and series tools.
+
+Files ending in .gz, .bz2, .xz or .zst are compressed or decompressed on the
+fly. When a multi-threaded tool (pigz, lbzip2, pbzip2, xz or zstd) is found in
+the PATH it runs in a pipe, otherwise the Python modules are used.
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import os
+import shutil
+import subprocess
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+# external tools for each extension, in order of preference, with the options setting the number of threads
+TOOLS = {
+  '.gz': [('pigz', lambda n: ['-p', str(n)])],
+  '.bz2': [('lbzip2', lambda n: ['-n', str(n)]), ('pbzip2', lambda n: ['-p%d' % n])],
+  '.xz': [('xz', lambda n: ['-T%d' % n])],
+  '.zst': [('zstd', lambda n: ['-q', '-T%d' % n])],
+}
+
+MODULES = {
+  '.gz': lambda fname, mode: gzip.open(fname, mode, compresslevel=6),
+  '.bz2': bz2.open,
+  '.xz': lzma.open,
+}
+
+
+class PipeFile:
+  """
+  File object reading from or writing to a compression tool running in a pipe.
+  """
+
+  def __init__(self, fname, proc, stream, target=None):
+    self.name = fname
+    self._proc = proc
+    self._stream = stream
+    self._target = target
+    # set when a read returns nothing, so the exit code of the decompressor is checked on close
+    self._eof = False
+
+  def __getattr__(self, attr):
+    return getattr(self._stream, attr)
+
+  def _check(self, data):
+    if not data:
+      self._eof = True
+    return data
+
+  def read(self, *args):
+    return self._check(self._stream.read(*args))
+
+  def read1(self, *args):
+    return self._check(self._stream.read1(*args))
+
+  def readline(self, *args):
+    return self._check(self._stream.readline(*args))
+
+  def readlines(self, *args):
+    lines = self._stream.readlines(*args)
+    if not args or args[0] is None or args[0] <= 0:
+      self._eof = True
+    return lines
+
+  def readinto(self, buf):
+    return self._check(self._stream.readinto(buf))
+
+  def __iter__(self):
+    for line in self._stream:
+      yield line
+    self._eof = True
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+  def close(self):
+    if self._stream.closed:
+      return
+    self._stream.close()
+    retcode = self._proc.wait()
+    if self._target is not None:
+      self._target.close()
+      if retcode != 0:
+        raise IOError("Failed compressing %s (%s returned %d)" % (self.name, self._proc.args[0], retcode))
+    # a reader that stopped before the end kills the tool (SIGPIPE), the exit code only counts after the whole file
+    elif self._eof and retcode != 0:
+      raise IOError("Failed decompressing %s (%s returned %d)" % (self.name, self._proc.args[0], retcode))
+
+
+def compression(fname):
+  """
+  Return the compression extension of the file name or an empty string if it is not compressed.
+  """
+  ext = os.path.splitext(fname)[1].lower()
+  return ext if ext in TOOLS else ''
+
+
+def find_tool(ext):
+  for tool, thread_opts in TOOLS.get(ext, []):
+    if shutil.which(tool):
+      return tool, thread_opts
+  return None, None
+
+
+def open_file(fname, mode='r', threads=None):
+  """
+  Open fname for reading or writing ('r', 'rb', 'w', 'wb', 'a' or 'ab'), compressing or
+  decompressing according to the extension. threads is the number of threads given to the
+  external tool, by default the number of CPUs.
+  """
+  ext = compression(fname)
+  if not ext:
+    return open(fname, mode)
+
+  binary = 'b' in mode
+  writing = mode[0] in 'wa'
+  threads = threads or os.cpu_count() or 1
+
+  tool, thread_opts = find_tool(ext)
+  if tool:
+    if writing:
+      target = open(fname, mode[0] + 'b')
+      proc = subprocess.Popen([tool, '-c'] + thread_opts(threads), stdin=subprocess.PIPE, stdout=target)
+      stream = proc.stdin if binary else io.TextIOWrapper(proc.stdin)
+      return PipeFile(fname, proc, stream, target)
+    else:
+      if not os.path.isfile(fname):
+        raise FileNotFoundError(fname)
+      proc = subprocess.Popen([tool, '-dc'] + thread_opts(threads) + [fname], stdout=subprocess.PIPE)
+      stream = proc.stdout if binary else io.TextIOWrapper(proc.stdout)
+      return PipeFile(fname, proc, stream)
+
+  bmode = mode[0] + 'b'
+  if ext == '.zst':
+    if zstandard is None:
+      raise ImportError("Reading or writing %s needs the zstd tool or the zstandard module" % fname)
+    if writing:
+      fobj = zstandard.open(fname, bmode, cctx=zstandard.ZstdCompressor(threads=threads))
+    else:
+      fobj = zstandard.open(fname, bmode)
+  else:
+    fobj = MODULES[ext](fname, bmode)
+
+  return fobj if binary else io.TextIOWrapper(fobj)
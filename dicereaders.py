@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Readers of the DICE output files shown by DiceWin. They do not depend on the
+graphical interface, so they can also be used from scripts.
+"""
+
+import io
+import mmap
+import re
+from array import array
+from collections import OrderedDict
+import numpy as np
+from dicedeps import pd
+
+# fields that overflowed the Fortran format are written as asterisks
+OVERFLOW = re.compile(rb'\*+')
+
+# columns of the fields of the .hbd files, the last one goes up to the end of the line
+HBD_FIELDS = [(29, 35), (35, 42), (42, 51), (51, 60), (60, 69), (69, 78), (78, 87), (87, 96), (96, None)]
+
+# characters of the numbers of the fields of the .hbd files (0 pads the short lines in byte_table)
+NUMBER_BYTES = np.frombuffer(b'0123456789.+-eE \t\x00', dtype=np.uint8)
+
+# header line of each pair of the .gr files, as "# RDF ..."
+GR_HEADER = re.compile(rb'^[ \t]*\S+[ \t]+RDF\b[^\n]*$', re.M)
+
+GR_LABELS = ['r', 'G(r)', 'N(r)']
+
+# first word of the header line repeated at the beginning of each block of the .eij files
+EIJ_HEADER = b'NMOVE'
+
+
+def parse_block(body, ncols, dtype=np.float64):
+  """
+  (Bytes, Int, Type) -> Array
+  Parse the numeric lines of body into an array with ncols columns. Overflowed fields (****) and values missing
+  from incomplete lines are NaN, so every line of the file keeps its row.
+  """
+  if b'*' in body:
+    body = OVERFLOW.sub(b' nan ', body)
+  if not body.strip():
+    return np.zeros((0, ncols), dtype=dtype)
+
+  # the C parser of numpy fails unless every line has the same number of fields
+  try:
+    data = np.loadtxt(io.BytesIO(body), dtype=dtype, comments=None, ndmin=2)
+    if data.shape[1] == ncols:
+      return data
+  except ValueError:
+    pass    # a line with missing, extra or non-numeric fields, parse line by line below
+
+  lines = [line for line in body.split(b'\n') if line.strip()]
+  data = np.full((len(lines), ncols), np.nan, dtype=dtype)
+  for i, line in enumerate(lines):
+    for j, value in enumerate(line.split()[:ncols]):
+      try:
+        data[i, j] = float(value)
+      except ValueError:
+        pass
+
+  return data
+
+
+def eij_bodies(raw):
+  """
+  (Bytes) -> List
+  Split the data of a .eij file (without its first header line) in the bodies of the blocks, which are separated by
+  lines starting with NMOVE.
+  """
+  bodies = []
+  start = pos = 0
+  while True:
+    pos = raw.find(EIJ_HEADER, pos)
+    if pos == -1:
+      break
+    bol = raw.rfind(b'\n', 0, pos) + 1
+    eol = raw.find(b'\n', pos)
+    eol = len(raw) if eol == -1 else eol + 1
+    if not raw[bol:pos].strip():
+      bodies.append(raw[start:bol])
+      start = eol
+    pos = eol
+  bodies.append(raw[start:])
+  return bodies
+
+
+def read_eij(fname):
+  """
+  (String) -> List, List
+  Read the .eij (or .e12, .e13, ...) file, which can have several blocks starting with a NMOVE header line (one for
+  each simulation output). Return the labels and a list with one DataFrame for each block.
+  """
+  with open(fname, 'rb') as f:
+    raw = f.read()
+
+  header, _, raw = raw.partition(b'\n')
+  labels = header.decode().split()
+
+  blocks = [pd.DataFrame(parse_block(body, len(labels)), columns=labels) for body in eij_bodies(raw)]
+
+  return labels, blocks
+
+
+def eij_dataset(fname):
+  """
+  (String) -> List, DataFrame, List
+  Read the .eij file and join its blocks in a DataFrame indexed by (block number, label).
+  """
+  labels, blocks = read_eij(fname)
+  keys = list(range(1, len(blocks) + 1))
+  data = pd.concat(blocks, axis=1, keys=keys)
+  items = ['Simulation output {}'.format(c) for c in keys]
+
+  return labels, data, items
+
+
+def read_gr(fname):
+  """
+  (String) -> List, DataFrame
+  Read all the radial distribution functions of a .gr file. Return the names of the pairs and a DataFrame indexed
+  by (pair, label), with the labels r, G(r) and N(r).
+  """
+  with open(fname, 'rb') as f:
+    f.readline()
+    raw = f.read()
+
+  grItems, blocks = [], []
+  headers = list(GR_HEADER.finditer(raw))
+  for k, header in enumerate(headers):
+    tokens = header.group().decode().split()
+    grItems.append('{}{}({})-{}{}({})'.format(tokens[4], tokens[5], tokens[9], tokens[11], tokens[12], tokens[16]))
+    end = headers[k + 1].start() if k + 1 < len(headers) else len(raw)
+    blocks.append(pd.DataFrame(parse_block(raw[header.end():end], len(GR_LABELS)), columns=GR_LABELS))
+
+  return grItems, pd.concat(blocks, axis=1, keys=grItems)
+
+
+def byte_table(raw):
+  """
+  (Bytes) -> Array
+  View the non-empty lines of raw as a 2D array of bytes (one row per line), padding shorter lines with zeros.
+  """
+  width = raw.find(b'\n') + 1
+  if width > 0 and len(raw) % width == 0:
+    table = np.frombuffer(raw, dtype=np.uint8).reshape(-1, width)
+    if (table[:, -1] == ord('\n')).all():
+      return table[:, :-1]
+
+  lines = [line.rstrip(b'\r') for line in raw.split(b'\n') if line.strip()]
+  width = max((len(line) for line in lines), default=0)
+  if not width:
+    return np.zeros((0, 0), dtype=np.uint8)
+
+  return np.array(lines, dtype='S{}'.format(width)).view(np.uint8).reshape(len(lines), width)
+
+
+def decode_field(table, start, end, dtype=np.float64):
+  """
+  (Array, Int, Int, Type) -> Array
+  Convert the fixed-width field table[:, start:end] of a byte table to numbers, with NaN where it is not a number.
+  """
+  field = np.ascontiguousarray(table[:, start:end])
+  text = field.view('S{}'.format(field.shape[1])).ravel()
+  try:
+    return text.astype(dtype)
+  except ValueError:
+    pass    # some field is not a number, convert them one by one
+
+  values = np.full(len(text), np.nan, dtype=dtype)
+  for i, value in enumerate(text):
+    try:
+      values[i] = float(value)
+    except ValueError:
+      pass
+  return values
+
+
+def numeric_field(table, start, end):
+  """
+  (Array, Int, Int) -> Array
+  True for the rows of the byte table whose field table[:, start:end] has only the characters of a number and at
+  least one digit, without converting it.
+  """
+  field = table[:, start:end]
+  return np.isin(field, NUMBER_BYTES).all(axis=1) & ((field >= ord('0')) & (field <= ord('9'))).any(axis=1)
+
+
+def read_hbd(fname, columns=None):
+  """
+  (String, List) -> String, List, DataFrame
+  Read the hydrogen bond criteria, labels and data of a .hbd file. Only the fields of the labels in columns are
+  decoded (all of them by default). Lines with overflowed (****) or non-numeric fields and lines too short to have
+  all the fields are not used, whatever the columns read.
+  """
+  with open(fname, 'rb') as f:
+    criteria = f.readline()[2:].decode()
+    labels = f.readline().split()[4:]
+    raw = f.read()
+
+  labels = [lab.decode() for lab in labels]
+  fields = [(lab, field) for lab, field in zip(labels, HBD_FIELDS) if columns is None or lab in columns]
+  table = byte_table(raw)
+  if table.shape[1] <= HBD_FIELDS[-1][0]:
+    return criteria, labels, pd.DataFrame({lab: np.zeros(0) for lab, _ in fields})
+
+  # '\r' of files with Windows line endings would end up in the last field
+  table = np.where(table == ord('\r'), 0, table).astype(np.uint8)
+  # the shorter lines were padded with zeros by byte_table, the last field needs something besides blanks
+  last = table[:, HBD_FIELDS[-1][0]:]
+  valid = ((last != 0) & (last != ord(' ')) & (last != ord('\t'))).any(axis=1)
+  # as the lines with ****, the ones with a field that is not a number are dropped, checked on the bytes so the
+  # fields not requested need not be decoded
+  for _, (start, end) in zip(labels, HBD_FIELDS):
+    valid &= numeric_field(table, start, end)
+  table = table[valid]
+
+  return criteria, labels, pd.DataFrame({lab: decode_field(table, start, end) for lab, (start, end) in fields})
+
+
+class HbdTable:
+  """
+  Fields of a .hbd file decoded only when they are requested, at most maxcols of them kept in memory (discarding the
+  least recently used), selected as the columns of LazyTable.
+  """
+
+  def __init__(self, fname, maxcols=8):
+    with open(fname, 'rb') as f:
+      self.criteria = f.readline()[2:].decode()
+      self.labels = [lab.decode() for lab in f.readline().split()[4:]]
+    self.fname = fname
+    self.maxcols = maxcols
+    self.cache = OrderedDict()
+
+  def __len__(self):
+    return len(self[self.labels[0]]) if self.labels else 0
+
+  def __getitem__(self, key):
+    if isinstance(key, (list, tuple)):
+      missing = [lab for lab in key if lab not in self.cache]
+      if len(missing) > 1:
+        # the plotted columns are decoded together
+        for lab, column in read_hbd(self.fname, missing)[2].items():
+          self.store(lab, column)
+      return pd.DataFrame({lab: self[lab] for lab in key})
+
+    if key in self.cache:
+      self.cache.move_to_end(key)
+      return self.cache[key]
+
+    if key not in self.labels:
+      raise KeyError(key)
+    return self.store(key, read_hbd(self.fname, [key])[2][key])
+
+  def store(self, key, column):
+    self.cache[key] = column
+    if len(self.cache) > self.maxcols:
+      self.cache.popitem(last=False)
+    return column
+
+
+class LazyTable:
+  """
+  Columns of a whitespace separated file (as the .dst and .avr) that are read only when they are requested. The lines
+  are indexed once, each column is parsed alone by the C parser of pandas and at most maxcols columns are kept in
+  memory, discarding the least recently used. Lines with overflowed fields (****) are not used, as in the DataFrames
+  read at once. A column is selected with table[label] (a Series) and a few of them with table[[label1, label2]] (a
+  DataFrame).
+  """
+
+  def __init__(self, fname, labels, usecols=None, skiprows=1, maxcols=8):
+    self.fname = fname
+    self.labels = list(labels)
+    self.usecols = list(usecols) if usecols is not None else list(range(len(self.labels)))
+    self.skiprows = skiprows
+    self.maxcols = maxcols
+    self.cache = OrderedDict()
+    self.indexLines()
+
+  def indexLines(self):
+    """
+    (None) -> None
+    Find the offsets of the data lines that are not blank (only spaces, tabs or carriage returns, as skipped by the parser) and
+    which of them have overflowed fields.
+    """
+    with open(self.fname, 'rb') as f:
+      size = f.seek(0, 2)
+      if size == 0:
+        self.offsets = np.zeros(0, dtype=np.int64)
+        self.valid = np.zeros(0, dtype=bool)
+        return
+
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        buf = np.frombuffer(mm, dtype=np.uint8)
+        ends = np.flatnonzero(buf == ord('\n'))
+        if buf[-1] != ord('\n'):
+          ends = np.append(ends, size)
+        starts = np.concatenate(([0], ends[:-1] + 1))[self.skiprows:]
+        ends = ends[self.skiprows:]
+
+        blank = (buf == ord(' ')) | (buf == ord('\t')) | (buf == ord('\r')) | (buf == ord('\n'))
+        # characters that are not blank in each line (an empty line counts only its line break)
+        nonempty = np.add.reduceat(~blank, starts, dtype=np.int64) > 0 if len(starts) else np.zeros(0, dtype=bool)
+        del blank
+
+        stars = np.flatnonzero(buf == ord('*'))
+        if len(starts):
+          stars = stars[stars >= starts[0]]
+        del buf    # the memory map can only be closed without views of it
+
+    overflowed = np.zeros(len(starts), dtype=bool)
+    overflowed[np.searchsorted(ends, stars)] = True
+
+    self.offsets = starts[nonempty]
+    self.valid = ~overflowed[nonempty]
+
+  def __len__(self):
+    return int(self.valid.sum())
+
+  def __getitem__(self, key):
+    if isinstance(key, (list, tuple)):
+      return pd.DataFrame({lab: self[lab] for lab in key})
+
+    if key in self.cache:
+      self.cache.move_to_end(key)
+      return self.cache[key]
+
+    column = pd.Series(self.loadColumn(self.usecols[self.labels.index(key)])[self.valid], name=key)
+    self.cache[key] = column
+    if len(self.cache) > self.maxcols:
+      self.cache.popitem(last=False)
+
+    return column
+
+  def loadColumn(self, col):
+    """
+    (Int) -> Array
+    Parse the field col of every indexed line, with NaN where it is not a number.
+    """
+    try:
+      values = pd.read_csv(self.fname, sep=r'\s+', header=None, skiprows=self.skiprows, usecols=[col],
+                           names=range(col + 1), index_col=False, engine='c', low_memory=False).iloc[:, 0]
+      if len(values) == len(self.offsets):
+        # a column with **** is read as text
+        return pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+    except (ValueError, IndexError):
+      pass    # lines with more fields than expected, parse them one by one below
+
+    values = np.full(len(self.offsets), np.nan)
+    with open(self.fname, 'rb') as f:
+      for row, offset in enumerate(self.offsets.tolist()):
+        f.seek(offset)
+        try:
+          values[row] = float(f.readline().split()[col])
+        except (ValueError, IndexError):
+          pass
+
+    return values
+
+
+def repeated_label(labels):
+  lab_set = frozenset(labels)
+  rep_ind = {lab: [] for lab in lab_set}
+
+  for slab in lab_set:
+    for i, lab in enumerate(labels):
+      if lab == slab:
+        rep_ind[slab].append(i)
+
+  return rep_ind
+
+
+def gen_new_labels(labels):
+  reap = repeated_label(labels).values()
+  for rinds in reap:
+    j = 1
+    for i in rinds:
+      if len(rinds) > 1:
+        labels[i] += str(j)
+        j += 1
+
+  return labels
+
+
+def out_steps(fname):
+  """
+  (String) -> Int
+  Number of MC steps of a DICE .out file, from the lines before the table of the steps (0 if it is not there).
+  """
+  with open(fname, 'rt') as f:
+    for line in f:
+      if "MC steps" in line:
+        return int(line.split()[-1])
+      if 'NMOVE' in line:
+        break
+  return 0
+
+
+def read_out(fname):
+  """
+  (String) -> List, DataFrame, Bool
+  Read the properties printed at each step in a DICE .out file. Return the labels, the data and whether the
+  simulation finished.
+  """
+  with open(fname, 'rt') as f:
+    for line in f:
+      if "MC steps" in line:
+        sim_len = int(line.split()[-1])
+      if 'NMOVE' in line:
+        labels = line.rstrip().split()
+        f.readline()
+        break
+
+    data = {
+        lab: np.zeros(sim_len, dtype=np.float32) for lab in labels[1:]
+    }
+
+    enum = list(enumerate(labels[1:]))
+
+    i = -1
+    sim_len -= 1
+
+    for line in f:
+      try:
+        if line[-5] == "#":
+          i += 1
+          line_values = line.split()[1:-1]
+          for j, lab in enum:
+            data[lab][i] = line_values[j]
+      except (IndexError, ValueError):
+        break
+
+  data = pd.DataFrame(data)
+  data["NMOVE"] = np.arange(1, sim_len + 2, dtype=np.uint32)
+  data = data.reindex(columns=labels, copy=False)
+
+  return labels, data, i == sim_len
+
+
+def read_xvg(fname):
+  """
+  (String) -> List, DataFrame
+  Read a GROMACS .xvg file, using the legends as labels.
+  """
+  with open(fname, 'rt') as f:
+    labels = ['x']
+    for line in f:
+      if '#' in line:
+        pass
+      elif '@' in line:
+        if (re.search(r's\d', line) != None) and ("legend" in line):
+          labels.append(re.search(r'"(.*?)"', line).group()[1:-1])
+      else:
+        initval = line.split()
+        break
+
+    if len(labels) == 1:
+      val_qt = len(initval)
+      for i in range(val_qt-1):
+        labels.append("y{}".format(i))
+
+    data = {lab: array('f') for lab in labels}
+    enum = list(enumerate(labels))
+
+    for i, lab in enum:
+      data[lab].append(float(initval[i]))
+
+    for line in f:
+      values = line.split()
+      if len(values) == len(labels): # pass empty or incomplete lines
+        for i, lab in enum:
+          data[lab].append(float(values[i]))
+
+  return labels, pd.DataFrame(data)
+
+
+def is_eij(extension):
+  """
+  (String) -> Bool
+  True for the extensions of the .eij files (.eij, .e12, .e13, ...).
+  """
+  return extension[0] == 'e' and (extension[-2:] == 'ij' or extension[-2:].isdigit())
+
+
+def read_dice_file(fname):
+  """
+  (String) -> List, DataFrame, List, List
+  Read any of the files opened by DiceWin, choosing the reader by the extension. Return the labels, the data, the
+  pairs of the .gr files and the blocks of the .eij files (the last two are empty for the other files).
+  """
+  extension = fname.split('.')[-1]
+  grItems, eijItems = [], []
+
+  if extension == 'out':
+    labels, data, _ = read_out(fname)
+
+  elif extension == 'dst':
+    with open(fname, 'rt') as f:
+      labels = f.readline().split()
+
+    usecols = [i for i, lab in enumerate(labels) if lab not in ('i', 'j')]
+    labels = [labels[i] for i in usecols]
+    data = LazyTable(fname, labels, usecols)
+
+  elif extension == 'hbd':
+    data = HbdTable(fname)
+    labels = data.labels
+
+  elif extension == 'gr':
+    labels = list(GR_LABELS)
+    grItems, data = read_gr(fname)
+
+  elif is_eij(extension):
+    labels, data, eijItems = eij_dataset(fname)
+
+  elif extension == 'xvg':
+    labels, data = read_xvg(fname)
+
+  # *.avr and generic files
+  else:
+    with open(fname, 'rt') as f:
+      labels = gen_new_labels(f.readline().split())
+
+    data = LazyTable(fname, labels)
+
+  return labels, data, grItems, eijItems
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+Topology of the DICE inputs: the molecules of the .txt and the fragments and
+degrees of freedom of the .dfr, parsed once into numpy arrays, and the index
+of the parameters of the GROMACS force fields used by gromacs2dice.
+
+The parsed topologies and force fields are kept in a cache keyed by the hash of the file
+contents, in memory and pickled in ~/.cache/dicetools (or in the directory
+set by DICETOOLS_CACHE, use DICETOOLS_CACHE=off to disable it), so the tools
+of a pipeline reading the same inputs do not parse them again. The pickles
+least recently used are removed when the directory grows beyond
+DICETOOLS_CACHE_SIZE megabytes (256 by default).
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import deque
+import numpy as np
+
+# bump when the classes below change, so old pickles are not used
+CACHE_VERSION = 1
+
+# megabytes of pickles kept in the cache directory when DICETOOLS_CACHE_SIZE is not set
+CACHE_SIZE = 256
+
+_memory = {}
+
+
+class TopologyError(ValueError):
+  pass
+
+
+class IncompleteMolecule(TopologyError):
+  """
+  The .txt has less atom lines than the number of atoms given for the molecule mol (1-based).
+  at is the index of the first missing atom.
+  """
+
+  def __init__(self, mol, natom, at):
+    super().__init__("Molecule %d of the .txt should have %d atoms, but only %d were found" % (mol, natom, at))
+    self.mol = mol
+    self.natom = natom
+    self.at = at
+
+
+class Molecule:
+  """
+  A molecule of the .txt. All the arrays have one row for each atom: the site type (used in the RDFs), the atomic
+  number, the coordinates and the nonbonded parameters (charge, epsilon and sigma, NaN if not numbers as in the
+  templates written by fragGen).
+  """
+
+  def __init__(self, title, types, atomic_numbers, coords, nbparams):
+    self.title = title
+    self.types = types
+    self.atomic_numbers = atomic_numbers
+    self.coords = coords
+    self.nbparams = nbparams
+
+  def __len__(self):
+    return len(self.atomic_numbers)
+
+  @property
+  def charges(self):
+    return self.nbparams[:, 0]
+
+  @property
+  def epsilons(self):
+    return self.nbparams[:, 1]
+
+  @property
+  def sigmas(self):
+    return self.nbparams[:, 2]
+
+
+class Txt:
+  """
+  Contents of the .txt: the combination rule of sigma ('*' geometric, otherwise arithmetic) and the molecules.
+  """
+
+  def __init__(self, combrule, molecules):
+    self.combrule = combrule
+    self.molecules = molecules
+
+  @property
+  def mult(self):
+    return self.combrule == '*'
+
+
+class Terms:
+  """
+  Lines of a section of degrees of freedom of the .dfr: the atoms (1-based, one row for each line), the tokens
+  after the atoms and the lines themselves (stripped).
+  """
+
+  def __init__(self, atoms, params, lines):
+    self.atoms = atoms
+    self.params = params
+    self.lines = lines
+
+  def __len__(self):
+    return len(self.lines)
+
+
+class Dfr:
+  """
+  Contents of the .dfr. Fragments have their number in the file, kind ('R' rigid or 'F' flexible) and atoms
+  (1-based). connections are the terms of the pairs of connected fragments. The sections of degrees of freedom not
+  present in the file are None.
+  """
+
+  def __init__(self, fragment_ids, fragment_kinds, fragments, connections, bonds, angles, dihedrals, impropers):
+    self.fragment_ids = fragment_ids
+    self.fragment_kinds = fragment_kinds
+    self.fragments = fragments
+    self.connections = connections
+    self.bonds = bonds
+    self.angles = angles
+    self.dihedrals = dihedrals
+    self.impropers = impropers
+
+  def rigid_fragments(self):
+    return [frag for frag, kind in zip(self.fragments, self.fragment_kinds) if kind.upper() == 'R']
+
+  def bonded_to(self):
+    """
+    Dictionary with the atoms bonded to each atom, in the order of the bond section.
+    """
+    conn = {}
+    for a1, a2 in self.bonds.atoms.tolist():
+      conn.setdefault(a1, []).append(a2)
+      conn.setdefault(a2, []).append(a1)
+    return conn
+
+  def fragments_by_id(self):
+    """
+    Dictionary with the atoms of each fragment, keyed by its number in the file (used by the fragment connections).
+    """
+    return dict(zip(self.fragment_ids, self.fragments))
+
+  def bond_sides(self):
+    """
+    Atoms at each side of every bond shared by two connected fragments (see bond_sides).
+    """
+    return bond_sides(self.fragments_by_id(), self.connected_fragments())
+
+  def connected_fragments(self):
+    """
+    Dictionary with the fragments (by their number in the file) connected to each fragment.
+    """
+    fconn = {}
+    for f1, f2 in self.connections.atoms.tolist():
+      fconn.setdefault(f1, []).append(f2)
+      fconn.setdefault(f2, []).append(f1)
+    return fconn
+
+
+class ForceField:
+  """
+  Index of the parameters of a GROMACS force field directory (ffnonbonded.itp and ffbonded.itp). The lines of the
+  atom types and the line numbers of the bond and angle types are kept by their atom types, and the line numbers of
+  each [ dihedraltypes ] section by the dihedral type and the four atom types. When more than one line matches, the
+  first in the file is used, as when the files were scanned.
+  """
+
+  def __init__(self, nonbonded, bonded):
+    self.atomtypes = {}
+    self.bondtypes = {}
+    self.angletypes = {}
+    self.dihedraltypes = []
+    self.bonded = bonded.splitlines(True)
+
+    for line in nonbonded.splitlines(True):
+      if itp_data(line):
+        self.atomtypes.setdefault(line.split()[0], line)
+
+    section = None
+    for lineno, line in enumerate(self.bonded):
+      stripped = line.strip()
+      if stripped.startswith('['):
+        section = stripped.strip('[] \t')
+        if section == 'dihedraltypes':
+          self.dihedraltypes.append({})
+        continue
+      if not itp_data(line):
+        continue
+
+      fields = line.split()
+      if section == 'bondtypes' and len(fields) >= 2:
+        self.bondtypes.setdefault(tuple(fields[:2]), lineno)
+      elif section == 'angletypes' and len(fields) >= 3:
+        self.angletypes.setdefault(tuple(fields[:3]), lineno)
+      elif section == 'dihedraltypes' and len(fields) >= 5 and fields[4].lstrip('-').isdigit():
+        self.dihedraltypes[-1].setdefault((int(fields[4]),) + tuple(fields[:4]), []).append(lineno)
+
+  def first(self, table, candidates):
+    linenos = [table[types] for types in candidates if types in table]
+    return self.bonded[min(linenos)] if linenos else None
+
+  def bond(self, t1, t2):
+    return self.first(self.bondtypes, [(t1, t2), (t2, t1)])
+
+  def angle(self, t1, t2, t3):
+    return self.first(self.angletypes, [(t1, t2, t3), (t3, t2, t1)])
+
+  def dihedrals(self, section, dtype, candidates):
+    """
+    Lines of the section with the dihedral type dtype and the atom types of any of the candidates, in the order of
+    the file.
+    """
+    linenos = set()
+    for types in candidates:
+      linenos.update(section.get((dtype,) + types, []))
+    return [self.bonded[i] for i in sorted(linenos)]
+
+
+def fragment_side(fragments, fconn, start, cut):
+  """
+  Atoms (sorted array) of the fragments reached from the fragment start without passing by the fragment cut, i.e.
+  the side of start when the connection start-cut is cut. fragments has the atom arrays of the fragments and fconn
+  the fragments connected to each fragment, both keyed by the number of the fragment in the .dfr.
+  """
+  visited = {start, cut}
+  side = [start]
+  queue = deque([start])
+  while queue:
+    for frag in fconn.get(queue.popleft(), []):
+      if frag not in visited:
+        visited.add(frag)
+        side.append(frag)
+        queue.append(frag)
+  return np.unique(np.concatenate([fragments[frag] for frag in side]))
+
+
+def bond_sides(fragments, fconn):
+  """
+  Atoms at each side of every rotatable bond, i.e. the two atoms shared by a pair of connected fragments, as if the
+  connection was cut. Return a dictionary keyed by the pairs (a1, a2) of atoms of the bonds, in both orders, with the
+  atoms (sorted arrays) of the side of the fragment of the first connection of the file and of the other side, the
+  two swapped for (a2, a1). fragments and fconn are keyed by the number of the fragment, as in fragment_side.
+  """
+  sides = {}
+  for f1, connected in fconn.items():
+    for f2 in connected:
+      shared = np.intersect1d(fragments[f1], fragments[f2])
+      if len(shared) != 2:
+        continue
+      a1, a2 = shared.tolist()
+      if (a1, a2) not in sides:
+        side1 = fragment_side(fragments, fconn, f1, f2)
+        side2 = fragment_side(fragments, fconn, f2, f1)
+        sides[(a1, a2)] = (side1, side2)
+        sides[(a2, a1)] = (side2, side1)
+  return sides
+
+
+def itp_data(line):
+  stripped = line.strip()
+  return bool(stripped) and not stripped.startswith((';', '#', '['))
+
+
+def load_forcefield(path):
+  """
+  Index of the GROMACS force field in the directory path.
+  """
+  raws = [read_raw(os.path.join(path, fname)) for fname in ('ffnonbonded.itp', 'ffbonded.itp')]
+  return cached(cache_key('ff', *raws), lambda: ForceField(*[raw.decode(errors='replace') for raw in raws]))
+
+
+def to_float(token):
+  try:
+    return float(token)
+  except ValueError:
+    return np.nan
+
+
+def parse_txt(text):
+  lines = iter(text.splitlines())
+  combrule = next(lines).strip()
+  nmol = int(next(lines))
+
+  molecules = []
+  for mol in range(nmol):
+    line = next(lines)
+    while not line.strip() or line.strip().lower() == '$end':
+      line = next(lines)
+    header = line.split(None, 1)
+    natom = int(header[0])
+    title = header[1].strip() if len(header) > 1 else ''
+
+    rows = []
+    for at in range(natom):
+      fields = next(lines, '').split()
+      if len(fields) < 5 or fields[0].lower() == '$end':
+        raise IncompleteMolecule(mol + 1, natom, at)
+      rows.append(fields)
+
+    nbcols = max(3, max(len(fields) - 5 for fields in rows))
+    nbparams = np.full((natom, nbcols), np.nan)
+    for i, fields in enumerate(rows):
+      nbparams[i, :len(fields) - 5] = [to_float(x) for x in fields[5:]]
+
+    molecules.append(Molecule(title,
+                              np.array([int(fields[0]) for fields in rows], dtype=np.int32),
+                              np.array([int(fields[1]) for fields in rows], dtype=np.int32),
+                              np.array([fields[2:5] for fields in rows], dtype=np.float64).reshape(natom, 3),
+                              nbparams))
+
+  return Txt(combrule, molecules)
+
+
+def dfr_sections(text):
+  """
+  Split the .dfr in its sections. Return a dictionary with the name of each section (lower case, without $) and
+  its lines, ignoring the empty and commented ones.
+  """
+  sections = {}
+  current = None
+  for line in text.splitlines():
+    stripped = line.strip()
+    if not stripped or stripped.startswith('#'):
+      continue
+    if stripped.startswith('$'):
+      name = ' '.join(stripped[1:].lower().split())
+      current = None if name.startswith('end') else sections.setdefault(name, [])
+    elif current is not None:
+      current.append(stripped)
+  return sections
+
+
+def parse_fragments(lines):
+  ids, kinds, fragments = [], [], []
+  tokens = ' '.join(lines).split()
+  i = 0
+  while i < len(tokens):
+    if i + 1 >= len(tokens) or tokens[i+1] != '[' or ']' not in tokens[i+2:]:
+      raise TopologyError("It seems like the fragments in your .dfr are not delimited by []'s as in \"1 [ 1 2 3 ] R\"")
+    end = tokens.index(']', i + 2)
+    ids.append(int(tokens[i]))
+    fragments.append(np.array(tokens[i+2:end], dtype=np.int32))
+    kinds.append(tokens[end+1] if end + 1 < len(tokens) else '')
+    i = end + 2
+  return ids, kinds, fragments
+
+
+def parse_terms(lines, natoms):
+  if lines is None:
+    return None
+  atoms = np.array([line.split()[:natoms] for line in lines], dtype=np.int32).reshape(len(lines), natoms)
+  params = [line.split()[natoms:] for line in lines]
+  return Terms(atoms, params, list(lines))
+
+
+def parse_dfr(text):
+  sections = dfr_sections(text)
+  ids, kinds, fragments = parse_fragments(sections.get('atoms fragments', []))
+  connections = parse_terms(sections.get('fragment connection', []), 2)
+
+  return Dfr(ids, kinds, fragments, connections,
+             parse_terms(sections.get('bond'), 2),
+             parse_terms(sections.get('angle'), 3),
+             parse_terms(sections.get('dihedral'), 4),
+             parse_terms(sections.get('improper dihedral', sections.get('improper')), 4))
+
+
+def cache_dir():
+  path = os.environ.get('DICETOOLS_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'dicetools'))
+  if path.lower() in ('', '0', 'off', 'no'):
+    return None
+  return path
+
+
+def cache_size():
+  try:
+    return float(os.environ.get('DICETOOLS_CACHE_SIZE', CACHE_SIZE)) * 2**20
+  except ValueError:
+    return CACHE_SIZE * 2**20
+
+
+def evict(directory, limit):
+  """
+  Remove the pickles of the cache directory least recently used until they take at most limit bytes.
+  """
+  entries = []
+  for entry in os.scandir(directory):
+    if entry.name.endswith('.pkl'):
+      stat = entry.stat()
+      entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+  total = sum(size for _, size, _ in entries)
+  for _, size, path in sorted(entries):
+    if total <= limit:
+      break
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+    total -= size
+
+
+def cached(key, build):
+  """
+  Return the object cached with key, in memory or in the cache directory, or build() and cache it.
+  """
+  if key in _memory:
+    return _memory[key]
+
+  directory = cache_dir()
+  fname = os.path.join(directory, key + '.pkl') if directory else None
+  if fname and os.path.isfile(fname):
+    try:
+      with open(fname, 'rb') as f:
+        _memory[key] = pickle.load(f)
+      # the modification time marks the last use for the eviction
+      os.utime(fname)
+      return _memory[key]
+    except Exception:
+      pass
+
+  _memory[key] = build()
+
+  if fname:
+    # written to a temporary file and renamed, so parallel runs never read a partial pickle
+    try:
+      os.makedirs(directory, exist_ok=True)
+      fd, tmpname = tempfile.mkstemp(dir=directory, suffix='.tmp')
+      with os.fdopen(fd, 'wb') as f:
+        pickle.dump(_memory[key], f, protocol=pickle.HIGHEST_PROTOCOL)
+      os.replace(tmpname, fname)
+      evict(directory, cache_size())
+    except OSError:
+      pass
+
+  return _memory[key]
+
+
+def read_raw(source):
+  if hasattr(source, 'read'):
+    raw = source.read()
+  else:
+    with open(source, 'rb') as f:
+      raw = f.read()
+  return raw.encode() if isinstance(raw, str) else raw
+
+
+def cache_key(kind, *raws):
+  digest = hashlib.blake2b(digest_size=20)
+  for raw in raws:
+    digest.update(len(raw).to_bytes(8, 'little'))
+    digest.update(raw)
+  return '{}-{}-{}'.format(kind, CACHE_VERSION, digest.hexdigest())
+
+
+def load(source, kind, parser):
+  """
+  Parse source (a file name or an open file) with parser, using the cached result if the same contents were parsed
+  before.
+  """
+  raw = read_raw(source)
+  return cached(cache_key(kind, raw), lambda: parser(raw.decode(errors='replace')))
+
+
+def load_txt(source):
+  """
+  Topology of a DICE .txt (file name or open file).
+  """
+  return load(source, 'txt', parse_txt)
+
+
+def load_dfr(source):
+  """
+  Topology of a DICE .dfr (file name or open file).
+  """
+  return load(source, 'dfr', parse_dfr)
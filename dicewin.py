@@ -4,7 +4,6 @@
 import sys
 import os
 import time
-import re
 import numpy as np
 import matplotlib
 matplotlib.use('Qt5Agg')
@@ -12,9 +11,9 @@ from matplotlib.figure import Figure
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.backends.backend_qt5agg import NavigationToolbar2QT as NavigationToolbar
 from PyQt5 import QtCore, QtGui, QtWidgets
-from scipy.odr import ODR, Model, RealData
-from array import array
-from pandas import DataFrame, concat
+from dicereaders import HbdTable, LazyTable, out_steps, read_dice_file, read_out
+from rdf_tools import moldim_correction
+import diceanalysis
 
 matplotlib.rcParams['agg.path.chunksize'] = 100000000
 
@@ -531,29 +530,6 @@ class graphMainWindow(QtWidgets.QMainWindow):
     info.setIcon(1)
     info.exec_()
 
-  def read_block(self, f, labels):
-    data = {lab: array('f') for lab in labels}
-
-    enum = list(enumerate(labels))
-
-    new_block = False
-
-    for line in f:
-      line_values = line.split()
-      try:
-        for j, lab in enum:
-          data[lab].append(float(line_values[j]))
-      except:
-        if line_values[0] == 'NMOVE':
-          new_block = True
-          break
-        else:
-          pass    # ignore line with data ****
-
-    data = DataFrame(data)
-
-    return data, new_block
-
   def readFile(self):
     """
     (None) -> List, List, List, List, String, String
@@ -566,181 +542,30 @@ class graphMainWindow(QtWidgets.QMainWindow):
     selectedFileName = openFile.getOpenFileName()[0]
 
     if selectedFileName:
-      labels, grItems, eijItems = [], [], []
       filename = str((selectedFileName.split('.'))[0])
       extension = str((selectedFileName.split('.'))[-1])
 
-      # *.out files
-      if (extension == 'out'):
-        with open(selectedFileName, 'rt') as f:
-          for line in f:
-            if "MC steps" in line:
-              sim_len = int(line.split()[-1])
-            if 'NMOVE' in line:
-              labels = line.rstrip().split()
-              f.readline()
-              break
-
-          if sim_len >= 1000000:
+      try:
+        # *.out files
+        if (extension == 'out'):
+          if out_steps(selectedFileName) >= 1000000:
             self.status.showMessage("Reading this file may take some minutes")
-          data = {
-              lab: np.zeros(sim_len, dtype=np.float32) for lab in labels[1:]
-          }
-
-          enum = list(enumerate(labels[1:]))
-
-          i = -1
-          sim_len -= 1
-
-          for line in f:
-            try:
-              if line[-5] == "#":
-                i += 1
-                line_values = line.split()[1:-1]
-                for j, lab in enum:
-                  data[lab][i] = line_values[j]
-              else:
-                pass
-            except:
-              self.status.clearMessage()
-              break
-
-          if i != sim_len:
+          labels, data, finished = read_out(selectedFileName)
+          if finished:
+            self.status.clearMessage()
+          else:
             self.status.showMessage("This simulation didn't finish")
+          grItems, eijItems = [], []
 
-        data = DataFrame(data)
-        data["NMOVE"] = np.arange(1, sim_len + 2, dtype=np.uint32)
-        data = data.reindex(columns=labels, copy=False)
-
-      # *.dst files
-      elif (extension == 'dst'):
-        with open(selectedFileName, 'rt') as f:
-          labels = f.readline().split()
-          data = {lab: array('f') for lab in labels}
-          for line in f:
-            try:
-              line_values = line.split()
-              for i in range(len(line)):
-                data[labels[i]].append(float(line_values[i]))
-            except:
-              pass    # if one value in the line is "****", the line won't be used
-
-          labels = [lab for lab in labels if lab not in ('i', 'j')]
-          data.pop('i')
-          data.pop('j')
-          data = DataFrame(data)
-
-      # *.hbd files
-      elif (extension == 'hbd'):
-        with open(selectedFileName, 'rt') as f:
-          criteria = f.readline()[2:]
-          labels = (f.readline().split())[4:]
-
-          data = {lab: array('f') for lab in labels}
-          for line in f:
-            try:
-              line_values = [line[29:35],line[35:42],line[42:51],line[51:60],line[60:69],line[69:78],line[78:87],line[87:96],line[96:]]
-              for i, key in enumerate(data):
-                data[key].append(float(line_values[i]))
-            except:
-              pass    # if one value in the line is "****", the line won't be used
-
-          data = DataFrame(data)
-
-      # *.gr files
-      elif extension == 'gr':
-        with open(selectedFileName, 'rt') as f:
-          f.readline()
-          labels = ['r', 'G(r)', 'N(r)']
-          data = {lab: array('f') for lab in labels}
-          enum = list(enumerate(data))
-          blocks = []
-          for line in f:
-            linelist = line.split()
-            try:
-              if linelist[1] == "RDF":
-                grlabel = '{}{}({})-{}{}({})'.format(linelist[4], linelist[5],
-                                                     linelist[9], linelist[11],
-                                                     linelist[12], linelist[16])
-                grItems.append(grlabel)
-              else:
-                for i, lab in enum:
-                  data[lab].append(float(linelist[i]))
-            except:
-              blocks.append(DataFrame(data))
-              data = {lab: array('f') for lab in labels}
-
-          data = concat(blocks, axis=1, keys=grItems)
-
-      # *.eij files
-      elif (((extension)[0]) == 'e') and ((((extension)[-2:]) == 'ij') or ((
-          (extension)[-2:]).isdigit() == True)):
-        with open(selectedFileName, 'rt') as f:
-          labels = f.readline().split()
-          count = 1
-          eijItems.append('Simulation output {}'.format(count))
-          data, new_block = self.read_block(f, labels)
-
-          blocks = [data]
-          while new_block:
-            data, new_block = self.read_block(f, labels)
-            count += 1
-            eijItems.append('Simulation output {}'.format(count))
-            blocks.append(data)
-
-          data = concat(blocks, axis=1, keys=[c for c in range(1, count + 1)])
-
-      elif extension == "xvg":
-        with open(selectedFileName, 'rt') as f:
-          labels = ['x']
-          for line in f:
-            if '#' in line:
-              pass
-            elif '@' in line:
-              if (re.search(r's\d', line) != None) and ("legend" in line):
-                labels.append(re.search(r'"(.*?)"', line).group()[1:-1])
-            else:
-              initval = line.split()
-              break
-
-          if len(labels) == 1:
-            val_qt = len(initval)
-            for i in range(val_qt-1):
-              labels.append("y{}".format(i))
-
-          data = {lab: array('f') for lab in labels}
-          enum = list(enumerate(labels))
-
-          for i, lab in enum:
-            data[lab].append(float(initval[i]))
-
-          for line in f:
-            values = line.split()
-            if len(values) == len(labels): # pass empty or incomplete lines
-              for i, lab in enum:
-                data[lab].append(float(values[i]))
-
-          data = DataFrame(data)
-
-      # *.avr and generic files
-      else:
-        with open(selectedFileName, 'rt') as f:
-          labels = gen_new_labels(f.readline().split())
-          data = {lab: array('f') for lab in labels}
-          for line in f:
-            try:
-              line_values = line.split()
-              for i, key in enumerate(data):
-                data[key].append(float(line_values[i]))
-            except:
-              pass    # if one value in the line is "****", the line won't be used
-
-          data = DataFrame(data)
+        # *.dst, *.hbd, *.gr, *.eij, *.xvg, *.avr and generic files
+        else:
+          labels, data, grItems, eijItems = read_dice_file(selectedFileName)
+
+      except (UnboundLocalError, IndexError, ValueError, OSError) as e:
+        self.status.showMessage('ERROR: failed to read {} ({})'.format(os.path.basename(selectedFileName), e))
+        return None
 
-    try:
       return labels, data, grItems, eijItems, extension, filename
-    except (UnboundLocalError):
-      None
 
   def selectDataFile(self):
     """
@@ -748,8 +573,11 @@ class graphMainWindow(QtWidgets.QMainWindow):
     Fill the main lists with the data read from files and change layout according to the selected file extension.
     """
     try:
-      self.labels, self.dataSet, self.grMenuItems, self.eijMenuItems, self.extension, self.filename = self.readFile(
-      )
+      fileData = self.readFile()
+      # no file selected or the error of the reading is already in the status bar
+      if fileData is None:
+        return
+      self.labels, self.dataSet, self.grMenuItems, self.eijMenuItems, self.extension, self.filename = fileData
 
       if (self.extension == 'gr'):
         self.typeGraphMenu = ['scatter', 'line', 'histogram', 'ueff']
@@ -884,11 +712,11 @@ class graphMainWindow(QtWidgets.QMainWindow):
         k = int(self.dataYMenu.currentIndex())
         self.Xlabel = self.labels[j]
         self.Ylabel = self.labels[k]
-        xmin, xmax = self.dataSet.loc[:, self.Xlabel].min(
-        ), self.dataSet.loc[:, self.Xlabel].max()
-        ymin, ymax = self.dataSet.loc[:, self.Ylabel].min(
-        ), self.dataSet.loc[:, self.Ylabel].max()
-        ylen = len(self.dataSet.loc[:, self.Ylabel])
+        xmin, xmax = self.dataSet[self.Xlabel].min(
+        ), self.dataSet[self.Xlabel].max()
+        ymin, ymax = self.dataSet[self.Ylabel].min(
+        ), self.dataSet[self.Ylabel].max()
+        ylen = len(self.dataSet[self.Ylabel])
 
       return xmin, xmax, ymin, ymax, ylen
     except IndexError:
@@ -924,7 +752,9 @@ class graphMainWindow(QtWidgets.QMainWindow):
             dataplot = dataplot.loc[(xData >= xMIN) & (xData <= xMAX) &
                                     (yData >= yMIN) & (yData <= yMAX)]
           elif self.canvasInfo['type'] == "ueff":
-            dataplot[self.Ylabel] = dataplot[self.Ylabel].apply(self.ueff)
+            dataplot[self.Ylabel] = diceanalysis.ueff(
+                dataplot[self.Ylabel].to_numpy(),
+                float(self.temperature.text()))
 
         elif self.extension[0] == 'e':
           dataplot = self.dataSet.loc[:, self.EijLabel]
@@ -940,18 +770,17 @@ class graphMainWindow(QtWidgets.QMainWindow):
                                     (yData >= yMIN) & (yData <= yMAX)]
 
         else:
-          dataplot = self.dataSet
+          # just the plotted columns, the others may not even be loaded
+          dataplot = self.dataSet[list(dict.fromkeys([self.Xlabel, self.Ylabel]))]
           if self.canvasInfo["type"] == "autocorrelation":
             return dataplot
           elif (self.canvasInfo['type'] == 'histogram'):
             dataplot = dataplot.iloc[IDhMIN:IDhMAX, :]
           elif self.changeX or self.changeY:
-            dataplot = self.dataSet.loc[:, [self.Ylabel, self.Xlabel]]
-            xData, yData = dataplot.loc[:,
-                                        self.Xlabel], self.dataSet.loc[:, self.
-                                                                       Ylabel]
-            dataplot = self.dataSet.loc[(xData >= xMIN) & (xData <= xMAX) &
-                                        (yData >= yMIN) & (yData <= yMAX)]
+            xData, yData = dataplot.loc[:, self.Xlabel], dataplot.loc[:,
+                                                                      self.Ylabel]
+            dataplot = dataplot.loc[(xData >= xMIN) & (xData <= xMAX) &
+                                    (yData >= yMIN) & (yData <= yMAX)]
 
         QtWidgets.QApplication.restoreOverrideCursor()
         return dataplot
@@ -959,6 +788,8 @@ class graphMainWindow(QtWidgets.QMainWindow):
         self.status.showMessage(
             'ERROR: invalid data interval range, Min. value > Max. value.',
             3456)
+        if isinstance(self.dataSet, (LazyTable, HbdTable)):
+          return self.dataSet[list(dict.fromkeys([self.Xlabel, self.Ylabel]))]
         return self.dataSet
     except (IndexError, ValueError):
       self.status.showMessage('ERROR: invalid data interval values.', 3456)
@@ -1092,13 +923,9 @@ class graphMainWindow(QtWidgets.QMainWindow):
         except (ValueError):
           numbins = 50
 
-        L = len(dataplot.loc[:, self.Ylabel])
-        _, bins = np.histogram(dataplot.loc[:, self.Ylabel], numbins)
-        weight = [(1 / L) for _ in dataplot.loc[:, self.Ylabel]]
-
-        n, bins, _ = self.canvas.axes.hist(dataplot.loc[:, self.Ylabel],
-                                           numbins,
-                                           weights=weight)
+        n, bins, binCenter, mean, stdDev = diceanalysis.histogram(
+            dataplot.loc[:, self.Ylabel], numbins)
+        self.canvas.axes.hist(bins[:-1], bins, weights=n)
 
         if (self.extension == 'gr'):
           self.horizontalGrLine = False
@@ -1135,16 +962,13 @@ class graphMainWindow(QtWidgets.QMainWindow):
 
         decPrec = len((str(dataplot.loc[:,
                                         self.Ylabel].iloc[-1])).split('.')[-1])
-        mean = float(dataplot.loc[:, self.Ylabel].mean())
-        stdDev = float(dataplot.loc[:, self.Ylabel].std(ddof=0))
 
         points = np.linspace(float(bins[0]), float(bins[-1]), 250)
 
         if self.checkGaussian.isChecked():
           self.canvas.axes.plot(
               points,
-              binwidth * ((1 / (stdDev * np.sqrt(2 * 3.14))) * np.exp(-0.5 * (
-                  (points - mean) / stdDev)**2)),
+              diceanalysis.gaussian(points, binwidth, mean, stdDev),
               c='k',
               label='_nolegend_')
 
@@ -1154,22 +978,14 @@ class graphMainWindow(QtWidgets.QMainWindow):
         self.stdDeviationLabel.setText('Standard deviation: {}'.format(
             round(stdDev, decPrec)))
 
-        binCenter = [(bins[i - 1] + abs(bins[i] - bins[i - 1]) * 0.5)
-                     for i in range(1, len(bins))]
-
         xmin, xmax = self.canvas.axes.xaxis.get_data_interval()
         ymin, ymax = self.canvas.axes.yaxis.get_data_interval()
         self.setCanvasBoundaries(xmin, xmax, ymin, ymax)
         self.canvasInfo['title'] = '{}'.format(title)
         self.canvasInfo['data'] = [n, binCenter]
         self.canvasInfo['user parameters'] = [mean, stdDev]
-        self.canvasInfo['user data'] = [
-            binwidth *
-            ((1 /
-              (stdDev * np.sqrt(2 * 3.14))) * np.exp(-0.5 *
-                                                     ((i - mean) / stdDev)**2))
-            for i in binCenter
-        ]
+        self.canvasInfo['user data'] = diceanalysis.gaussian(
+            binCenter, binwidth, mean, stdDev)
 
       # Autocorrelation
       elif (self.canvasInfo['type'] == 'autocorrelation'):
@@ -1178,9 +994,10 @@ class graphMainWindow(QtWidgets.QMainWindow):
 
         QtWidgets.QApplication.setOverrideCursor(
             QtGui.QCursor(QtCore.Qt.WaitCursor))
-        x = np.arange(len(dataplot.loc[:, self.Ylabel]))
-        y = self.estimated_autocorrelation(dataplot.loc[:,
-                                                        self.Ylabel].to_numpy())
+        y = diceanalysis.estimated_autocorrelation(
+            dataplot.loc[:, self.Ylabel].to_numpy())
+        # the overflowed values are not in C(t)
+        x = np.arange(len(y))
         QtWidgets.QApplication.restoreOverrideCursor()
 
         self.canvasInfo['title'] = '{}'.format(yLabel)
@@ -1250,53 +1067,21 @@ class graphMainWindow(QtWidgets.QMainWindow):
     try:
       QtWidgets.QApplication.setOverrideCursor(
           QtGui.QCursor(QtCore.Qt.WaitCursor))
-      if (i == 0):
-        fit = Model(self.exponential1)
-        guess = [float(k) for k in P[:2]]
-      if (i == 1):
-        fit = Model(self.exponential2)
-        guess = [float(k) for k in P[:4]]
-      if (i == 2):
-        fit = Model(self.exponential3)
-        guess = [float(k) for k in P]
-
-      dataReal = RealData(self.canvasInfo['data'][0][:LT],
-                          self.canvasInfo['data'][1][:LT])
-      modelOdr = ODR(dataReal, fit, guess)
-      modelOdr.set_job(fit_type=2)
-      modelOutput = modelOdr.run()
+      guess = [float(k) for k in P[:2 * (i + 1)]]
+      beta = diceanalysis.fit_autocorrelation(self.canvasInfo['data'][0],
+                                              self.canvasInfo['data'][1],
+                                              guess, LT)
+      exponential = diceanalysis.EXPONENTIALS[i]
 
       xnew = np.linspace(0, LT, len(self.canvasInfo['data'][0]))
-      if (i == 0):
-        yfit = self.exponential1(modelOutput.beta, xnew)
-        yuser = self.exponential1(guess, xnew)
-        initial = self.exponential1(guess, self.canvasInfo['data'][0][:LT])
-        bestfit = self.exponential1(modelOutput.beta,
-                                    self.canvasInfo['data'][0][:LT])
-        self.oa1.setText('A1={}'.format(round(modelOutput.beta[0], 4)))
-        self.ob1.setText('B1={}'.format(round(modelOutput.beta[1], 4)))
-      if (i == 1):
-        yfit = self.exponential2(modelOutput.beta, xnew)
-        yuser = self.exponential2(guess, xnew)
-        initial = self.exponential2(guess, self.canvasInfo['data'][0][:LT])
-        bestfit = self.exponential2(modelOutput.beta,
-                                    self.canvasInfo['data'][0][:LT])
-        self.oa1.setText('A1={}'.format(round(modelOutput.beta[0], 4)))
-        self.ob1.setText('B1={}'.format(round(modelOutput.beta[1], 4)))
-        self.oa2.setText('A2={}'.format(round(modelOutput.beta[2], 4)))
-        self.ob2.setText('B2={}'.format(round(modelOutput.beta[3], 4)))
-      if (i == 2):
-        yfit = self.exponential3(modelOutput.beta, xnew)
-        yuser = self.exponential3(guess, xnew)
-        initial = self.exponential3(guess, self.canvasInfo['data'][0][:LT])
-        bestfit = self.exponential3(modelOutput.beta,
-                                    self.canvasInfo['data'][0][:LT])
-        self.oa1.setText('A1={}'.format(round(modelOutput.beta[0], 4)))
-        self.ob1.setText('B1={}'.format(round(modelOutput.beta[1], 4)))
-        self.oa2.setText('A2={}'.format(round(modelOutput.beta[2], 4)))
-        self.ob2.setText('B2={}'.format(round(modelOutput.beta[3], 4)))
-        self.oa3.setText('A3={}'.format(round(modelOutput.beta[4], 4)))
-        self.ob3.setText('B3={}'.format(round(modelOutput.beta[5], 4)))
+      yfit = exponential(beta, xnew)
+      yuser = exponential(guess, xnew)
+      initial = exponential(guess, self.canvasInfo['data'][0][:LT])
+      bestfit = exponential(beta, self.canvasInfo['data'][0][:LT])
+      for k, (oa, ob) in enumerate([(self.oa1, self.ob1), (self.oa2, self.ob2),
+                                    (self.oa3, self.ob3)][:i + 1]):
+        oa.setText('A{}={}'.format(k + 1, round(beta[2 * k], 4)))
+        ob.setText('B{}={}'.format(k + 1, round(beta[2 * k + 1], 4)))
 
       # adjust boundaries
       self.canvas.axes.plot(self.canvasInfo['data'][0][:LT + 1],
@@ -1347,7 +1132,7 @@ class graphMainWindow(QtWidgets.QMainWindow):
       ]
       self.canvasInfo['user parameters'] = [[
           i if i != '' else 'None' for i in P
-      ], modelOutput.beta,
+      ], beta,
                                             self.expMenu.currentText(), LT]
 
       self.viewAllCoord = [x, X, y, Y]
@@ -1365,34 +1150,6 @@ class graphMainWindow(QtWidgets.QMainWindow):
           3456)
       QtWidgets.QApplication.restoreOverrideCursor()
 
-  def ueff(self, val):
-    if val < 1e-20:
-      return 0
-    else:
-      return (-1.985e-3 * float(self.temperature.text()) * np.log(val))
-
-  def exponential1(self, C, t):
-    return C[0] * np.exp(-t / C[1])
-
-  def exponential2(self, C, t):
-    return C[0] * np.exp(-t / C[1]) + C[2] * np.exp(-t / C[3])
-
-  def exponential3(self, C, t):
-    return C[0] * np.exp(-t / C[1]) + C[2] * np.exp(-t / C[3]) + C[4] * np.exp(
-        -t / C[5])
-
-  def estimated_autocorrelation(self, x):
-    """
-    (Array) -> Array
-    Calculate the autocorrelation. Algorithm from: http://stackoverflow.com/q/14297012/190597
-    """
-    n = len(x)
-    variance = x.var()
-    x = x - x.mean()
-    r = np.correlate(x, x, mode='full')[-n:]
-    result = r / (variance * (np.arange(n, 0, -1)))
-    return result
-
   def changeXData(self):
     """
     (None) -> None
@@ -1419,8 +1176,8 @@ class graphMainWindow(QtWidgets.QMainWindow):
       else:
         j = int(self.dataXMenu.currentIndex())
         self.Xlabel = self.labels[j]
-        xmin, xmax = self.dataSet.loc[:, self.Xlabel].min(
-        ), self.dataSet.loc[:, self.Xlabel].max()
+        xmin, xmax = self.dataSet[self.Xlabel].min(
+        ), self.dataSet[self.Xlabel].max()
 
       self.intervalXMin.setText(str(xmin))
       self.intervalXMax.setText(str(xmax))
@@ -1460,9 +1217,9 @@ class graphMainWindow(QtWidgets.QMainWindow):
       else:
         k = int(self.dataYMenu.currentIndex())
         self.Ylabel = self.labels[k]
-        ymin, ymax = self.dataSet.loc[:, self.Ylabel].min(
-        ), self.dataSet.loc[:, self.Ylabel].max()
-        ylen = len(self.dataSet.loc[:, self.Ylabel])
+        ymin, ymax = self.dataSet[self.Ylabel].min(
+        ), self.dataSet[self.Ylabel].max()
+        ylen = len(self.dataSet[self.Ylabel])
 
       self.intervalYMin.setText(str(ymin))
       self.intervalYMax.setText(str(ymax))
@@ -1637,7 +1394,6 @@ class graphMainWindow(QtWidgets.QMainWindow):
     """
     r = self.dataSet.loc[:, (self.GrLabel, 'r')]
     gr = self.dataSet.loc[:, (self.GrLabel, 'G(r)')]
-    newGr = np.zeros(len(gr))
 
     gid = self.grMenu.currentIndex()
     graphHold = self.checkOverplot.isChecked()
@@ -1645,17 +1401,7 @@ class graphMainWindow(QtWidgets.QMainWindow):
     b = float(self.molDimB.text())
     c = float(self.molDimC.text())
 
-    halfDr = float(r[1] - r[0])
-    esfConst = ((4 * 3.1415) / 3)
-
-    for i, v in enumerate(gr):
-      rMinus = r[i] - halfDr
-      rPlus = r[i] + halfDr
-      vEsf = (esfConst) * (rPlus**3 - rMinus**3)
-      vPara = ((a + 2 * rPlus) * (b + 2 * rPlus) *
-               (c + 2 * rPlus)) - ((a + 2 * rMinus) * (b + 2 * rMinus) *
-                                   (c + 2 * rMinus))
-      newGr[i] = ((2 * v * vEsf) / (vPara))
+    newGr = moldim_correction(r.to_numpy(), gr.to_numpy(), a, b, c)
 
     self.setCanvasBoundaries(r.min(), r.max(), newGr.min(), newGr.max())
 
@@ -1703,15 +1449,12 @@ class graphMainWindow(QtWidgets.QMainWindow):
       nPlots = len(self.canvas.axes.lines)
       if (self.checkOverplot.isChecked() == False):
         try:
-          index = int(
-              np.round((event.xdata - self.dataSet.loc[0,
-                                                       (self.GrLabel, 'r')]) /
-                       (self.dataSet.loc[1, (self.GrLabel, 'r')] -
-                        self.dataSet.loc[0, (self.GrLabel, 'r')])))
-          integral = self.nrData[index]
+          r, integral = diceanalysis.rdf_integral(
+              self.dataSet.loc[:, (self.GrLabel, 'r')], self.nrData,
+              event.xdata)
           self.integralLabel.setText(
               '<small><b>INTEGRAL OF G(R):</b></small>   N(%.3f) = %.3f' %
-              (self.dataSet.loc[index, (self.GrLabel, 'r')], integral))
+              (r, integral))
 
           if (self.integralMarker == False):
             self.canvas.axes.plot(event.xdata,
@@ -1904,30 +1647,6 @@ class graphMainWindow(QtWidgets.QMainWindow):
       self.status.showMessage('ERROR: failed to save data.', 3456)
 
 
-def repeated_label(labels):
-  lab_set = frozenset(labels)
-  rep_ind = {lab: [] for lab in lab_set}
-
-  for slab in lab_set:
-    for i, lab in enumerate(labels):
-      if lab == slab:
-        rep_ind[slab].append(i)
-
-  return rep_ind
-
-
-def gen_new_labels(labels):
-  reap = repeated_label(labels).values()
-  for rinds in reap:
-    j = 1
-    for i in rinds:
-      if len(rinds) > 1:
-        labels[i] += str(j)
-        j += 1
-
-  return labels
-
-
 def main():
   """
   (None) -> None
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+Runs the analyses of DiceWin without the interface, for many files at once.
+
+For each file (any of the files DiceWin opens) computes the histogram, the
+autocorrelation with its exponential fit, the integral of the RDFs and the
+effective potential of the selected columns, writing .dat files in the same
+format saved by DiceWin and, optionally, the figures. PyQt5 is not needed and
+the figures are drawn with the Agg backend, so it runs in clusters without a
+display. The files are processed in parallel.
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import traceback
+import numpy as np
+import diceanalysis
+from dicereaders import is_eij, read_dice_file
+
+
+def series(fname):
+  """
+  (String) -> List
+  Read fname and return a list of (block title, labels, table) for each block of data: one for each simulation
+  output of the .eij files, one for each pair of the .gr files and a single block for the other files.
+  """
+  extension = fname.split('.')[-1]
+  labels, data, grItems, eijItems = read_dice_file(fname)
+
+  if extension == 'gr':
+    return [(pair, labels, data[pair].dropna(how='all')) for pair in grItems]
+  elif is_eij(extension):
+    return [(title, labels, data[k + 1]) for k, title in enumerate(eijItems)]
+  else:
+    return [('', labels, data)]
+
+
+def output_name(outdir, fname, kind, title, block=''):
+  base = os.path.basename(fname)
+  name, extension = base.rsplit('.', 1) if '.' in base else (base, '')
+  title = title.replace('/', '').replace('_', '')
+  if block:
+    title = '{}_{}'.format(block.replace(' ', '').replace('/', '').replace('-', ''), title)
+  return os.path.join(outdir, '{}_{}_{}_{}'.format(name, extension, kind, title))
+
+
+def save_figure(figname, draw):
+  import matplotlib
+  matplotlib.use('Agg')
+  from matplotlib.figure import Figure
+  from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+  fig = Figure(figsize=(8.5, 5.5), dpi=72)
+  FigureCanvasAgg(fig)
+  draw(fig.add_subplot(111))
+  fig.savefig(figname)
+
+
+def write_histogram(prefix, block, label, values, numbins, plot):
+  n, bins, binCenter, mean, stdDev = diceanalysis.histogram(values, numbins)
+  binwidth = bins[1] - bins[0]
+  gaussian = diceanalysis.gaussian(binCenter, binwidth, mean, stdDev)
+
+  with open(prefix + '.dat', 'w') as f:
+    if block:
+      f.write('# {}\n'.format(block))
+    f.write('# {}\n'.format(label))
+    f.write('# MEAN:      {:>15e}\n# STD. DEV.: {:>15e}\n'.format(mean, stdDev))
+    f.write('# {:>15}{:>20}{:>20}\n'.format('x', 'frequency(x)', 'gaussian(x)'))
+    f.write(''.join('{:>20e}{:>20e}{:>20e}\n'.format(*row) for row in zip(binCenter, n, gaussian)))
+
+  if plot:
+    def draw(ax):
+      ax.hist(bins[:-1], bins, weights=n)
+      points = np.linspace(bins[0], bins[-1], 250)
+      ax.plot(points, diceanalysis.gaussian(points, binwidth, mean, stdDev), c='k')
+      ax.set_title('{}  (mean = {:.4g}, std. dev. = {:.4g})'.format(label, mean, stdDev))
+    save_figure(prefix + '.' + plot, draw)
+
+  return mean, stdDev
+
+
+def write_autocorrelation(prefix, block, label, values, nexp, LT, guess, plot):
+  ct = diceanalysis.estimated_autocorrelation(values)
+  t = np.arange(len(ct))
+  if LT is None:
+    LT = int(len(ct) * 0.01)
+  guess = list(guess) if guess else diceanalysis.default_guess(nexp, LT)
+  guess = guess[:2 * nexp]
+
+  beta = diceanalysis.fit_autocorrelation(t, ct, guess, LT)
+  exponential = diceanalysis.EXPONENTIALS[nexp - 1]
+  initial = exponential(guess, t[:LT])
+  bestfit = exponential(beta, t[:LT])
+
+  with open(prefix + '.dat', 'w') as f:
+    if block:
+      f.write('# {}\n'.format(block))
+    f.write('# {} ({})\n'.format(diceanalysis.EXP_LABELS[nexp - 1], label))
+    f.write('# USER GUESS\n')
+    for index, value in enumerate(['A1', 'B1', 'A2', 'B2', 'A3', 'B3']):
+      f.write('# {} = {}\n'.format(value, guess[index] if index < len(guess) else 'None'))
+    f.write('# BEST FIT\n')
+    for index, value in enumerate(['A1', 'B1', 'A2', 'B2', 'A3', 'B3']):
+      f.write('# {} = {}\n'.format(value, beta[index] if index < len(beta) else 'None'))
+    f.write('# LARGEST T: {}\n'.format(LT))
+    f.write('# {:>15}{:>20}{:>20}{:>20}\n'.format('t', 'C(t)', 'Initial', 'Best fit'))
+    f.write(''.join('{:>20e}{:>20e}{:>20e}{:>20e}\n'.format(*row) for row in zip(t[:LT], ct[:LT], initial, bestfit)))
+
+  if plot:
+    def draw(ax):
+      xnew = np.linspace(0, LT, len(t))
+      ax.plot(t, ct, linestyle='', marker='.', label=r'$C(t)$')
+      ax.plot(xnew, exponential(guess, xnew), linestyle='--', c='k', label=r'$guess$')
+      ax.plot(xnew, exponential(beta, xnew), linestyle='-', c='r', label=r'$fit$')
+      ax.set_xlim(0, LT)
+      ax.set_title(label)
+      ax.legend(frameon=False)
+    save_figure(prefix + '.' + plot, draw)
+
+  return beta
+
+
+def write_rdf(prefix, pair, table, radii, T, plot):
+  r = table['r'].to_numpy()
+  nr = table['N(r)'].to_numpy()
+  gr = table['G(r)'].to_numpy()
+  u = diceanalysis.ueff(gr, T) if T is not None else None
+
+  with open(prefix + '.dat', 'w') as f:
+    f.write('# {}\n'.format(pair))
+    if radii:
+      rpoints, integral = diceanalysis.rdf_integral(r, nr, radii)
+      f.write('# INTEGRAL OF G(R)\n')
+      for x, value in zip(rpoints, integral):
+        f.write('# N({:.3f}) = {:.3f}\n'.format(x, value))
+    if u is not None:
+      f.write('# TEMPERATURE: {}\n'.format(T))
+      f.write('# {:>15}{:>20}{:>20}{:>20}\n'.format('r', 'G(r)', 'N(r)', 'Ueff(r)'))
+      f.write(''.join('{:>20e}{:>20e}{:>20e}{:>20e}\n'.format(*row) for row in zip(r, gr, nr, u)))
+    else:
+      f.write('# {:>15}{:>20}{:>20}\n'.format('r', 'G(r)', 'N(r)'))
+      f.write(''.join('{:>20e}{:>20e}{:20e}\n'.format(*row) for row in zip(r, gr, nr)))
+
+  if plot:
+    def draw(ax):
+      ax.plot(r, gr, label=r'$G(r)$')
+      if u is not None:
+        ax.plot(r, u, label=r'$U_{eff}(r)$')
+      ax.axhline(1.0, c='k', linewidth=0.5)
+      ax.set_xlabel('r')
+      ax.set_title(pair)
+      ax.legend(frameon=False)
+    save_figure(prefix + '.' + plot, draw)
+
+
+def analyse(fname, args):
+  """
+  (String, Namespace) -> List
+  Run the selected analyses for all the blocks of fname. Return the names of the files written.
+  """
+  extension = fname.split('.')[-1]
+  written = []
+
+  for block, labels, table in series(fname):
+    if extension == 'gr':
+      if args.integral or args.ueff is not None or args.rdf:
+        prefix = output_name(args.outdir, fname, 'rdf', block)
+        write_rdf(prefix, block, table, args.integral, args.ueff, args.plot)
+        written.append(prefix + '.dat')
+      columns = args.columns or []
+    else:
+      columns = args.columns or labels[1:]
+
+    for label in columns:
+      if label not in labels:
+        raise KeyError("{} has no column {} (columns: {})".format(fname, label, ' '.join(labels)))
+      values = np.asarray(table[label], dtype=np.float64)
+      values = values[~np.isnan(values)]
+
+      if args.histogram:
+        prefix = output_name(args.outdir, fname, 'histogram', label, block)
+        write_histogram(prefix, block, label, values, args.bins, args.plot)
+        written.append(prefix + '.dat')
+
+      if args.autocorrelation:
+        prefix = output_name(args.outdir, fname, 'autocorrelation', label, block)
+        write_autocorrelation(prefix, block, label, values, args.nexp, args.largest_t, args.guess, args.plot)
+        written.append(prefix + '.dat')
+
+  return written
+
+
+def _analyse(task):
+  fname, args = task
+  try:
+    return fname, analyse(fname, args), None
+  except Exception:
+    return fname, [], traceback.format_exc()
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Runs the analyses of DiceWin (histogram, autocorrelation, RDF integral and effective potential) for many files without the interface.")
+  parser.add_argument("files", nargs='+', help="files read by DiceWin (.out, .dst, .hbd, .gr, .eij, .xvg, .avr or generic columns)")
+  parser.add_argument("-c", "--columns", nargs='+', help="columns to be analysed (default: all but the first; for .gr files G(r), N(r) or r)")
+  parser.add_argument("--histogram", action='store_true', help="histogram with the gaussian of the same mean and standard deviation")
+  parser.add_argument("--bins", type=int, default=50, help="number of bins of the histograms (default = 50)")
+  parser.add_argument("--autocorrelation", action='store_true', help="autocorrelation function fitted by a sum of exponentials")
+  parser.add_argument("--nexp", type=int, choices=[1, 2, 3], default=1, help="number of exponentials in the fit (default = 1)")
+  parser.add_argument("--largest-t", type=int, help="number of points of C(t) used in the fit (default = 1%% of the data)")
+  parser.add_argument("--guess", type=float, nargs='+', help="initial coefficients A1 B1 [A2 B2 [A3 B3]] of the fit")
+  parser.add_argument("--rdf", action='store_true', help="write r, G(r) and N(r) of each pair of the .gr files")
+  parser.add_argument("--integral", type=float, nargs='+', help="N(r) of the pairs of the .gr files at these distances")
+  parser.add_argument("--ueff", type=float, nargs='?', const=298.0, metavar='T', help="effective potential of the pairs of the .gr files at temperature T (default = 298.0)")
+  parser.add_argument("--plot", nargs='?', const='png', choices=['png', 'pdf', 'svg'], help="also save the figures (default format = png)")
+  parser.add_argument("--outdir", default='.', help="directory of the output files (default = current directory)")
+  parser.add_argument("-nproc", "--nproc", type=int, default=None, help="number of processes (default = number of CPUs)")
+  args = parser.parse_args()
+
+  if args.guess and len(args.guess) < 2 * args.nexp:
+    parser.error("--guess needs {} coefficients for --nexp {}".format(2 * args.nexp, args.nexp))
+  if args.bins <= 0:
+    parser.error("--bins should be positive")
+
+  os.makedirs(args.outdir, exist_ok=True)
+
+  tasks = [(fname, args) for fname in args.files]
+  nproc = min(args.nproc or os.cpu_count() or 1, len(tasks))
+  failed = 0
+
+  if nproc > 1:
+    pool = mp.Pool(nproc)
+    results = pool.imap(_analyse, tasks)
+  else:
+    pool = None
+    results = map(_analyse, tasks)
+
+  for fname, written, error in results:
+    if error:
+      failed += 1
+      print("{}: failed\n{}".format(fname, error))
+    else:
+      print("{}: {}".format(fname, ' '.join(written) if written else "nothing to do"))
+
+  if pool:
+    pool.close()
+    pool.join()
+
+  if failed:
+    raise SystemExit(1)
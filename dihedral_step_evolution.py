@@ -8,10 +8,8 @@ Date: FEB/2017
 
 import argparse
 import os
-import matplotlib as mpl
-mpl.use('Agg')
-import matplotlib.pyplot as plt
-from distutils.spawn import find_executable
+from dicedeps import mpl, plt
+from shutil import which
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser(description="Receives a '.dat' file containing angles to plot the evolution with the steps.")
@@ -30,7 +28,7 @@ if __name__ == '__main__':
   step = [x*stepmult for x in range(1,len(angles)+1)]
 
   # plot it
-  if find_executable('latex') and find_executable('dvipng'):
+  if which('latex') and which('dvipng'):
     mpl.rcParams.update({'font.size':18, 'text.usetex':True, 'font.family':'serif', 'ytick.major.pad':4})
   else:
     mpl.rcParams.update({'font.size':18, 'font.family':'serif', 'ytick.major.pad':4})
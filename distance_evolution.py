@@ -8,17 +8,9 @@ Date: FEB/2017
 """
 
 import argparse
-import matplotlib as mpl
-mpl.use('Agg')
-import matplotlib.pyplot as plt
-try: 
-  import pybel
-  import openbabel
-except:
-  from openbabel import pybel
-  from openbabel import openbabel
+from dicedeps import mpl, openbabel, plt, pybel
 import os
-from distutils.spawn import find_executable
+from shutil import which
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser(description="Receives a .xyz or .pdb and two atom numbers to compute the distance between the two points and plot a temporal evolution.")
@@ -43,7 +35,7 @@ if __name__ == '__main__':
   step = [x*stepmult for x in range(1,len(distances)+1)]
 
   # plot it
-  if find_executable('latex') and find_executable('dvipng'):
+  if which('latex') and which('dvipng'):
     mpl.rcParams.update({'font.size':18, 'text.usetex':True, 'font.family':'serif', 'ytick.major.pad':4})
   else:
     mpl.rcParams.update({'font.size':18, 'text.usetex':True, 'font.family':'serif', 'ytick.major.pad':4})
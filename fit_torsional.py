@@ -8,23 +8,15 @@ Date: MAY/2019
 """
 
 import argparse
+import os
+import sys
 import numpy as np
-import matplotlib as mpl
-mpl.use('Agg')
-import matplotlib.pyplot as plt
-try: 
-  import pybel
-  import openbabel
-except:
-  from openbabel import pybel
-  from openbabel import openbabel
+from dicedeps import mpl, openbabel, plt, pybel
 from numpy import cos
 from math import ceil
-from scipy import optimize
-from scipy.interpolate import CubicSpline
 from plot_en_angle_gaussian_scan import parse_en_log_gaussian
-from plot_eff_tors import *
-from distutils.spawn import find_executable
+from plot_eff_tors import get_phi, get_potential_curve, parse_dfr, parse_txt
+from shutil import which
 
 def species_coord_to_openbabel(species, coord):
   mol = openbabel.OBMol()
@@ -133,6 +125,22 @@ def fit_func_equals(phi, *args):
   return sumf
 
 
+def fit_torsions(phi, en, v0s, f0s, bound, weights=None, equals=False):
+  """
+  Fit the V1, V2 and V3 of each dihedral (starting from v0s, inside [-bound,bound]) to the torsional energies en at the
+  angles phi, with the phases f0s fixed. weights are the sigmas of the points (smaller is a greater weight) and equals
+  the lists of dihedrals sharing the same parameters. Return the fitted parameters.
+  """
+  from scipy import optimize
+
+  if equals:
+    func = lambda x, *vs: fit_func_equals(x, *vs, *f0s, equals)
+  else:
+    func = lambda x, *vs: fit_func(x, *vs, *f0s)
+  popt, _ = optimize.curve_fit(func, phi, en, p0=v0s, bounds=(len(v0s)*[-bound], len(v0s)*[bound]), sigma=weights)
+  return popt
+
+
 def shift_angle_rad(tetha):
   if tetha < 0.0:
     return tetha
@@ -215,6 +223,8 @@ if __name__ == '__main__':
   parser.add_argument("--cut-from-total", help="instead of cutting the high torsional energies from fit, cut the high total energies", action="store_true")
   args = parser.parse_args()
 
+  from scipy.interpolate import CubicSpline
+
   if args.force_surroundings and args.no_force_min:
     print("Warning: If you are using --no-force-min the --force-surroundings is ignored.")
 
@@ -271,10 +281,6 @@ if __name__ == '__main__':
     v0s += dihedralsDict[dih][4:7]
     f0s += [dihAngles[i], 2.*dihAngles[i], 3.*dihAngles[i]]
 
-  # set the bounds
-  lbound = len(v0s)*[-args.bound_values]
-  ubound = len(v0s)*[args.bound_values]
-
   # shift the energies to the same reference
   min_mq = min(enqm)
   enqm = [x-min_mq for x in enqm]
@@ -346,20 +352,7 @@ if __name__ == '__main__':
         idx_min.append(find_nearest_idx(died,val))
       weights[idx_min] = 1./args.weight_minimums
 
-    if equals:
-      try:
-        popt, pcov = optimize.curve_fit(lambda x, *vs: fit_func_equals(x, *vs, *f0s, equals), died, enfit, p0=v0s, bounds=(lbound,ubound), sigma=weights)
-      except Exception as e:
-        print("Problem while fitting the curve (%s)" % (str(e)))
-        print("If the problem is 'x0 is infeasible' use --bound-values to set a higher value")
-        sys.exit(0)
-    else:
-      try:
-        popt, pcov = optimize.curve_fit(lambda x, *vs: fit_func(x, *vs, *f0s), died, enfit, p0=v0s, bounds=(lbound,ubound), sigma=weights)
-      except Exception as e:
-        print("Problem while fitting the curve (%s)" % (str(e)))
-        print("If the problem is 'x0 is infeasible' use --bound-values to set a higher value")
-        sys.exit(0)
+    xfit, yfit = died, enfit
   else:
     # give greater weight to minimums (smaller sigma is a grater weight)
     weights = np.ones(len(xcfit))
@@ -385,21 +378,14 @@ if __name__ == '__main__':
       for val in cr_pts:
         idx_min.append(find_nearest_idx(xcfit,val))
       weights[idx_min] = 1./args.weight_minimums
-      
-    if equals:
-      try:
-        popt, pcov = optimize.curve_fit(lambda x, *vs: fit_func_equals(x, *vs, *f0s, equals), xcfit, ffit(xcfit), p0=v0s, bounds=(lbound,ubound), sigma=weights)
-      except Exception as e:
-        print("Problem while fitting the curve (%s)" % (str(e)))
-        print("If the problem is 'x0 is infeasible' use --bound-values to set a higher value")
-        sys.exit(0)
-    else:
-      try:
-        popt, pcov = optimize.curve_fit(lambda x, *vs: fit_func(x, *vs, *f0s), xcfit, ffit(xcfit), p0=v0s, bounds=(lbound,ubound), sigma=weights)
-      except Exception as e:
-        print("Problem while fitting the curve (%s)" % (str(e)))
-        print("If the problem is 'x0 is infeasible' use --bound-values to set a higher value")
-        sys.exit(0)
+    xfit, yfit = xcfit, ffit(xcfit)
+
+  try:
+    popt = fit_torsions(xfit, yfit, v0s, f0s, args.bound_values, weights, equals)
+  except Exception as e:
+    print("Problem while fitting the curve (%s)" % (str(e)))
+    print("If the problem is 'x0 is infeasible' use --bound-values to set a higher value")
+    sys.exit(0)
 
   if equals:
     new_popt = []
@@ -438,7 +424,7 @@ if __name__ == '__main__':
   cr_pts = [x*180./np.pi for x in cr_pts]
 
   # plotting options
-  if find_executable('latex') and find_executable('dvipng'):
+  if which('latex') and which('dvipng'):
     mpl.rcParams.update({'font.size':14, 'text.usetex':True, 'font.family':'serif', 'ytick.major.pad':4})
   else:
     mpl.rcParams.update({'font.size':14, 'font.family':'serif', 'ytick.major.pad':4})
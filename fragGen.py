@@ -7,18 +7,24 @@ Author: Henrique Musseli Cezar
 Date: JUN/2015
 """
 
-try:
-  ob3 = False
-  import pybel
-  import openbabel
-except:
-  ob3 = True
-  from openbabel import pybel
-  from openbabel import openbabel
+from dicedeps import is_ob3, openbabel, pybel
 import os
 import argparse
 import sys
 import itertools
+import re
+from dicebatch import report, run_batch
+
+# Daylight SMARTS pattern of the rotatable bonds
+ROTATABLE_BOND_SMARTS = "[!$(*#*)&!D1]-!@[!$(*#*)&!D1]"
+_rotBondsPattern = None
+
+def rotatable_bonds_pattern():
+  # compiled once per process
+  global _rotBondsPattern
+  if _rotBondsPattern is None:
+    _rotBondsPattern = pybel.Smarts(ROTATABLE_BOND_SMARTS)
+  return _rotBondsPattern
 
 def split_mol_fragments_daylight(imol):
   # create an OBMol object identical to the original to modificate
@@ -26,11 +32,8 @@ def split_mol_fragments_daylight(imol):
   clone = pybel.ob.OBMol(imol)
   mol = pybel.Molecule(clone)
 
-  # set the Daylight SMARTS pattern to find the rotatable bonds
-  rotBondsPattern = pybel.Smarts("[!$(*#*)&!D1]-!@[!$(*#*)&!D1]")
-
-  # find the bonds
-  rbonds = rotBondsPattern.findall(mol)
+  # find the rotatable bonds
+  rbonds = rotatable_bonds_pattern().findall(mol)
 
   # store the OBAtom objects of each broken bond
   connectFragsAtomPairs = []
@@ -71,150 +74,183 @@ def split_mol_fragments_daylight(imol):
   for i, frag in enumerate(fragments, start=1):
     frag.SetTitle(str(i))
 
-  # store the index of connected pairs
+  # index of the fragment containing each atom (the ids are kept by Separate, the dummies have their own ids)
+  atomFragment = {}
+  for i, frag in enumerate(fragments):
+    for atom in openbabel.OBMolAtomIter(frag):
+      atomFragment[atom.GetId()] = i
+
+  # store the index of connected pairs, in the order of the fragments
   fragmentConnections = []
   for atom1, atom2 in connectFragsAtomPairs:
-    connection = []
-    for frag in fragments:
-      fragAtomIterator = openbabel.OBMolAtomIter(frag)
-      for atom in fragAtomIterator:
-        if atom.GetId() == atom1.GetId() or atom.GetId() == atom2.GetId():
-          connection.append(frag.GetTitle())
-          break
-    fragmentConnections.append(connection)
+    connection = sorted(set([atomFragment[atom1.GetId()], atomFragment[atom2.GetId()]]))
+    fragmentConnections.append([fragments[i].GetTitle() for i in connection])
 
   # return disconnected fragments and the connections list (index of connected fragments) and the dummy to atom correspondence (by index)
   return fragments, fragmentConnections, dummyAtomCorrespondence
 
 
-def generate_fragfile(filename, outtype, ffparams=None, eqgeom=False):
-  # check outtype
-  if outtype not in ["flex", "header", "min"]:
-    sys.exit('Invalid argument indicating verbosity of .dfr (%s). Use "flex", "header" or "min".' % outtype)
+def fragment_atom_index(fragments, dummyToAtom):
+  """
+  Atoms of each fragment (ids of the molecule, with the dummies replaced by the atoms they represent) and the
+  indexes of the fragments containing each atom (its own fragment and the ones where it is a dummy).
+  """
+  fragAtoms = []
+  atomFragments = {}
+  for i, frag in enumerate(fragments):
+    atomlst = [dummyToAtom.get(atom.GetId(), atom.GetId()) for atom in openbabel.OBMolAtomIter(frag)]
+    fragAtoms.append(atomlst)
+    for atom in atomlst:
+      atomFragments.setdefault(atom, set()).add(i)
+  return fragAtoms, atomFragments
+
+
+def read_ffparams(ffparams):
+  """
+  Read the file of force field parameters given with -p. Return a dictionary with the dictionaries of the nonbonded
+  parameters and of the short label of each pdb label (keyed by the pdb label) and of the bonded parameters (keyed by
+  the short labels joined by "-", in both orders).
+  """
+  labelToSLabel = {}
+  charges = {}
+  epsilons = {}
+  sigmas = {}
+  bonds = {}
+  angles = {}
+  dihedrals = {}
+  impropers = {}
+  with open(ffparams, 'r') as f:
+    line = f.readline()
+    # read nb params
+    while "$bond" not in line:
+      if line.strip().startswith("#") or not line.strip():
+        line = f.readline()
+        continue
 
-  # get basename and file extension
-  base, ext = os.path.splitext(filename)
+      lbl = line.split()[0]
+      charges[lbl] = line.split()[1]
+      epsilons[lbl] = line.split()[2]
+      sigmas[lbl] = line.split()[3]
+      labelToSLabel[lbl] = line.split()[4]
 
-  # set openbabel file format
-  obConversion = openbabel.OBConversion()
-  obConversion.SetInAndOutFormats(ext[1:],"xyz")
+      line = f.readline()
 
-  # read molecule to OBMol object
-  mol = openbabel.OBMol()
-  obConversion.ReadFile(mol, filename)
+    # read bond params
+    line = f.readline()
+    while "$angle" not in line:
+      if line.strip().startswith("#") or "$end" in line or not line.strip():
+        line = f.readline()
+        continue
 
-  if ffparams:
-    # get atomic labels from pdb
-    idToAtomicLabel = {}
-    for res in openbabel.OBResidueIter(mol):
-      for atom in openbabel.OBResidueAtomIter(res):
-        idToAtomicLabel[atom.GetId()] = res.GetAtomID(atom).strip()
+      line = line.replace("–", "-")
+
+      # store the constants for the order of the input and the inverse order
+      consts = "\t".join(line.split()[1:])
+      bonds[line.split()[0]] = consts
+      bonds["-".join(line.split()[0].split("-")[::-1])] = consts
 
-    # read force field parameters and store into dictionaries
-    labelToSLabel = {}
-    charges = {}
-    epsilons = {}
-    sigmas = {}
-    bonds = {}
-    angles = {}
-    dihedrals = {}
-    impropers = {}
-    with open(ffparams, 'r') as f:
       line = f.readline()
-      # read nb params
-      while "$bond" not in line:
-        if line.strip().startswith("#") or not line.strip():
-          line = f.readline()
-          continue
-
-        lbl = line.split()[0]
-        charges[lbl] = line.split()[1]
-        epsilons[lbl] = line.split()[2]
-        sigmas[lbl] = line.split()[3]
-        labelToSLabel[lbl] = line.split()[4]
 
+    # read angle params
+    line = f.readline()
+    while "$dihedral" not in line:
+      if line.strip().startswith("#") or "$end" in line or not line.strip():
         line = f.readline()
+        continue
 
-      # read bond params
-      line = f.readline()
-      while "$angle" not in line:
-        if line.strip().startswith("#") or "$end" in line or not line.strip():
-          line = f.readline()
-          continue
+      line = line.replace("–", "-")
 
-        line = line.replace("–", "-")
+      # store the constants for the order of the input and the inverse order
+      consts = "\t".join(line.split()[1:])
+      angles[line.split()[0]] = consts
+      angles["-".join(line.split()[0].split("-")[::-1])] = consts
 
-        # store the constants for the order of the input and the inverse order
-        consts = "\t".join(line.split()[1:])
-        bonds[line.split()[0]] = consts
-        bonds["-".join(line.split()[0].split("-")[::-1])] = consts
+      line = f.readline()
 
+    # read dihedrals
+    line = f.readline()
+    while "$improper" not in line:
+      if line.strip().startswith("#") or "$end" in line or not line.strip():
         line = f.readline()
+        continue
 
-      # read angle params
-      line = f.readline()
-      while "$dihedral" not in line:
-        if line.strip().startswith("#") or "$end" in line or not line.strip():
-          line = f.readline()
-          continue
+      line = line.replace("–", "-")
 
-        line = line.replace("–", "-")
+      # store the constants for the order of the input and the inverse order
+      consts = "\t".join(line.split()[1:])
+      dihedrals[line.split()[0]] = consts
+      dihedrals["-".join(line.split()[0].split("-")[::-1])] = consts
 
-        # store the constants for the order of the input and the inverse order
-        consts = "\t".join(line.split()[1:])
-        angles[line.split()[0]] = consts
-        angles["-".join(line.split()[0].split("-")[::-1])] = consts
+      line = f.readline()
 
+    # read impropers
+    line = f.readline()
+    while line:
+      if line.strip().startswith("#") or "$end" in line or not line.strip():
         line = f.readline()
+        continue
+
+      line = line.replace("–", "-")
+
+      # store the constants for the order of the input and the inverse order
+      consts = "\t".join(line.split()[1:])
+      impropers[line.split()[0]] = consts
+      impropers["-".join(line.split()[0].split("-")[::-1])] = consts
 
-      # read dihedrals
       line = f.readline()
-      while "$improper" not in line:
-        if line.strip().startswith("#") or "$end" in line or not line.strip():
-          line = f.readline()
-          continue
 
-        line = line.replace("–", "-")
+  return {"labelToSLabel": labelToSLabel, "charges": charges, "epsilons": epsilons, "sigmas": sigmas,
+          "bonds": bonds, "angles": angles, "dihedrals": dihedrals, "impropers": impropers}
 
-        # store the constants for the order of the input and the inverse order
-        consts = "\t".join(line.split()[1:])
-        dihedrals[line.split()[0]] = consts
-        dihedrals["-".join(line.split()[0].split("-")[::-1])] = consts
+def generate_fragfile(filename, outtype, ffparams=None, eqgeom=False):
+  # get basename and file extension
+  base, ext = os.path.splitext(filename)
 
-        line = f.readline()
+  # set openbabel file format
+  obConversion = openbabel.OBConversion()
+  obConversion.SetInFormat(ext[1:])
 
-      # read impropers
-      line = f.readline()
-      while line:
-        if line.strip().startswith("#") or "$end" in line or not line.strip():
-          line = f.readline()
-          continue
+  # read molecule to OBMol object
+  mol = openbabel.OBMol()
+  obConversion.ReadFile(mol, filename)
 
-        line = line.replace("–", "-")
+  write_fragfiles(mol, base, outtype, ffparams, eqgeom)
 
-        # store the constants for the order of the input and the inverse order
-        consts = "\t".join(line.split()[1:])
-        impropers[line.split()[0]] = consts
-        impropers["-".join(line.split()[0].split("-")[::-1])] = consts
 
-        line = f.readline()
+def write_fragfiles(mol, base, outtype, ffparams=None, eqgeom=False):
+  """
+  Write base.txt, base.dfr and the fragments of the OBMol mol in base_fragments. ffparams is the file of force field
+  parameters or the parameters already read by read_ffparams.
+  """
+  # check outtype
+  if outtype not in ["flex", "header", "min"]:
+    sys.exit('Invalid argument indicating verbosity of .dfr (%s). Use "flex", "header" or "min".' % outtype)
+
+  if ffparams:
+    # get atomic labels from pdb
+    idToAtomicLabel = {}
+    for res in openbabel.OBResidueIter(mol):
+      for atom in openbabel.OBResidueAtomIter(res):
+        idToAtomicLabel[atom.GetId()] = res.GetAtomID(atom).strip()
+
+    # read force field parameters (unless already read) and store into dictionaries
+    if not isinstance(ffparams, dict):
+      ffparams = read_ffparams(ffparams)
+    labelToSLabel, charges, epsilons, sigmas = [ffparams[x] for x in ("labelToSLabel", "charges", "epsilons", "sigmas")]
+    bonds, angles, dihedrals, impropers = [ffparams[x] for x in ("bonds", "angles", "dihedrals", "impropers")]
 
     # check if there are unused labels
+    usedLabels = set(idToAtomicLabel.values())
     for lbl in charges.keys():
-      fnd = False
-      for i in idToAtomicLabel:
-        if lbl == idToAtomicLabel[i]:
-          fnd = True
-          break
-      if not fnd:
+      if lbl not in usedLabels:
         print("!!! WARNING: There are unused atoms in your parameter file (%s) !!!" % lbl)
 
 
   # split the molecule
   fragments, fragConnection, dummyToAtom = split_mol_fragments_daylight(mol)
 
-  # dummy atoms ids
-  dummyAtoms = dummyToAtom.keys()
+  # atoms of each fragment and fragments of each atom
+  fragAtoms, atomFragments = fragment_atom_index(fragments, dummyToAtom)
 
   # write molecule to .txt file (passed as ljname to DICE)
   with open(base+".txt","w") as f:
@@ -223,7 +259,7 @@ def generate_fragfile(filename, outtype, ffparams=None, eqgeom=False):
     for frag in fragments:
       fragAtomIterator = openbabel.OBMolAtomIter(frag)
       for atom in fragAtomIterator:
-        if atom.GetId() not in dummyAtoms:
+        if atom.GetId() not in dummyToAtom:
           atomToPrint.append(atom)
     # print number of atoms
     f.write(str(len(atomToPrint))+" \t %s (generated with fragGen)\n"%os.path.basename(base))
@@ -251,14 +287,10 @@ def generate_fragfile(filename, outtype, ffparams=None, eqgeom=False):
   with open(base+".dfr","w") as f:
     # fragments and fragments connections are printed to every outtype
     f.write("$atoms fragments\n")
-    fragslst = []
-    for frag in fragments:
+    for frag, atomlst in zip(fragments, fragAtoms):
       f.write(frag.GetTitle()+"\t[ ")
-      fragAtomIterator = openbabel.OBMolAtomIter(frag)
-      atomlst = [str(dummyToAtom[x.GetId()]+1) if x.GetId() in dummyAtoms else str(x.GetId()+1) for x in fragAtomIterator]
-      fragslst.append(atomlst)
       for atom in atomlst:
-        f.write(atom+"\t")                    
+        f.write(str(atom+1)+"\t")
       if outtype == "min" or outtype == "header":
         f.write("] R\n")
       else:
@@ -343,7 +375,7 @@ def generate_fragfile(filename, outtype, ffparams=None, eqgeom=False):
       for atom in atomIterator:
         # print(atom.GetHyb(), atom.GetAtomicNum(), atom.GetValence())
         # if atom.GetAtomicNum() == 6 and atom.GetValence() == 3:
-        if ob3 == False:
+        if not is_ob3():
           condImp = atom.GetHyb() == 2 and atom.GetValence() == 3
         else:
           condImp = atom.GetHyb() == 2 and atom.GetExplicitDegree() == 3
@@ -382,14 +414,8 @@ def generate_fragfile(filename, outtype, ffparams=None, eqgeom=False):
       tjf = []
       # find the tjfs by checking if all the atoms of a torsional belong to the same fragment
       for tors in torsionIterator:
-        tors = [str(x+1) for x in tors]
-        istjf = True
-        for atomlst in fragslst:
-          if (tors[0] in atomlst) and (tors[1] in atomlst) and (tors[2] in atomlst) and (tors[3] in atomlst):
-            istjf = False
-            break
-        if istjf:
-          tjf.append(tors)
+        if not set.intersection(*[atomFragments[x] for x in tors]):
+          tjf.append([str(x+1) for x in tors])
 
       f.write("\n$dihedral\n")
       if ffparams:
@@ -410,8 +436,65 @@ def generate_fragfile(filename, outtype, ffparams=None, eqgeom=False):
     os.makedirs(base+"_fragments")
 
   # write framents to the cml files
+  obConversion = openbabel.OBConversion()
+  obConversion.SetOutFormat("xyz")
   for frag in fragments:
-    obConversion.WriteFile(frag, os.path.join(base+"_fragments",os.path.basename(filename).split(".")[0]+"_fragment"+frag.GetTitle()+".xyz"))
+    obConversion.WriteFile(frag, os.path.join(base+"_fragments",os.path.basename(base).split(".")[0]+"_fragment"+frag.GetTitle()+".xyz"))
+
+# parameters of -p read once for all the molecules of a library
+_libraryParams = None
+
+def init_library_worker(ffparams):
+  global _libraryParams
+  _libraryParams = ffparams
+  rotatable_bonds_pattern()
+
+
+def library_molecule(fmt, molstring, base, outtype, eqgeom):
+  mol = pybel.readstring(fmt, molstring)
+  # SMILES and 2D structures have no coordinates
+  if mol.dim != 3:
+    mol.make3D()
+  write_fragfiles(mol.OBMol, base, outtype, _libraryParams, eqgeom)
+  print("The files %s and %s were successfully generated." % (base+".txt", base+".dfr"))
+
+
+def read_library(filename, outdir):
+  """
+  Read a file with many molecules (SDF, SMILES or any format read by OpenBabel). Return the format used to pass the
+  molecules to the workers and, for each molecule, its string in this format and the base name of its inputs in
+  outdir (the title of the molecule or its position in the file).
+  """
+  fmt = os.path.splitext(filename)[1][1:].lower()
+  # the input format is kept when possible, so the pdb labels used by -p are not lost
+  outfmt = fmt if fmt in pybel.outformats else "sdf"
+  prefix = os.path.splitext(os.path.basename(filename))[0]
+
+  molecules = []
+  used = set()
+  for i, mol in enumerate(pybel.readfile(fmt, filename), start=1):
+    name = re.sub(r"[^\w-]", "_", mol.title.strip())[:64] or "%s_%d" % (prefix, i)
+    if name in used:
+      name = "%s_%d" % (name, i)
+    used.add(name)
+    molecules.append((mol.write(outfmt), os.path.join(outdir, name)))
+
+  return outfmt, molecules
+
+
+def generate_library(filename, outdir, outtype, ffparams=None, eqgeom=False, nproc=None):
+  """
+  Write the .txt, .dfr and fragments of each molecule of filename in outdir, using nproc worker processes. The
+  parameter file is read and the SMARTS compiled once. Return the number of molecules that failed.
+  """
+  if ffparams:
+    ffparams = read_ffparams(ffparams)
+  os.makedirs(outdir, exist_ok=True)
+
+  fmt, molecules = read_library(filename, outdir)
+  results = run_batch(library_molecule, [(fmt, molstring, base, outtype, eqgeom) for molstring, base in molecules], nproc, init_library_worker, (ffparams,))
+  return report([os.path.basename(base) for molstring, base in molecules], results)
+
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser(description="Receives a molecular structure in an OpenBabel supported file format and creates both the '.dfr' (Dice FRagment) and the '.txt' DICE input files.")
@@ -423,6 +506,9 @@ if __name__ == '__main__':
   io_group.add_argument("--rigid-frags", help="consider the fragments rigid and defines only the fragment connections as flexible (default option)", action="store_true")
   io_group.add_argument("--flexible", help="consider the whole molecule flexible", action="store_true")
   io_group.add_argument("--header", help="print just the header concerning the fragments and fragment connections", action="store_true")  
+  parser.add_argument("-l","--library", help="the file has many molecules (e.g. .sdf or .smi): generate the inputs of each one, named after the title of the molecule, in parallel", action="store_true")
+  parser.add_argument("-o","--outdir", help="with --library, directory of the inputs (default: a directory with the name of the file)")
+  parser.add_argument("-nproc","--nproc", type=int, default=None, help="with --library, number of processes (default = number of CPUs)")
 
   args = parser.parse_args()
 
@@ -449,4 +535,8 @@ if __name__ == '__main__':
     sys.exit("When the force field parameters are given with '-p' you should have your structure in .pdb with the correct labels.")
 
 
-  generate_fragfile(filename, opt, args.force_field_parameters, args.equilibrium_from_geom)
\ No newline at end of file
+  if args.library:
+    if generate_library(filename, args.outdir or base, opt, args.force_field_parameters, args.equilibrium_from_geom, args.nproc):
+      sys.exit(1)
+  else:
+    generate_fragfile(filename, opt, args.force_field_parameters, args.equilibrium_from_geom)
\ No newline at end of file
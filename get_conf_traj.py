@@ -2,28 +2,44 @@
 """
 Given the filename of a DICE xyz trajectory and a number of a configuration
 returns the configuration.
+Compressed trajectories (.gz, .bz2, .xz, .zst) can be read and written directly.
+
+More than one configuration number can be given, or the frames can be chosen by
+a range, a list or windows of per-frame data (see diceframes.py).
 
 Author: Henrique Musseli Cezar
 Date: DEC/2018
 """
 
 import argparse
+import sys
+from diceio import open_file
+from diceframes import FrameSelection, add_selection_arguments, find_configurations, read_frames, selection_from_args
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser(description="Given the filename of a DICE xyz trajectory and a number of a configuration returns the configuration.")
   parser.add_argument("trajfile", help="the DICE trajectory in .xyz")
-  parser.add_argument("confnum", type=int, help="the number of the configuration to be extracted")
+  parser.add_argument("confnum", type=int, nargs='*', help="the number of the configuration to be extracted (the number in the comment line, more than one can be given)")
+  parser.add_argument("-o", "--output", help="write to this file instead of stdout, compressed if it ends in .gz, .bz2, .xz or .zst")
+  add_selection_arguments(parser)
 
   args = parser.parse_args()
 
-  with open(args.trajfile,'r') as f:
-    n_atoms = int(f.readline())
-    for line in f:
-      if ("Configuration number" in line) and (str(args.confnum) in line):
-        # print the config and exit
-        print(n_atoms)
-        print(line,end='')
-        for i in range(n_atoms):
-          lin = f.readline()
-          print(lin,end='')
-        break
\ No newline at end of file
+  if args.confnum:
+    frames = find_configurations(args.trajfile, args.confnum)
+    if len(frames) < len(set(args.confnum)):
+      print("Some of the configurations were not found in %s" % args.trajfile, file=sys.stderr)
+    selection = selection_from_args(args)
+    selection = FrameSelection(frames=frames, masks=selection.masks)
+  elif any(getattr(args, opt) is not None for opt in ("start", "stop", "stride", "frames", "where")):
+    selection = selection_from_args(args)
+  else:
+    parser.error("give the number of a configuration or select the frames")
+
+  out = open_file(args.output, 'wb') if args.output else sys.stdout.buffer
+
+  for frame, block in read_frames(args.trajfile, selection):
+    out.write(block)
+
+  if args.output:
+    out.close()
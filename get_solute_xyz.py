@@ -2,6 +2,10 @@
 """
 Give the filename of a DICE .xyz and number of atoms in the solvent to receive
 in stdout the xyz of the solvent for every configuration in the initial file.
+Compressed trajectories (.gz, .bz2, .xz, .zst) can be read and written directly.
+
+Only the lines of the solute are read, the rest of the box is skipped based on the
+size of the frames given by the header.
 
 Author: Henrique Musseli Cezar
 Date: APR/2016
@@ -9,29 +13,114 @@ Date: APR/2016
 
 import argparse
 import sys
+from diceio import open_file
+
+def parse_selection(sel):
+	"""
+	Convert a selection as "1-5,8,10-12" (1-based, inclusive ranges) to a sorted list of 0-based indexes.
+	"""
+	idx = set()
+	for part in sel.split(','):
+		if '-' in part:
+			first, last = part.split('-')
+			idx.update(range(int(first)-1, int(last)))
+		elif part.strip():
+			idx.add(int(part)-1)
+	return sorted(idx)
+
+def molecule_atoms(txtfile, nmol, molsel):
+	"""
+	Indexes (0-based) of the atoms of the molecules selected by molsel (as in parse_selection),
+	using the DICE .txt and the number of molecules of each type to locate them in the box.
+	"""
+	from pdb2xyz import read_txt
+
+	first = []
+	size = []
+	with open(txtfile, 'r') as f:
+		at_per_mol = read_txt(f)
+	for n, mol in zip(nmol, at_per_mol):
+		for _ in range(n):
+			first.append(first[-1]+size[-1] if first else 0)
+			size.append(len(mol))
+
+	atoms = []
+	for m in parse_selection(molsel):
+		atoms.extend(range(first[m], first[m]+size[m]))
+	return atoms
 
-def get_solute(fname, natoms):
-	with open(fname, 'r') as f:
-		print_atoms = False
-		printed = 0
-		line = f.readline()
+def get_solute(fname, natoms, out=sys.stdout.buffer, atoms=None):
+	"""
+	Write the first natoms of each box (or the atoms with 0-based indexes in atoms) to out, opened in binary mode.
+	"""
+	if atoms is None:
+		atoms = range(natoms)
+	nread = max(atoms) + 1
+
+	with open_file(fname, 'rb') as f:
+		header = f.readline()
+		if not header.strip():
+			return
+		nbox = int(header)
+		if nread > nbox:
+			raise ValueError("Atom %d was selected but the boxes have %d atoms" % (nread, nbox))
+
+		# bytes of the lines that are not printed, known after the first frame if all the lines have the same width
+		skipbytes = None
+		line = header
 		while line:
-			if "Configuration" in line:
-				print_atoms = True
-				sys.stdout.write("%d\n%s\n" % (natoms, line.rstrip()))
-			elif ((printed < natoms) and print_atoms):
-				sys.stdout.write(line)
-				printed += 1
-			else:
-				print_atoms = False
-				printed = 0
+			comment = f.readline()
+			lines = [f.readline() for _ in range(nread)]
+			out.write(b"%d\n%s\n" % (len(atoms), comment.rstrip()) + b"".join(lines[i] for i in atoms))
 
-			line = f.readline()
+			if skipbytes is None:
+				width = len(lines[0])
+				rest = [f.readline() for _ in range(nbox-nread)]
+				if all(len(l) == width for l in lines + rest) and f.seekable():
+					skipbytes = (nbox-nread)*width
+				else:
+					skipbytes = -1
+				line = f.readline()
+			elif skipbytes >= 0:
+				pos = f.tell()
+				f.seek(skipbytes, 1)
+				line = f.readline()
+				# not in the beginning of a frame, so the lines don't have the same width
+				if line and line != header:
+					f.seek(pos)
+					skipbytes = -1
+					for _ in range(nbox-nread):
+						f.readline()
+					line = f.readline()
+			else:
+				for _ in range(nbox-nread):
+					f.readline()
+				line = f.readline()
 
 if __name__ == '__main__':
 	parser = argparse.ArgumentParser(description="Receives simulation boxes and returns the solute conformation for each box.")
 	parser.add_argument("filename", help="the xyz containing the simulation boxes")
-	parser.add_argument("natoms", help="the number of atoms in the solute")
+	parser.add_argument("natoms", nargs='?', type=int, help="the number of atoms in the solute")
+	parser.add_argument("-o", "--output", help="write to this file instead of stdout, compressed if it ends in .gz, .bz2, .xz or .zst")
+	parser.add_argument("--atoms", help="print these atoms instead of the first natoms, e.g. 1-10,15")
+	parser.add_argument("--molecules", help="print the atoms of these molecules instead of the first natoms, e.g. 1,5-7 (needs --txt and --nmol)")
+	parser.add_argument("--txt", help="DICE .txt of the system, used with --molecules")
+	parser.add_argument("--nmol", type=int, nargs='+', help="quantity of molecules of each type in the same order as the .txt, used with --molecules")
 	args = parser.parse_args()
 
-	get_solute(args.filename, int(args.natoms))
\ No newline at end of file
+	if args.molecules:
+		if not (args.txt and args.nmol):
+			parser.error("--molecules needs --txt and --nmol")
+		atoms = molecule_atoms(args.txt, args.nmol, args.molecules)
+	elif args.atoms:
+		atoms = parse_selection(args.atoms)
+	elif args.natoms:
+		atoms = None
+	else:
+		parser.error("give the number of atoms in the solute, --atoms or --molecules")
+
+	if args.output:
+		with open_file(args.output, 'wb') as out:
+			get_solute(args.filename, args.natoms, out, atoms)
+	else:
+		get_solute(args.filename, args.natoms, atoms=atoms)
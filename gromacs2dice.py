@@ -11,17 +11,12 @@ import sys
 import argparse
 import tempfile
 import shutil
-try: 
-  import pybel
-  import openbabel
-  ob3 = False
-except:
-  from openbabel import pybel
-  from openbabel import openbabel
-  ob3 = True
+from dicedeps import is_ob3, openbabel, pybel
 from collections import OrderedDict
 from fragGen import generate_fragfile
 from clean_dof_dfr import clean_dofs
+from dicetop import load_forcefield
+from dicebatch import pair_files, read_manifest, report, run_batch
 
 def nm2a(num):
 	return round(num*10.0,4)
@@ -34,20 +29,24 @@ def check_gromacs_path(path):
 		print("GROMACS top directory is invalid (%s)" % (path))
 		sys.exit(0)
 
-	flist = os.listdir(FFPATH)
+	flist = os.listdir(path)
 	if ("ffbonded.itp" not in flist) or ("ffnonbonded.itp" not in flist):
 		print("Either ffbonded.itp or ffnonbonded.itp are missing in the force field directory")
 		sys.exit(0)
 
-def lookup_ljparam(atype, path, dict_types=[]):
-	check_gromacs_path(path)
+# force field index of each directory, built (or read from the cache) in the first lookup
+FORCEFIELDS = {}
 
-	with open(os.path.join(path,"ffnonbonded.itp")) as f:
-		for line in f:
-			if line.strip().startswith(";") or line.strip().startswith("#") or len(line.strip()) == 0:
-				continue
-			elif line.split()[0] == atype:
-				return line
+def get_forcefield(path):
+	if path not in FORCEFIELDS:
+		check_gromacs_path(path)
+		FORCEFIELDS[path] = load_forcefield(path)
+	return FORCEFIELDS[path]
+
+def lookup_ljparam(atype, path, dict_types=[]):
+	line = get_forcefield(path).atomtypes.get(atype)
+	if line:
+		return line
 	print("Error: the atom type (%s) was not found in ffnonbonded.itp, aborting..." % atype)
 	sys.exit(0)
 
@@ -58,143 +57,42 @@ def lookup_ljparam_ifile(atype, alist):
 	return
 
 def lookup_ffbond(t1, t2, path):
-	check_gromacs_path(path)
-
-	with open(os.path.join(path,"ffbonded.itp")) as f:
-		while True:
-			line = f.readline()
-			if not line:
-				break			
-			if line.strip().startswith(";") or line.strip().startswith("#") or len(line.strip()) == 0:
-				continue
-			if line.strip() == "[ bondtypes ]":
-				break
-
-		while True:
-			line = f.readline()
-			if not line or line.startswith("[ "):
-				break
-			if line.strip().startswith(";") or line.strip().startswith("#") or len(line.strip()) == 0:
-				continue
-			if (line.split()[0] == t1 and line.split()[1] == t2) or (line.split()[0] == t2 and line.split()[1] == t1):
-				return line
+	line = get_forcefield(path).bond(t1, t2)
+	if line:
+		return line
 	print("Warning: the atom types (%s,%s) were not found in ffbonded.itp... Add manually later" % (t1, t2))
 	return "not found"
 
 def lookup_ffangle(t1, t2, t3, path):
-	check_gromacs_path(path)
-
-	with open(os.path.join(path,"ffbonded.itp")) as f:
-		while True:
-			line = f.readline()
-			if not line:
-				break			
-			if line.strip().startswith(";") or line.strip().startswith("#") or len(line.strip()) == 0:
-				continue
-			if line.strip() == "[ angletypes ]":
-				break
-
-		while True:
-			line = f.readline()
-			if not line or line.startswith("[ "):
-				break
-			if line.strip().startswith(";") or line.strip().startswith("#") or len(line.strip()) == 0:
-				continue
-			if (line.split()[0] == t1 and line.split()[1] == t2 and line.split()[2] == t3) or (line.split()[0] == t3 and line.split()[1] == t2 and line.split()[2] == t1):
-				return line
+	line = get_forcefield(path).angle(t1, t2, t3)
+	if line:
+		return line
 	print("Warning: the atom types (%s,%s,%s) were not found in ffbonded.itp... Add manually later" % (t1, t2, t3))
 	return "not found"
 
 def lookup_ffimproper(itype, path):
-	check_gromacs_path(path)
-
-	with open(os.path.join(path,"ffbonded.itp")) as f:
-		for line in f:
-			if itype in line:
-				return line
+	for line in get_forcefield(path).bonded:
+		if itype in line:
+			return line
 	print("Error: the improper dihedral type (%s) was not found in ffbonded.itp, aborting..." % itype)
 	sys.exit(0)
 
 def lookup_ffdihedral(t1, t2, t3, t4, dtype, ffname, path):
-	check_gromacs_path(path)
-
-	fpos = []
-	fnd_lines = []
-
-	with open(os.path.join(path,"ffbonded.itp")) as f:
-		while True:
-			line = f.readline()
-			if not line:
-				break			
-			if line.strip().startswith(";") or line.strip().startswith("#") or len(line.strip()) == 0:
-				continue
-			if line.strip() == "[ dihedraltypes ]":
-				fpos.append(f.tell())
-
-		# for every dihedtraltypes section, look for the dihedrals
-		for i in range(len(fpos)):
-			f.seek(fpos[i])
-
-			# try looking for the four atoms in the dihedral
-			while True:
-				line = f.readline()
-				if not line or line.strip().startswith("[ "):
-					break
-				if line.strip().startswith(";") or line.strip().startswith("#") or len(line.strip()) == 0:
-					continue
-
-				# check if the line has the right dihedral type
-				if int(line.split()[4]) != dtype:
-					continue
-
-				if (line.split()[0] == t1 and line.split()[1] == t2 and line.split()[2] == t3 and line.split()[3] == t4) or (line.split()[0] == t4 and line.split()[1] == t3 and line.split()[2] == t2 and line.split()[3] == t1):
-					fnd_lines.append(line)
-
-			# if the complete dihedral was not found, try it with one missing atom
-			if (len(fnd_lines) == 0):
-				f.seek(fpos[i])
-
-				while True:
-					line = f.readline()
-					if not line or line.strip().startswith("[ "):
-						break
-					if line.strip().startswith(";") or line.strip().startswith("#") or len(line.strip()) == 0:
-						continue	
-					# check if it's not an improper dihedral
-					if int(line.split()[4]) != dtype:
-						continue
-
-					if (line.split()[0] == "X" and line.split()[1] == t2 and line.split()[2] == t3 and line.split()[3] == t4) or (line.split()[0] == t4 and line.split()[1] == t3 and line.split()[2] == t2 and line.split()[3] == "X"):
-						fnd_lines.append(line)
-					elif (line.split()[0] == t1 and line.split()[1] == t2 and line.split()[2] == t3 and line.split()[3] == "X") or (line.split()[0] == "X" and line.split()[1] == t3 and line.split()[2] == t2 and line.split()[3] == t1):
-						fnd_lines.append(line)
-		
-			# if still not found, try with two missing atoms
-			if (len(fnd_lines) == 0):
-				f.seek(fpos[i])
-
-				while True:
-					line = f.readline()
-					if not line or line.strip().startswith("[ "):
-						break
-					if line.strip().startswith(";") or line.strip().startswith("#") or len(line.strip()) == 0:
-						continue
-
-					# check if the line has the right dihedral type
-					if int(line.split()[4]) != dtype:
-						continue
-
-					if (line.split()[0] == "X" and line.split()[1] == t2 and line.split()[2] == t3 and line.split()[3] == "X") or (line.split()[0] == "X" and line.split()[1] == t3 and line.split()[2] == t2 and line.split()[3] == "X"):
-						fnd_lines.append(line)
-						continue
+	ff = get_forcefield(path)
 
-					if (line.split()[0] == "X" and line.split()[1] == "X" and line.split()[2] == t3 and line.split()[3] == t4) or (line.split()[0] == t4 and line.split()[1] == t3 and line.split()[2] == "X" and line.split()[3] == "X"):
-						fnd_lines.append(line)
-						continue
+	# the atom types in both directions, then with one and two missing atoms (X)
+	exact = [(t1,t2,t3,t4), (t4,t3,t2,t1)]
+	onex = [("X",t2,t3,t4), (t4,t3,t2,"X"), (t1,t2,t3,"X"), ("X",t3,t2,t1)]
+	twox = [("X",t2,t3,"X"), ("X",t3,t2,"X"), ("X","X",t3,t4), (t4,t3,"X","X"), ("X","X",t2,t1), (t1,t2,"X","X")]
 
-					if (line.split()[0] == "X" and line.split()[1] == "X" and line.split()[2] == t2 and line.split()[3] == t1) or (line.split()[0] == t1 and line.split()[1] == t2 and line.split()[2] == "X" and line.split()[3] == "X"):
-						fnd_lines.append(line)
-						continue
+	# for every dihedraltypes section, look for the dihedrals, only using the wildcards if nothing was found yet
+	fnd_lines = []
+	for section in ff.dihedraltypes:
+		fnd_lines += ff.dihedrals(section, dtype, exact)
+		if (len(fnd_lines) == 0):
+			fnd_lines += ff.dihedrals(section, dtype, onex)
+		if (len(fnd_lines) == 0):
+			fnd_lines += ff.dihedrals(section, dtype, twox)
 
 	# in opls, we should find just one line and return it
 	if "opls" in ffname:
@@ -237,12 +135,12 @@ def top2dfr(topfile, geomfile, flexfrag, eqgeom, savefrags, topcharges, ffname,
 
 	# get the atomic positions from the geometry file
 	base, ext = os.path.splitext(geomfile)
-	if not ob3:
+	if not is_ob3():
 		etab = openbabel.OBElementTable()
 	mol = pybel.readfile(ext[1:],geomfile).__next__()
 	molxyzinfo = {}
 	for i, atom in enumerate(mol,1):
-		if ob3:
+		if is_ob3():
 			molxyzinfo[i] = [openbabel.GetSymbol(atom.atomicnum),atom.coords]
 		else:
 			molxyzinfo[i] = [etab.GetSymbol(atom.atomicnum),atom.coords]
@@ -513,7 +411,7 @@ def top2dfr(topfile, geomfile, flexfrag, eqgeom, savefrags, topcharges, ffname,
 				ffline = lookup_ffimproper(line.split()[5], path)
 				improper.append(line.split()[0]+" "+line.split()[1]+" "+line.split()[2]+" "+line.split()[3]+"   \t"+str(round(j2cal(float(ffline.split()[3])),3))+"\t"+ffline.split()[2]+"\n")
 			else:
-				ffline = lookup_ffdihedral(atoms[line.split()[0]][9], atoms[line.split()[1]][9], atoms[line.split()[2]][9], atoms[line.split()[3]][9], 4, path)
+				ffline = lookup_ffdihedral(atoms[line.split()[0]][9], atoms[line.split()[1]][9], atoms[line.split()[2]][9], atoms[line.split()[3]][9], 4, ffname, path)
 				improper.append(line.split()[0]+" "+line.split()[1]+" "+line.split()[2]+" "+line.split()[3]+"   \t"+"OPLS"+"\t"+str(j2cal(float(ffline.split()[5])))+"\t"+str(j2cal(float(ffline.split()[6])))+"\t"+str(j2cal(float(ffline.split()[7])))+"\t"+ffline.split()[8]+"\t"+ffline.split()[9]+"\t"+ffline.split()[10]+"\n")
 
 	# print everything to the output file
@@ -554,26 +452,69 @@ def top2dfr(topfile, geomfile, flexfrag, eqgeom, savefrags, topcharges, ffname,
 	print("The files %s and %s were successfully generated." % (base+".txt",base+".dfr"))
 	# print "Don't forget to check the order of the atoms in the improper dihedrals (central atom first)."
 
+# geometry formats read by OpenBabel
+OBABEL_SUP = ["gro", "acr", "adf", "adfout", "alc", "arc", "bgf", "box", "bs", "c3d1", "c3d2", "cac", "caccrt", "cache", "cacint", "can", "car", "ccc", "cdx", "cdxml", "cht", "cif", "ck", "cml", "cmlr", "com", "copy", "crk2d", "crk3d", "csr", "cssr", "ct", "cub", "cube", "dmol", "dx", "ent", "fa", "fasta", "fch", "fchk", "fck", "feat", "fh", "fix", "fpt", "fract", "fs", "fsa", "g03", "g92", "g94", "g98", "gal", "gam", "gamin", "gamout", "gau", "gjc", "gjf", "gpr", "gr96", "gukin", "gukout", "gzmat", "hin", "inchi", "inp", "ins", "jin", "jout", "mcdl", "mcif", "mdl", "ml2", "mmcif", "mmd", "mmod", "mol", "mol2", "molden", "molreport", "moo", "mop", "mopcrt", "mopin", "mopout", "mpc", "mpd", "mpqc", "mpqcin", "msi", "msms", "nw", "nwo", "outmol", "pc", "pcm", "pdb", "png", "pov", "pqr", "pqs", "prep", "qcin", "qcout", "report", "res", "rsmi", "rxn", "sd", "sdf", "smi", "smiles", "sy2", "t41", "tdd", "test", "therm", "tmol", "txt", "txyz", "unixyz", "vmol", "xed", "xml", "xyz", "yob", "zin"]
+
+# extensions tried, in this order, for the geometry of each .top of a batch directory (.txt is an output)
+BATCH_GEOMETRIES = [".gro", ".pdb", ".mol2", ".xyz"] + ["."+x for x in OBABEL_SUP if x not in ("gro", "pdb", "mol2", "xyz", "txt")]
+
+def check_geometry(geomfile):
+	ext = os.path.splitext(geomfile)[1]
+	if ext[1:] not in OBABEL_SUP:
+		print("The extension of the geometry file (%s) is not supported by OpenBabel" % (ext))
+		sys.exit(0)
+
+def batch_molecules(batch):
+	"""
+	Topology and geometry of each molecule of a batch: a directory (each .top with the geometry of the same name) or
+	a manifest with a topology and a geometry in each line.
+	"""
+	if os.path.isdir(batch):
+		entries = pair_files(batch, ".top", BATCH_GEOMETRIES)
+	else:
+		entries = read_manifest(batch)
+
+	molecules = []
+	for entry in entries:
+		if len(entry) != 2:
+			print("Skipping %s: a topology and a geometry are needed for each molecule" % (" ".join(entry)))
+			continue
+		molecules.append(entry)
+	return molecules
+
+def convert_molecule(topfile, geomfile, flexfrag, eqgeom, savefrags, topcharges, ffname, path):
+	check_geometry(geomfile)
+	top2dfr(topfile, geomfile, flexfrag, eqgeom, savefrags, topcharges, ffname, path)
+
+def init_worker(path):
+	# with fork the index loaded by the parent is inherited, otherwise it is read from the cache once per worker
+	get_forcefield(path)
+	pybel._load()
+
 if __name__ == '__main__':
 	parser = argparse.ArgumentParser(description="Receives a GROMACS topology and geometry and creates a '.dfr' (Dice FRagment) file.")
-	parser.add_argument("topfile", help="the topology file (.top - if created from gmx pdb2gmx this file is 'topol.top') containing the molecule data for the OPLS-AA force field.")
-	parser.add_argument("geomfile", help="the geometry file used to generate the topology (the order of the atoms must be the same of the topology!)")
+	parser.add_argument("topfile", nargs="?", help="the topology file (.top - if created from gmx pdb2gmx this file is 'topol.top') containing the molecule data for the OPLS-AA force field.")
+	parser.add_argument("geomfile", nargs="?", help="the geometry file used to generate the topology (the order of the atoms must be the same of the topology!)")
 	parser.add_argument("--gromacs-ff-path", "-p", help="specifies the GROMACS top directory (default: /usr/local/gromacs/share/gromacs/top/)", default="/usr/local/gromacs/share/gromacs/top/")
 	parser.add_argument("--force-field", "-f", help="specifies the force field from the list: oplsaa, amber94, amber96, amber99, amber99sb, amber99sb-ildn, ambergs (default OPLS-AA).", default="oplsaa")
 	parser.add_argument("--save-fragments", "-s", help="save the fragment configurations in .xyz.", action="store_true")
 	parser.add_argument("--flexible-fragments", help="if you will perform a simulation with flexible fragments use this option to have a complete .dfr with all the parameters.", action="store_true")
 	parser.add_argument("--eq-from-geom", "-g", help="get the equilibrium values for bonds and angles from geometry instead of force field values.", action="store_true")
 	parser.add_argument("--charges-from-topology", "-c", help="Use the charges from the topology file instead of the force field file.", action="store_true")
+	parser.add_argument("--batch", "-b", help="convert many molecules: a directory (each .top with the geometry of the same name) or a file with a topology and a geometry in each line. The force field is loaded once and the molecules are converted in parallel.")
+	parser.add_argument("-nproc", "--nproc", type=int, default=None, help="number of processes used by --batch (default = number of CPUs)")
+	parser.add_argument("--verbose", "-v", help="with --batch, also show the messages of the molecules converted successfully.", action="store_true")
 
 	args = parser.parse_args()
 
+	if args.batch and (args.topfile or args.geomfile):
+		parser.error("give either a topology and a geometry or --batch")
+	if not args.batch and not (args.topfile and args.geomfile):
+		parser.error("the topology and the geometry files are required (or use --batch)")
+
 	# check input consistency
-	obabel_sup = ["gro", "acr", "adf", "adfout", "alc", "arc", "bgf", "box", "bs", "c3d1", "c3d2", "cac", "caccrt", "cache", "cacint", "can", "car", "ccc", "cdx", "cdxml", "cht", "cif", "ck", "cml", "cmlr", "com", "copy", "crk2d", "crk3d", "csr", "cssr", "ct", "cub", "cube", "dmol", "dx", "ent", "fa", "fasta", "fch", "fchk", "fck", "feat", "fh", "fix", "fpt", "fract", "fs", "fsa", "g03", "g92", "g94", "g98", "gal", "gam", "gamin", "gamout", "gau", "gjc", "gjf", "gpr", "gr96", "gukin", "gukout", "gzmat", "hin", "inchi", "inp", "ins", "jin", "jout", "mcdl", "mcif", "mdl", "ml2", "mmcif", "mmd", "mmod", "mol", "mol2", "molden", "molreport", "moo", "mop", "mopcrt", "mopin", "mopout", "mpc", "mpd", "mpqc", "mpqcin", "msi", "msms", "nw", "nwo", "outmol", "pc", "pcm", "pdb", "png", "pov", "pqr", "pqs", "prep", "qcin", "qcout", "report", "res", "rsmi", "rxn", "sd", "sdf", "smi", "smiles", "sy2", "t41", "tdd", "test", "therm", "tmol", "txt", "txyz", "unixyz", "vmol", "xed", "xml", "xyz", "yob", "zin"]
-	geomfile = os.path.realpath(args.geomfile)
-	base, ext = os.path.splitext(geomfile)
-	if ext[1:] not in obabel_sup:
-		print("The extension of the geometry file (%s) is not supported by OpenBabel" % (ext))
-		sys.exit(0)
+	if not args.batch:
+		check_geometry(os.path.realpath(args.geomfile))
 
 	if (args.force_field.lower() not in ["oplsaa","amber94","amber96","amber99","amber99sb","amber99sb-ildn","ambergs"]):
 		print("You have specified an unsupported force field (%s)" % (args.force_field.lower()))
@@ -587,5 +528,18 @@ if __name__ == '__main__':
 		print("\n!!!! ATTENTION!: using charges from the force field (GROMACS path)                                 !!!!")
 		print('!!!! If you wish to use the charges from your topology, use the "--charges-from-topology" option.  !!!!\n')
 
+	if args.batch:
+		molecules = batch_molecules(args.batch)
+		if not molecules:
+			print("No molecules were found in %s" % (args.batch))
+			sys.exit(1)
+		# load the force field index before starting the workers
+		get_forcefield(FFPATH)
+		options = (args.flexible_fragments, args.eq_from_geom, args.save_fragments, args.charges_from_topology, ffname, FFPATH)
+		results = run_batch(convert_molecule, [tuple(mol) + options for mol in molecules], args.nproc, init_worker, (FFPATH,))
+		if report([os.path.basename(mol[0]) for mol in molecules], results, args.verbose):
+			sys.exit(1)
+		sys.exit(0)
+
 	# convert the file
 	top2dfr(args.topfile, args.geomfile, args.flexible_fragments, args.eq_from_geom, args.save_fragments, args.charges_from_topology, ffname, FFPATH)
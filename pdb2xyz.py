@@ -1,4 +1,14 @@
 import argparse as arg
+import mmap
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from diceio import compression, open_file
+from dicetop import IncompleteMolecule, load_txt
 
 # fmt: off
 ELEMENTS = {'H': 1, 'He': 2, 'Li': 3, 'Be': 4, 'B': 5, 'C': 6, 'N': 7, 'O': 8, 'F': 9, 'Ne': 10, 'Na': 11, 'Mg': 12,
@@ -28,7 +38,11 @@ Instituto de Fisica da Universidade de Sao Paulo (IF/USP)
 
 ***********************************************************************"""
 
-STEP = 0
+CHUNK_SIZE = 1 << 24  # number of bytes read at once from the pdb trajectory
+
+CONF_INFO = " Configuration number :{0: >9}L = {1:>9.4f}{2:>9.4f}{3:>9.4f}\n"
+
+POS_INFO = "  {0: >2}%15.5f%15.5f%15.5f\n"
 
 
 class IncorrectNumberOfAtomsOnTrajectory(Exception):
@@ -58,90 +72,282 @@ class IncorrectNumberOfAtomsOnTopology(Exception):
         super().__init__(message)
 
 
-def process_config(pdbfile, xyzfile, natoms, elements, reset_step=False):
-    """Process a configuration of the trajectory pdb file
+def frame_blocks(pdbfile, chunk_size=CHUNK_SIZE):
+    """Split the pdb trajectory in byte blocks, one for each frame
 
     Args:
-        pdbfile (arg.FileType): pdb input file opened by the argparse module
-        xyzfile (arg.FileType): xyz output file created by the argparse module
+        pdbfile (file): pdb input file opened in binary mode
+        chunk_size (int, optional): number of bytes read at once. Defaults to CHUNK_SIZE.
+
+    Yields:
+        bytes: all the lines of a frame, the last one being the ENDMDL line
+    """
+    tail = b""
+
+    while True:
+        chunk = pdbfile.read(chunk_size)
+        if not chunk:
+            break
+
+        data = tail + chunk
+        pos = 0
+
+        while True:
+            end = data.find(b"ENDMDL", pos)
+            if end == -1:
+                break
+            eol = data.find(b"\n", end)
+            if eol == -1:
+                break
+            yield data[pos : eol + 1]
+            pos = eol + 1
+
+        tail = data[pos:]
+
+    if b"ENDMDL" in tail:  # last frame without the line break
+        yield tail
+
+
+def atom_coordinates(atoms, natoms):
+    """Slice the fixed-width coordinate columns of the ATOM lines into an array
+
+    Args:
+        atoms (bytes): ATOM lines of a frame, each one ended by a line break
+        natoms (int): number of atoms in the configuration
+
+    Raises:
+        IncorrectNumberOfAtomsOnTrajectory: raised when the number of lines differs from natoms
+
+    Returns:
+        numpy.ndarray: array of shape (natoms, 3) with the coordinates
+    """
+    width = atoms.find(b"\n") + 1
+
+    # all lines with the same width (the usual for trjconv) can be viewed as a table of bytes
+    if width > 54 and len(atoms) == natoms * width:
+        table = np.frombuffer(atoms, dtype=np.uint8).reshape(natoms, width)
+        if (table[:, -1] == ord("\n")).all():
+            return np.ascontiguousarray(table[:, 30:54]).view("S8").astype(float)
+
+    lines = atoms.splitlines()
+    if len(lines) != natoms:
+        raise IncorrectNumberOfAtomsOnTrajectory()
+
+    table = np.array(lines, dtype="S54").view(np.uint8).reshape(natoms, 54)
+    return np.ascontiguousarray(table[:, 30:54]).view("S8").astype(float)
+
+
+def parse_frame(block, natoms):
+    """Get the step, box dimensions and coordinates from a frame of the pdb trajectory
+
+    Args:
+        block (bytes): lines of the frame as returned by frame_blocks
         natoms (int): number of atoms in the configuration
-        elements (list): list with the elements in the same order from the txt file
-        reset_step (bool, optional): if False the configuration number is the same from the pdb file.
-                                     Otherwise the number will start from 0 and have a step of 1. Defaults to False.
 
     Raises:
         IncorrectNumberOfAtomsOnTrajectory: raised when the number of atoms provided differs from what there is in 
                                             the configuration
 
     Returns:
-        int: 1 if the file ended or 0 otherwise
+        tuple: step (str) from the TITLE line, box dimensions (numpy.ndarray) and coordinates (numpy.ndarray)
     """
-    if pdbfile.readline() == "":
-        return 1  # end of file
+    title = block.find(b"TITLE")
+    step = block[title : block.find(b"\n", title)].split()[-1].decode()
 
-    global STEP
+    cryst = block.find(b"CRYST1")
+    try:
+        dims = np.array(block[cryst : block.find(b"\n", cryst)].split()[1:4], dtype=float)
+    except ValueError:
+        raise IncorrectNumberOfAtomsOnTrajectory()
 
-    xyzfile.write("{0: >12}\n".format(natoms))
+    if cryst == -1 or len(dims) != 3:
+        raise IncorrectNumberOfAtomsOnTrajectory()
 
-    conf_info = " Configuration number :{0: >9}L = {1:>9.4f}{2:>9.4f}{3:>9.4f}\n"
+    first = block.find(b"\n", block.find(b"MODEL")) + 1
+    last = block.find(b"\nTER", first)
+    if last == -1:
+        last = block.find(b"\nENDMDL", first)
 
-    if not reset_step:
-        step = (pdbfile.readline().split())[-1]
+    return step, dims, atom_coordinates(block[first : last + 1], natoms)
 
-        pdbfile.readline()  # Pass the REMARK line
 
-        STEP += 1
-        try:
-            dims = list(map(float, (pdbfile.readline().split())[1:4]))
-        except:
-            raise IncorrectNumberOfAtomsOnTrajectory()
+def frame_template(elements):
+    """Build the format string of the atom lines of a xyz frame
 
-        xyzfile.write(conf_info.format(step, dims[0], dims[1], dims[2]))
+    Args:
+        elements (list): list with the elements in the same order from the txt file
+
+    Returns:
+        str: format string expecting the x, y and z of every atom
+    """
+    return "".join(POS_INFO.format(el) for el in elements)
 
-    else:
-        pdbfile.readline()  # Pass the TITLE line
-        pdbfile.readline()  # Pass the REMARK line
 
-        STEP += 1
-        try:
-            dims = list(map(float, (pdbfile.readline().split())[1:4]))
-        except:
-            raise IncorrectNumberOfAtomsOnTrajectory()
-        xyzfile.write(conf_info.format(STEP, dims[0], dims[1], dims[2]))
+def format_frame(confnum, dims, coords, template):
+    """Write a configuration in the DICE xyz format
 
-    pdbfile.readline()  # MODEL line
+    Args:
+        confnum (int or str): number of the configuration
+        dims (numpy.ndarray): box dimensions
+        coords (numpy.ndarray): array of shape (natoms, 3) with the coordinates
+        template (str): format string of the atom lines built by frame_template
 
-    dims[0], dims[1], dims[2] = dims[0] / 2, dims[1] / 2, dims[2] / 2
+    Returns:
+        bytes: the whole configuration, ready to be written
+    """
+    header = "{0: >12}\n".format(len(coords)) + CONF_INFO.format(confnum, *dims)
 
-    pos_info = "  {0: >2}{1:>-15.5f}{2:>-15.5f}{3:>-15.5f}\n"
+    return (header + template % tuple(coords.ravel().tolist())).encode()
 
-    for i in range(natoms):
-        pos = list(map(float, (pdbfile.readline()[30:54].split()))) # 30:54 is the range of the coordinates in the pdb file
 
-        try:
-            xyzfile.write(
-                pos_info.format(
-                    elements[i], pos[0] - dims[0], pos[1] - dims[1], pos[2] - dims[2]
-                )
-            )
-        except IndexError:
-            raise IncorrectNumberOfAtomsOnTrajectory()
+def process_frame(block, natoms, template, confnum=None):
+    """Convert a frame of the pdb trajectory to the DICE xyz format
+
+    Args:
+        block (bytes): lines of the frame as returned by frame_blocks
+        natoms (int): number of atoms in the configuration
+        template (str): format string of the atom lines built by frame_template
+        confnum (int, optional): number of the configuration. If None the step from the pdb file is used.
+                                 Defaults to None.
+
+    Returns:
+        bytes: the converted configuration
+    """
+    step, dims, coords = parse_frame(block, natoms)
+    coords -= dims / 2  # put the center of the box in the origin
+
+    return format_frame(step if confnum is None else confnum, dims, coords, template)
+
+
+def convert(pdbfile, xyzfile, natoms, elements, start=1, final=2147483647, intv=1, reset_step=False):
+    """Convert the frames start, start + intv, ..., up to final of the pdb trajectory
 
-    pdbfile.readline()  # Pass ENDML line
-    pdbfile.readline()  # Pass TER line
+    Args:
+        pdbfile (file): pdb input file opened in binary mode
+        xyzfile (file): xyz output file opened in binary mode
+        natoms (int): number of atoms in the configuration
+        elements (list): list with the elements in the same order from the txt file
+        start (int, optional): first frame to be converted. Defaults to 1.
+        final (int, optional): last frame to be considered. Defaults to 2147483647.
+        intv (int, optional): interval between the converted frames. Defaults to 1.
+        reset_step (bool, optional): if False the configuration number is the same from the pdb file.
+                                     Otherwise the frame number is used. Defaults to False.
+    """
+    template = frame_template(elements)
+
+    for frame, block in enumerate(frame_blocks(pdbfile), 1):
+        if frame > final:
+            break
+        if frame < start or (frame - start) % intv:
+            continue
 
-    return 0 # if the file didn`t end
+        xyzfile.write(process_frame(block, natoms, template, frame if reset_step else None))
 
 
-def pass_config(pdbfile, natoms):
-    """Used to ignore a configuration
+def index_frames(pdbname):
+    """Find the byte offsets of the frames in the pdb trajectory scanning it only once
 
     Args:
-        pdbfile (arg.FileType): pdb input file opened by the argparse module
+        pdbname (str): name of the pdb trajectory file
+
+    Returns:
+        list: offset of the beginning of each frame followed by the offset of the end of the last one
+    """
+    offsets = [0]
+
+    with open(pdbname, "rb") as pdb:
+        if os.fstat(pdb.fileno()).st_size == 0:
+            return offsets
+
+        with mmap.mmap(pdb.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            pos = mm.find(b"ENDMDL")
+            while pos != -1:
+                eol = mm.find(b"\n", pos)
+                offsets.append(len(mm) if eol == -1 else eol + 1)
+                pos = mm.find(b"ENDMDL", offsets[-1])
+
+    return offsets
+
+
+_WORKER = None  # arguments shared by all the chunks converted by a worker process
+
+
+def _init_worker(pdbname, natoms, elements):
+    """Initialize a worker process of convert_parallel"""
+    global _WORKER
+
+    _WORKER = (pdbname, natoms, frame_template(elements))
+
+
+def _convert_chunk(task):
+    """Convert a chunk of frames to a temporary xyz file
+
+    Args:
+        task (tuple): name of the temporary output and a list of (frame, offset, size) of the frames in the chunk
+
+    Returns:
+        str: name of the temporary output
+    """
+    chunkname, frames, reset_step = task
+    pdbname, natoms, template = _WORKER
+
+    with open(pdbname, "rb") as pdb, open(chunkname, "wb") as xyz:
+        for frame, offset, size in frames:
+            pdb.seek(offset)
+            block = pdb.read(size)
+            xyz.write(process_frame(block, natoms, template, frame if reset_step else None))
+
+    return chunkname
+
+
+def convert_parallel(pdbname, xyzfile, natoms, elements, start=1, final=2147483647, intv=1, reset_step=False,
+                     nproc=None, chunksize=None):
+    """Convert the selected frames of the pdb trajectory in parallel, seeking directly to each one of them
+
+    Args:
+        pdbname (str): name of the pdb trajectory file
+        xyzfile (file): xyz output file opened in binary mode
         natoms (int): number of atoms in the configuration
+        elements (list): list with the elements in the same order from the txt file
+        start (int, optional): first frame to be converted. Defaults to 1.
+        final (int, optional): last frame to be considered. Defaults to 2147483647.
+        intv (int, optional): interval between the converted frames. Defaults to 1.
+        reset_step (bool, optional): if False the configuration number is the same from the pdb file.
+                                     Otherwise the frame number is used. Defaults to False.
+        nproc (int, optional): number of worker processes. Defaults to the number of CPUs.
+        chunksize (int, optional): number of frames converted by each task. Defaults to None, which
+                                   gives four chunks per worker.
     """
-    for _ in range(natoms + 7): # 7 is the number of lines with comments in the pdb file
-        pdbfile.readline()
+    offsets = index_frames(pdbname)
+    nframes = len(offsets) - 1
+
+    frames = [
+        (frame, offsets[frame - 1], offsets[frame] - offsets[frame - 1])
+        for frame in range(start, min(final, nframes) + 1, intv)
+    ]
+    if not frames:
+        return
+
+    nproc = nproc or os.cpu_count()
+    if chunksize is None:
+        chunksize = -(-len(frames) // (4 * nproc))
+
+    tmpdir = tempfile.mkdtemp(prefix="pdb2xyz_", dir=os.path.dirname(os.path.abspath(xyzfile.name)))
+
+    tasks = [
+        (os.path.join(tmpdir, "chunk{}.xyz".format(n)), frames[i : i + chunksize], reset_step)
+        for n, i in enumerate(range(0, len(frames), chunksize))
+    ]
+
+    try:
+        with mp.Pool(nproc, initializer=_init_worker, initargs=(pdbname, natoms, elements)) as pool:
+            # the chunks arrive in order, so they can be appended as soon as they are ready
+            for chunkname in pool.imap(_convert_chunk, tasks):
+                with open(chunkname, "rb") as chunk:
+                    shutil.copyfileobj(chunk, xyzfile)
+                os.remove(chunkname)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
 
 
 def get_key(val):
@@ -199,25 +405,12 @@ def read_txt(txtfile):
         list: list of lists of the atomic numbers of the atoms in the molecules
     """
     with txtfile as txt:
-        txt.readline()
-        nmol = int(txt.readline())
-
-        at_per_mol = []
-
-        for mol in range(nmol):
-            natom = int((txt.readline().split())[0])
-            at_num = []
-
-            try:
-                for at in range(natom):
-                    num = int((txt.readline().split())[1])
-                    at_num.append(num)
-
-                at_per_mol.append(at_num)
-            except IndexError:
-                raise IncorrectNumberOfAtomsOnTopology(mol + 1, natom, at)
+        try:
+            topology = load_txt(txt)
+        except IncompleteMolecule as e:
+            raise IncorrectNumberOfAtomsOnTopology(e.mol, e.natom, e.at)
 
-    return at_per_mol
+    return [mol.atomic_numbers.tolist() for mol in topology.molecules]
 
 
 def check_txt(txt, nmol):
@@ -300,8 +493,8 @@ if __name__ == "__main__":
 
     grp_input.add_argument(
         "pdb",
-        type=arg.FileType("r"),
-        help="name of pdb trajectory file generated by GROMACS trjconv",
+        help="""name of pdb trajectory file generated by GROMACS trjconv, which can be
+        compressed (.gz, .bz2, .xz or .zst)""",
     )
 
     grp_input.add_argument(
@@ -318,9 +511,9 @@ if __name__ == "__main__":
 
     grp_output.add_argument(
         "-o",
-        type=arg.FileType("w+"),
         default="output.xyz",
-        help="name of xyz trajectory file in DICE format (default: output.xyz)",
+        help="""name of xyz trajectory file in DICE format, compressed if it ends in .gz, .bz2,
+        .xz or .zst (default: output.xyz)""",
         metavar="name",
     )
 
@@ -355,6 +548,16 @@ if __name__ == "__main__":
         metavar="#",
     )
 
+    grp_output.add_argument(
+        "-nproc",
+        type=int,
+        nargs=1,
+        default=[1],
+        help="""number of processes used to convert the frames. With more than one the frames
+        are indexed first and only the selected ones are read (default: 1)""",
+        metavar="#",
+    )
+
     grp_output.add_argument(
         "-printinterval", type=int, nargs=1, default=[1], help="or -intv", metavar="#"
     )
@@ -392,26 +595,14 @@ if __name__ == "__main__":
     if intv < printinterval: # if both intv and printinterval, the higher will be used
         intv = printinterval
 
-    for _ in range(start - 1): # when start is different than 1
-        STEP += 1
-        pass_config(args.pdb, natoms)
-
-    if intv == 1:
-        while True:
-            end_of_file = process_config(args.pdb, args.o, natoms, el, args.r)
-            if end_of_file or STEP >= final:
-                break
-
-    else:
-        while True:
-            end_of_file = process_config(args.pdb, args.o, natoms, el, args.r)
-
-            for _ in range(intv - 1):
-                STEP += 1
-                pass_config(args.pdb, natoms)
-
-            if end_of_file or STEP >= final:
-                break
-
-    args.o.close()
-    args.pdb.close()
+    nproc = args.nproc[0]
+    if nproc > 1 and compression(args.pdb):
+        print("The frames of a compressed pdb can't be indexed, converting with a single process")
+        nproc = 1
+
+    with open_file(args.o, "wb") as xyz:
+        if nproc > 1:
+            convert_parallel(args.pdb, xyz, natoms, el, start, final, intv, args.r, nproc)
+        else:
+            with open_file(args.pdb, "rb") as pdb:
+                convert(pdb, xyz, natoms, el, start, final, intv, args.r)
@@ -13,11 +13,9 @@ import numpy as np
 from numpy import cos
 from numpy import sin
 from numpy import sqrt
-import matplotlib as mpl
-# Force matplotlib to not use any Xwindows backend.
-mpl.use('Agg')
-import matplotlib.pyplot as plt
-from distutils.spawn import find_executable
+from dicedeps import mpl, plt
+from dicetop import TopologyError, bond_sides, load_dfr, load_txt
+from shutil import which
 try:
   from Queue import Queue
 except:
@@ -198,182 +196,101 @@ def find_rigid_parts(frags, fconn, a1, a2, a3, a4):
     print("You should have atoms %d and %d belonging to two fragments. Maybe it's the sequence does not define a dihedral?" % (a2, a3))
     sys.exit(0)
 
-  # based on the fragment connections, build the two parts running a BFS exploration
-  pt1 = frags[fragsParts[0]]
-  pt2 = frags[fragsParts[1]]
-
-  visited1 = [fragsParts[0], fragsParts[1]]
-  visited2 = [fragsParts[0], fragsParts[1]]
-
-  q = Queue()
-
-  # connected to frag1
-  q.put(fragsParts[0])
-
-  while not q.empty():
-    fref = q.get()
-    for frag in fconn[fref]:
-      if frag in visited1:
-        continue
-      else:
-        q.put(frag)
-        visited1.append(frag)
-
-
-      for atom in frags[frag]:
-        if atom not in pt1:
-          pt1.append(atom)
-
-
-  # connected to frag2
-  q.put(fragsParts[1])
-
-  while not q.empty():
-    fref = q.get()
-    for frag in fconn[fref]:
-      if frag in visited2:
-        continue
-      else:
-        q.put(frag)
-        visited2.append(frag)
-
-      for atom in frags[frag]:
-        if atom not in pt2:
-          pt2.append(atom)
+  # the two sides of every bond between fragments, each one with the atoms of the fragments reached from one of them
+  sides = bond_sides({idx: np.asarray(frag) for idx, frag in frags.items()}, fconn)
+  if (a2, a3) not in sides:
+    print("The fragments with atoms %d and %d should be connected in the .dfr and share only these two atoms" % (a2, a3))
+    sys.exit(0)
+  pt1, pt2 = sides[(a2, a3)]
 
   if a1 in pt2:
-    aux = pt2
-    pt2 = pt1
-    pt1 = aux
+    pt1, pt2 = pt2, pt1
 
   return pt1, pt2
 
 
 def parse_txt(txtfile):
-  atomSp = {}
-  atomsCoord = {}
-  nbParams = {}
-  with open(txtfile,'r') as f:
-    line = f.readline()
-    if (line.strip() == '*'):
-      mult = True
-    else:
-      mult = False
-    line = f.readline()
-    if (int(line.strip()) > 1):
-      print("Your .txt file is supposed to contain only one molecule. Aborting..")
-      sys.exit(0)
-    natoms = int(f.readline().split()[0])
-    anum = 1
-    for line in f:
-      if (line.strip().lower() == "$end"): break
-      atomSp[anum] = line.split()[1]
-      atomsCoord[anum] = [float(x) for x in line.split()[2:5]]
-      nbParams[anum] = [float(x) for x in line.split()[5:]]
-      anum += 1
+  txt = load_txt(txtfile)
+  if (len(txt.molecules) > 1):
+    print("Your .txt file is supposed to contain only one molecule. Aborting..")
+    sys.exit(0)
+  mol = txt.molecules[0]
 
-  return mult, natoms, atomSp, atomsCoord, nbParams
+  atomSp = {i+1: str(num) for i, num in enumerate(mol.atomic_numbers.tolist())}
+  atomsCoord = {i+1: xyz for i, xyz in enumerate(mol.coords.tolist())}
+  missing = np.argwhere(np.isnan(mol.nbparams[:, :3]))
+  if len(missing):
+    at, par = missing[0].tolist()
+    raise TopologyError("The %s of atom %d of %s is missing or not a number" % (["charge", "epsilon", "sigma"][par], at+1, txtfile))
+  # the columns after the sigma are only there in some lines
+  nbParams = {i+1: nb[:3] + [x for x in nb[3:] if x == x] for i, nb in enumerate(mol.nbparams.tolist())}
 
+  return txt.mult, len(mol), atomSp, atomsCoord, nbParams
 
-def parse_dfr(dfrfile, ab2, ab3):
-  potentialDict = {}
-  connInfo = {}
-  fragInfo = {}
-  fconnInfo = {}
-  with open(dfrfile,'r') as f:
-    # read the fragments
-    line = f.readline()
-    while (line.strip().lower() != "$atoms fragments"):
-      line = f.readline()
-    fnum = 1
-    line = f.readline()
-    fnd_delim = False
-    while (line.strip().lower() != "$end atoms fragments"):
-      if not line.strip():
-        line = f.readline()
-        continue
 
-      if "[" in line and "]" in line:
-        fragInfo[fnum] = [int(x) for x in line.split()[2:-2]]
-        fnum += 1
-        fnd_delim = False
-      elif "[" in line:
-        fnd_delim = True
-        fragInfo[fnum] = [int(x) for x in line.split()[2:]]
-      elif "[" not in line and "]" not in line:
-        if not fnd_delim:
-          print("It seems like the fragments in your .dfr are not delimited by []'s as in \"1 [ 1 2 3 ] R\"")
-          sys.exit(0)
-        for atom in [int(x) for x in line.split()]:
-          fragInfo[fnum].append(atom)
-      else:
-        if not fnd_delim:
-          print("It seems like the fragments in your .dfr are not delimited by []'s as in \"1 [ 1 2 3 ] R\"")
-          sys.exit(0)
-        for atom in [int(x) for x in line.split()[:-2]]:
-          fragInfo[fnum].append(atom)
-        fnum += 1
-        fnd_delim = False
-
-      line = f.readline()
-
-    # read the fragment connections
-    while (line.strip().lower() != "$fragment connection"):
-      line = f.readline()
-    fnum = 1
-    line = f.readline()
-    while (line.strip().lower() != "$end fragment connection"):
-      frag1 = int(line.split()[0])
-      frag2 = int(line.split()[1])
-
-      if (frag1 not in fconnInfo.keys()):
-        fconnInfo[frag1] = [frag2]
-      else:
-        fconnInfo[frag1].append(frag2)
+def parse_dfr(dfrfile, ab2, ab3):
+  try:
+    dfr = load_dfr(dfrfile)
+  except TopologyError as e:
+    print(e)
+    sys.exit(0)
 
-      if (frag2 not in fconnInfo.keys()):
-        fconnInfo[frag2] = [frag1]
-      else:
-        fconnInfo[frag2].append(frag1)
-
-      line = f.readline()
-
-    # read the bonds to get the connections later (needed for nonbonded interaction)
-    line = f.readline()
-    while (line.strip().lower() != "$bond"):
-      line = f.readline()
-    line = f.readline()
-    while (line.strip().lower() != "$end bond"):
-      atom1 = int(line.split()[0])
-      atom2 = int(line.split()[1])
-      if (atom1 not in connInfo.keys()):
-        connInfo[atom1] = [atom2]
-      else:
-        connInfo[atom1].append(atom2)
+  fragInfo = {idx: frag.tolist() for idx, frag in dfr.fragments_by_id().items()}
+  fconnInfo = dfr.connected_fragments()
+  # the bonds give the connections needed for nonbonded interaction
+  connInfo = dfr.bonded_to()
 
-      if (atom2 not in connInfo.keys()):
-        connInfo[atom2] = [atom1]
-      else:
-        connInfo[atom2].append(atom1)
-
-      line = f.readline()
-
-    # read the dihedral constants
-    line = f.readline()
-    while (line.strip().lower() != "$dihedral"):
-      line = f.readline()
-    dnum = 1
-    line = f.readline()
-    while (line.strip().lower() != "$end dihedral"):
-      if (int(line.split()[1]) == ab2 and int(line.split()[2]) == ab3) or (int(line.split()[1]) == ab3 and int(line.split()[2]) == ab2):
-        potentialDict[dnum] = [int(line.split()[0]),int(line.split()[1]),int(line.split()[2]),int(line.split()[3]),float(line.split()[5]),float(line.split()[6]),float(line.split()[7]),float(line.split()[8])*np.pi/180.,float(line.split()[9])*np.pi/180.,float(line.split()[10])*np.pi/180.]
-      dnum += 1
-      line = f.readline()
+  # the dihedral constants of the dihedrals around the bond ab2-ab3
+  potentialDict = {}
+  dih = dfr.dihedrals
+  middle = ((dih.atoms[:, 1] == ab2) & (dih.atoms[:, 2] == ab3)) | ((dih.atoms[:, 1] == ab3) & (dih.atoms[:, 2] == ab2))
+  for d in np.flatnonzero(middle).tolist():
+    params = dih.params[d]
+    potentialDict[d+1] = dih.atoms[d].tolist() + [float(x) for x in params[1:4]] + [float(x)*np.pi/180. for x in params[4:7]]
 
   return potentialDict, connInfo, fragInfo, fconnInfo
 
 
-def get_potential_curve(txtfile, dfrfile, ab1, ab2, ab3, ab4, points, base, printxyz, useamber, gausstop, gaussbot):
+class GjfWriter:
+  """
+  Gaussian input of a scan, written as the configurations are generated. The jobs are separated by --link1-- and
+  the consecutive points of the scan are split in njobs files (base_scan.gjf, or base_scan_1.gjf ... base_scan_N.gjf
+  when njobs > 1), so each file can be submitted as a separate job.
+  """
+
+  def __init__(self, base, topfile, botfile, npoints, njobs=1):
+    njobs = max(1, min(njobs, npoints))
+    if njobs == 1:
+      self.names = [base+'_scan.gjf']
+    else:
+      self.names = [base+'_scan_%d.gjf' % (i+1) for i in range(njobs)]
+    self.files = [open(name,'w') for name in self.names]
+    self.jobs = [0] * njobs
+    self.topfile = topfile
+    self.botfile = botfile
+    self.npoints = npoints
+    self.count = 0
+
+  def write(self, angle, symbols, coords):
+    ifile = min(self.count * len(self.files) // self.npoints, len(self.files)-1)
+    f = self.files[ifile]
+    # the separator goes before every job but the first of each file
+    if self.jobs[ifile]:
+      f.write("--link1--\n")
+    f.write(self.topfile.replace("ANGLEPLACEHOLDER",str(angle)))
+    f.write("".join(" %s\t%f\t%f\t%f\n" % (sym, x, y, z) for sym, (x, y, z) in zip(symbols, coords)))
+    if self.botfile:
+      f.write(self.botfile)
+    f.write("\n")
+    self.jobs[ifile] += 1
+    self.count += 1
+
+  def close(self):
+    for f in self.files:
+      f.close()
+
+
+def get_potential_curve(txtfile, dfrfile, ab1, ab2, ab3, ab4, points, base, printxyz, useamber, gausstop, gaussbot, gaussjobs=1):
 
   # put gausstop file contents into a string
   if gausstop:
@@ -396,6 +313,7 @@ def get_potential_curve(txtfile, dfrfile, ab1, ab2, ab3, ab4, points, base, prin
     topfile = ''.join(toplines)
 
   # put gaussbot file into a string
+  botfile = ""
   if gaussbot:
     with open(gaussbot, 'r') as f:
       botfile = f.read()
@@ -441,7 +359,7 @@ def get_potential_curve(txtfile, dfrfile, ab1, ab2, ab3, ab4, points, base, prin
 
   # open gjf output if needed
   if (gausstop):
-    fgjf = open(base+'_scan.gjf','w')
+    fgjf = GjfWriter(base, topfile, botfile, len(points), gaussjobs)
 
   # now loop changing the angles, calculating energies and storing them properly
   angles = []
@@ -453,7 +371,7 @@ def get_potential_curve(txtfile, dfrfile, ab1, ab2, ab3, ab4, points, base, prin
     dphi = nphi - cphi
 
     # rotate the atoms of the second fragment
-    for atom in fpt2:
+    for atom in fpt2.tolist():
       if (atom == ab2) or (atom == ab3):
         continue
       atomsCoord[atom] = rotate_point(atomsCoord[atom], abcoord1, abcoord2, dphi)
@@ -504,24 +422,13 @@ def get_potential_curve(txtfile, dfrfile, ab1, ab2, ab3, ab4, points, base, prin
 
     # print to .gjf
     if (gausstop):
-      fgjf.write(topfile.replace("ANGLEPLACEHOLDER",str(shift_angle(180.*cphi/np.pi))))
-      for i in range(1,natoms+1):
-        fgjf.write(" %s\t%f\t%f\t%f\n"%(atomsymbols[int(atomSp[i])],atomsCoord[i][0],atomsCoord[i][1],atomsCoord[i][2]))
-      if gaussbot:
-        fgjf.write(botfile)
-      fgjf.write("\n--link1--\n")
+      fgjf.write(shift_angle(180.*cphi/np.pi), [atomsymbols[int(atomSp[i])] for i in range(1,natoms+1)], [atomsCoord[i] for i in range(1,natoms+1)])
 
   if (printxyz):
     fxyz.close()
 
   if (gausstop):
     fgjf.close()
-    with open(base+'_scan.gjf') as f:
-        arq = f.readlines()
-        new_arq = arq[0:len(arq)-1]
-    with open(base+'_scan.gjf','w') as f:
-        for line in new_arq:
-            f.write(line)    
 
   return angles, died_energies, nb_energies, dipoles
 
@@ -555,6 +462,7 @@ if __name__ == '__main__':
   parser.add_argument("--amber", help="use AMBER rule to 1-4 interactions and torsional energy", action="store_true")
   parser.add_argument("--gausstop", help="generate a .gjf input with each configuration using topfile passed as argument to this option")
   parser.add_argument("--gaussbot", help="uses the file passed as argument to this option in the end of .gjf before linking the next input")
+  parser.add_argument("--gauss-jobs", type=int, default=1, help="split the .gjf of --gausstop in this number of files, each with consecutive points of the scan (default = 1)")
   parser.add_argument("--shiftangles", help="shift angles to [0,360)", action="store_true")
   parser.add_argument("--shift-min", help="find the minimum of the total energy and shift it to zero. The nonbonded and torsional are shifted based on the angle of the total energy", action="store_true")
 
@@ -592,7 +500,7 @@ if __name__ == '__main__':
   points = np.arange(refphi, 2.*np.pi+refphi, 2.*np.pi/args.npoints)
 
   # get the curve
-  phi, tors_v, nb_v, dip = get_potential_curve(args.txtfile, args.dfrfile, int(args.a1), int(args.a2), int(args.a3), int(args.a4), points, base, args.printxyz, args.amber, args.gausstop, args.gaussbot)
+  phi, tors_v, nb_v, dip = get_potential_curve(args.txtfile, args.dfrfile, int(args.a1), int(args.a2), int(args.a3), int(args.a4), points, base, args.printxyz, args.amber, args.gausstop, args.gaussbot, args.gauss_jobs)
 
   # convert to degrees and put it in [0,360) or in [-180,180)
   degphi = [180.*x/np.pi for x in phi]
@@ -635,7 +543,7 @@ if __name__ == '__main__':
   fout.close()
 
   # plotting options
-  if find_executable('latex') and find_executable('dvipng'):
+  if which('latex') and which('dvipng'):
     mpl.rcParams.update({'font.size':18, 'text.usetex':True, 'font.family':'serif', 'ytick.major.pad':4})
   else:
     mpl.rcParams.update({'font.size':18, 'font.family':'serif', 'ytick.major.pad':4})
@@ -7,11 +7,8 @@ Date: APR/2018
 """
 
 import argparse
-import matplotlib as mpl
-# Force matplotlib to not use any Xwindows backend.
-mpl.use('Agg')
-import matplotlib.pyplot as plt
-from distutils.spawn import find_executable
+from dicedeps import mpl, plt
+from shutil import which
 
 def parse_en_log_gaussian(fname):
   died = []
@@ -57,7 +54,7 @@ if __name__ == '__main__':
     print("%f\t%f" % (ang, en))
 
   # plot it
-  if find_executable('latex') and find_executable('dvipng'):
+  if which('latex') and which('dvipng'):
     mpl.rcParams.update({'font.size':18, 'text.usetex':True, 'font.family':'serif', 'ytick.major.pad':4})
   else:
     mpl.rcParams.update({'font.size':18, 'font.family':'serif', 'ytick.major.pad':4})
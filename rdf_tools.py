@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Post-processing of the radial distribution functions of DICE .gr files.
+
+Corrects the RDFs of all the pairs of one or more .gr files for the molecular
+dimensions a, b and c of the solute (the same correction applied by DiceWin),
+replacing the spherical shell volume by the volume of the shell of a
+parallelepiped, and writes the corrected curves of every pair.
+"""
+
+import argparse
+import os
+import numpy as np
+from dicedeps import pd
+from dicereaders import read_gr
+
+
+def moldim_correction(r, gr, a, b, c):
+  """
+  Correct G(r) for the molecular dimensions a, b and c. r and gr can have one
+  column for each pair, all of them are corrected at once.
+  """
+  r = np.asarray(r, dtype=np.float64)
+  gr = np.asarray(gr, dtype=np.float64)
+
+  dr = r[1] - r[0]
+  rMinus = r - dr
+  rPlus = r + dr
+
+  vEsf = ((4 * 3.1415) / 3) * (rPlus**3 - rMinus**3)
+  vPara = (a + 2*rPlus) * (b + 2*rPlus) * (c + 2*rPlus) - (a + 2*rMinus) * (b + 2*rMinus) * (c + 2*rMinus)
+
+  return (2 * gr * vEsf) / vPara
+
+
+def correct_rdfs(grItems, data, a, b, c):
+  """
+  Return a DataFrame indexed by (pair, label) with r, New G(r), G(r) and N(r)
+  for all the pairs of data, as read by dicereaders.read_gr.
+  """
+  r = data.xs('r', axis=1, level=1)[grItems].to_numpy()
+  gr = data.xs('G(r)', axis=1, level=1)[grItems].to_numpy()
+  newGr = moldim_correction(r, gr, a, b, c)
+
+  blocks = []
+  for k, pair in enumerate(grItems):
+    blocks.append(pd.DataFrame({'r': r[:, k], 'New G(r)': newGr[:, k], 'G(r)': gr[:, k],
+                             'N(r)': data[(pair, 'N(r)')].to_numpy()}))
+
+  return pd.concat(blocks, axis=1, keys=grItems)
+
+
+def write_corrected(fname, grItems, corrected, a, b, c):
+  """
+  Write the corrected RDFs of all the pairs to fname, one block for each pair.
+  """
+  with open(fname, 'w') as f:
+    f.write('# MOLECULAR DIMENSIONS\n')
+    for label, value in zip(['A', 'B', 'C'], [a, b, c]):
+      f.write('# {} = {}\n'.format(label, value))
+
+    for pair in grItems:
+      block = corrected[pair].dropna(how='all').to_numpy()
+      f.write('\n# {}\n'.format(pair))
+      f.write('# {:>15}{:>20}{:>20}{:>20}\n'.format('r', 'New G(r)', 'G(r)', 'N(r)'))
+      f.write(''.join('{:>20e}{:>20e}{:>20e}{:>20e}\n'.format(*row) for row in block))
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Corrects the RDFs of all the pairs of DICE .gr files for the molecular dimensions of the solute.")
+  parser.add_argument("a", type=float, help="first molecular dimension (in angstrom)")
+  parser.add_argument("b", type=float, help="second molecular dimension (in angstrom)")
+  parser.add_argument("c", type=float, help="third molecular dimension (in angstrom)")
+  parser.add_argument("grfiles", nargs='+', help=".gr files to be corrected")
+  parser.add_argument("--suffix", default="_moldim.dat", help="suffix of the output, written next to each .gr (default = _moldim.dat)")
+  args = parser.parse_args()
+
+  for grfile in args.grfiles:
+    grItems, data = read_gr(grfile)
+    corrected = correct_rdfs(grItems, data, args.a, args.b, args.c)
+    fout = os.path.splitext(grfile)[0] + args.suffix
+    write_corrected(fout, grItems, corrected, args.a, args.b, args.c)
+    print("%s: %d pairs corrected in %s" % (grfile, len(grItems), fout))
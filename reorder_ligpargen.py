@@ -9,27 +9,19 @@ Date: MAY/2019
 
 import os
 import argparse
-try: 
-  import pybel
-  import openbabel
-  ob3 = False
-except:
-  from openbabel import pybel
-  from openbabel import openbabel
-  ob3 = True
-import rmsd
+from dicedeps import is_ob3, openbabel, pybel
 import numpy as np
 import re
 
 def get_mol_info(mol):
   # table to convert atomic number to symbols
-  if not ob3:
+  if not is_ob3():
     etab = openbabel.OBElementTable()
 
   q_atoms = []
   q_all = []
   for atom in mol:
-    if ob3:
+    if is_ob3():
       q_atoms.append(openbabel.GetSymbol(atom.atomicnum))
     else:
       q_atoms.append(etab.GetSymbol(atom.atomicnum))
@@ -38,6 +30,12 @@ def get_mol_info(mol):
   return np.asarray(q_atoms), np.asarray(q_all)  
 
 def get_atom_correspondence(pdb, gro):
+  """
+  Index of the atom of the .gro corresponding to each atom of the .pdb (mapping) and the inverse (imapping), from a
+  single Hungarian assignment.
+  """
+  import rmsd
+
   # read pdb
   pdbmol = pybel.readfile("pdb",pdb).__next__()
   p_atoms, p_all = get_mol_info(pdbmol)
@@ -46,167 +44,89 @@ def get_atom_correspondence(pdb, gro):
   gromol = pybel.readfile("gro",gro).__next__()
   q_atoms, q_all = get_mol_info(gromol)
 
-  return rmsd.reorder_hungarian(p_atoms, q_atoms, p_all, q_all), rmsd.reorder_hungarian(q_atoms, p_atoms, q_all, p_all)
+  mapp = np.asarray(rmsd.reorder_hungarian(p_atoms, q_atoms, p_all, q_all))
+  return mapp, inverse_mapping(mapp)
+
+def inverse_mapping(mapp):
+  imapp = np.empty_like(mapp)
+  imapp[mapp] = np.arange(len(mapp))
+  return imapp
+
+def save_mapping(fname, mapp):
+  np.savetxt(fname, np.column_stack((np.arange(1, len(mapp)+1), mapp+1)), fmt="%d",
+             header="atom of the original .pdb and the corresponding atom of the LigParGen output (reorder_ligpargen)")
+
+def load_mapping(fname):
+  pairs = np.loadtxt(fname, dtype=int, ndmin=2)
+  mapp = np.empty(len(pairs), dtype=int)
+  mapp[pairs[:,0]-1] = pairs[:,1]-1
+  return mapp, inverse_mapping(mapp)
 
 def reorder_gro(gro, mapp):
-  fout = open("reordered_"+os.path.basename(gro), "w")
   with open(gro, "r") as f:
-    fout.write(f.readline())
-    natoms = f.readline()
-    fout.write(natoms)
-    natoms = int(natoms)
-    
-    # read the lines
-    lines = []
-    for i in range(natoms):
-      line = f.readline()
-      lines.append(line)
-
-    # write reordering
-    for i in range(len(lines)):
-      fout.write(lines[mapp[i]])
-
-    fout.write(f.readline())
-  fout.close()
+    lines = f.readlines()
+  natoms = int(lines[1])
+
+  # the atom lines in the new order
+  atoms = lines[2:2+natoms]
+  with open("reordered_"+os.path.basename(gro), "w") as fout:
+    fout.writelines(lines[:2] + [atoms[i] for i in mapp] + lines[2+natoms:])
+
+# number of atom indexes in the lines of each section of the .itp
+ITP_SECTION_ATOMS = {"bonds": 2, "pairs": 2, "angles": 3, "dihedrals": 4}
+ITP_FORMATS = {2: "%5d %5d     %s\n", 3: "%5d %5d %5d    %s\n", 4: "%5d %5d %5d %5d   %s\n"}
+
+def renumber_atom_line(line, num, width):
+  # replace the atom number keeping the columns aligned
+  replin = re.sub(r'\d+',"%d"%num,line,1)
+  diffslen = len(replin) - width
+  if diffslen < 0 :
+    replin = -diffslen*" " + replin
+  elif diffslen > 0:
+    replin = replin[diffslen:]
+  return replin
 
 def reorder_itp(itp, mapp, imapp):
-  fout = open("reordered_"+os.path.basename(itp), "w")
   with open(itp, "r") as f:
-    line = f.readline()
-    while ";   nr" not in line:
-      if "GENERATED BY LigParGen Server" in line:
-        line = "; GENERATED BY LigParGen Server and reordered by reordered_ligpargen\n"
-      fout.write(line)
-      line = f.readline()
-
-    fout.write(line)
-    line = f.readline()
-
-    # read atoms
-    lines = []
-    while ("opls" in line) or line.strip().startswith(";"):
-      if line.strip().startswith(";"):
-        fout.write(line)
-        f.readline()
-        continue
-      lines.append(line)
-      line = f.readline()
-
-    # write atoms in the right order
-    for i in range(len(lines)):
-      replin = re.sub(r'\d+',"%d"%(i+1),lines[mapp[i]],1)
-      diffslen = len(replin) - len(lines[i])
-      if diffslen < 0 :
-        replin = -diffslen*" " + replin
-      elif diffslen > 0:
-        replin = replin[diffslen:]
-      fout.write(replin)
-
-    while "[ bonds ]" not in line:
-      fout.write(line)
-      line = f.readline()
-
-    fout.write(line)
-    line = f.readline()
-
-    # write the bonds using the right labels
-    while "[ angles ]" not in line:
-      if not line.strip() or line.strip().startswith(";"):
-        fout.write(line)
-        line = f.readline()
-        continue
-
-      a1 = int(line.split()[0])-1
-      a2 = int(line.split()[1])-1
-
-      constants = ""
-      for val in line.split()[2:]:
-        constants += val+"\t"
+    lines = f.readlines()
 
-      fout.write("%5d %5d     %s\n" % (imapp[a1]+1,imapp[a2]+1,constants))
-      line = f.readline()
-
-    # write the angles
-    fout.write(line)
-    line = f.readline()
-    while "[ dihedrals ]" not in line:
-      if not line.strip() or line.strip().startswith(";"):
-        fout.write(line)
-        line = f.readline()
-        continue
-
-      a1 = int(line.split()[0])-1
-      a2 = int(line.split()[1])-1
-      a3 = int(line.split()[2])-1
-
-      constants = ""
-      for val in line.split()[3:]:
-        constants += val+"\t"
+  # split the .itp in the sections, the lines before the first are kept in the section None
+  sections = [[None, []]]
+  for line in lines:
+    if line.strip().startswith("["):
+      sections.append([line.split(";")[0].strip().strip("[] "), [line]])
+    else:
+      sections[-1][1].append(line)
 
-      fout.write("%5d %5d %5d    %s\n" % (imapp[a1]+1,imapp[a2]+1,imapp[a3]+1,constants))
-      line = f.readline()
+  fout = open("reordered_"+os.path.basename(itp), "w")
+  for name, slines in sections:
+    data = [i for i, line in enumerate(slines) if line.strip() and not line.strip().startswith((";", "["))]
 
-    # write the dihedrals
-    fout.write(line)
-    line = f.readline()
-    while "[ dihedrals ]" not in line and "[ pairs ]" not in line:
-      if not line.strip() or line.strip().startswith(";"):
-        fout.write(line)
-        line = f.readline()
-        continue
-
-      a1 = int(line.split()[0])-1
-      a2 = int(line.split()[1])-1
-      a3 = int(line.split()[2])-1
-      a4 = int(line.split()[3])-1
-
-      constants = ""
-      for val in line.split()[4:]:
-        constants += val+"\t"
-
-      fout.write("%5d %5d %5d %5d   %s\n" % (imapp[a1]+1,imapp[a2]+1,imapp[a3]+1,imapp[a4]+1,constants))
-      line = f.readline()
-
-    # write the dihedrals if necessary
-    if "[ dihedrals ]" in line:
-      fout.write(line)
-      line = f.readline()
-      while "[ pairs ]" not in line:
-        if not line.strip() or line.strip().startswith(";"):
-          fout.write(line)
-          line = f.readline()
-          continue
-
-        a1 = int(line.split()[0])-1
-        a2 = int(line.split()[1])-1
-        a3 = int(line.split()[2])-1
-        a4 = int(line.split()[3])-1
-
-        constants = ""
-        for val in line.split()[4:]:
-          constants += val+"\t"
-
-        fout.write("%5d %5d %5d %5d   %s\n" % (imapp[a1]+1,imapp[a2]+1,imapp[a3]+1,imapp[a4]+1,constants))
-        line = f.readline()
-
-    # write the pairs
-    fout.write(line)
-    line = f.readline()
-    while line:
-      if not line.strip() or line.strip().startswith(";"):
+    if name is None:
+      for line in slines:
+        if "GENERATED BY LigParGen Server" in line:
+          line = "; GENERATED BY LigParGen Server and reordered by reordered_ligpargen\n"
         fout.write(line)
-        line = f.readline()
-        continue
-
-      a1 = int(line.split()[0])-1
-      a2 = int(line.split()[1])-1
 
-      constants = ""
-      for val in line.split()[2:]:
-        constants += val+"\t"
+    elif name == "atoms" and data:
+      # write atoms in the right order, renumbered
+      atoms = [slines[i] for i in data]
+      fout.writelines(slines[:data[0]])
+      fout.writelines(renumber_atom_line(atoms[mapp[i]], i+1, len(atoms[i])) for i in range(len(atoms)))
+      isatom = set(data)
+      fout.writelines(line for i, line in enumerate(slines[data[0]:], data[0]) if i not in isatom)
+
+    elif name in ITP_SECTION_ATOMS and data:
+      # relabel the atoms of all the terms of the section at once
+      natoms = ITP_SECTION_ATOMS[name]
+      fields = [slines[i].split() for i in data]
+      idx = imapp[np.array([x[:natoms] for x in fields], dtype=int) - 1] + 1
+      relabeled = dict(zip(data, (ITP_FORMATS[natoms] % (tuple(atoms) + ("".join(val+"\t" for val in x[natoms:]),))
+                                  for atoms, x in zip(idx.tolist(), fields))))
+      fout.writelines(relabeled.get(i, line) for i, line in enumerate(slines))
 
-      fout.write("%5d %5d     %s\n" % (imapp[a1]+1,imapp[a2]+1,constants))
-      line = f.readline()
+    else:
+      fout.writelines(slines)
 
   fout.close()
 
@@ -215,14 +135,24 @@ if __name__ == '__main__':
   parser = argparse.ArgumentParser(description="Receives the original .pdb sent to LigParGen to reorder the output of LigParGen to have the atoms in the same order.")
   parser.add_argument("originalpdb", help="the original pdb uploaded to LigParGen")
   parser.add_argument("outgro", help="the .gro generated by LigParGen")
-  parser.add_argument("outitp", help="the .itp generated by LigParGen")
+  parser.add_argument("outitp", nargs="+", help="the .itp generated by LigParGen (or more than one, e.g. the different charge models, and other .gro of the same molecule)")
+  parser.add_argument("-m", "--mapping", help="file with the atom correspondence: read if it exists (the .pdb and .gro are not compared), otherwise written after the comparison")
   args = parser.parse_args()
 
   # map the indexes from one geometry to the others
-  mapping, imapping = get_atom_correspondence(args.originalpdb, args.outgro)
+  if args.mapping and os.path.isfile(args.mapping):
+    mapping, imapping = load_mapping(args.mapping)
+  else:
+    mapping, imapping = get_atom_correspondence(args.originalpdb, args.outgro)
+    if args.mapping:
+      save_mapping(args.mapping, mapping)
 
   # based on the map return the reordered .gro
   reorder_gro(args.outgro, mapping)
 
-  # now reorder the .itp
-  reorder_itp(args.outitp, mapping, imapping)
+  # now reorder the .itp files (and any other .gro)
+  for fname in args.outitp:
+    if fname.lower().endswith(".gro"):
+      reorder_gro(fname, mapping)
+    else:
+      reorder_itp(fname, mapping, imapping)
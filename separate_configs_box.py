@@ -2,47 +2,49 @@
 """
 Given the filename a xyz trajectory and the interval between each save,
 print a box configuration.
+Compressed trajectories (.gz, .bz2, .xz, .zst) can be read and written directly.
+
+The frames can also be chosen by a range, a list or windows of per-frame data
+(see diceframes.py), and are read directly from their offsets in the file.
 
 Author: Henrique Musseli Cezar
 Date: JUN/2018
 """
 
 import argparse
-import os
-
-def print_configs(fname, svint, nconfs, init):
-  with open(fname,'r') as f:
-    natoms = int(f.readline())
-    boxsize = natoms + 2
-    f.seek(0)
-
-    confnum = 1
-
-    #skip to the initial configuration
-    for _ in range(init*boxsize):
-      f.readline()
-
-    confnum += init
-
-    # loop to print nconfs configurations
-    for i in range(nconfs):
-      # skip svint-1 configurations
-      for j in range(svint-1):
-        for lnum in range(boxsize):
-          f.readline()
-
-      for lnum in range(boxsize):
-        line = f.readline()
-        print(line, end="")
+import sys
+from diceio import open_file
+from diceframes import add_selection_arguments, read_frames, selection_from_args
 
-      confnum += 1
+def print_configs(fname, selection, out=sys.stdout.buffer):
+  """
+  Write the frames of fname selected by selection (a FrameSelection) to out, opened in binary mode.
+  """
+  for frame, block in read_frames(fname, selection):
+    out.write(block)
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser(description="Separates configurations from a xyz trajectory")
   parser.add_argument("filename", help="the xyz file containing the trajectory")
-  parser.add_argument("svint", help="save interval (configuration will be saved each this number of steps)")
-  parser.add_argument("nconfs", help="number of configuration to be saved")
-  parser.add_argument("--init", help="initial configutation (default=0)", default=0)
+  parser.add_argument("svint", nargs="?", type=int, help="save interval (configuration will be saved each this number of steps)")
+  parser.add_argument("nconfs", nargs="?", type=int, help="number of configuration to be saved")
+  parser.add_argument("--init", help="initial configutation (default=0)", type=int, default=0)
+  parser.add_argument("-o", "--output", help="write to this file instead of stdout, compressed if it ends in .gz, .bz2, .xz or .zst")
+  add_selection_arguments(parser)
   args = parser.parse_args()
 
-  print_configs(args.filename, int(args.svint), int(args.nconfs), int(args.init))
+  if (args.svint is None) != (args.nconfs is None):
+    parser.error("give both svint and nconfs")
+
+  if args.svint is not None:
+    # after the initial configurations, the last of each group of svint configurations
+    first = args.init + args.svint - 1
+    selection = selection_from_args(args, first, first + args.nconfs*args.svint, args.svint)
+  else:
+    selection = selection_from_args(args)
+
+  if args.output:
+    with open_file(args.output, 'wb') as out:
+      print_configs(args.filename, selection, out)
+  else:
+    print_configs(args.filename, selection)
@@ -10,11 +10,8 @@ Date: MAY/2019
 import argparse
 import os
 import numpy as np
-import matplotlib as mpl
-mpl.use('Agg')
-import matplotlib.pyplot as plt
-from scipy.stats import binned_statistic
-from distutils.spawn import find_executable
+from dicedeps import mpl, plt
+from shutil import which
 
 if __name__ == '__main__':
   parser = argparse.ArgumentParser(description="Receives a .dat containing a set of dihedral angles and plot U_xs and U1_intra vs these dihedrals")
@@ -25,6 +22,8 @@ if __name__ == '__main__':
 
   args = parser.parse_args()
 
+  from scipy.stats import binned_statistic
+
   # read data into arrays
   dihedrals = np.loadtxt(args.dihfile)
   confs = np.loadtxt(args.ienfile, skiprows=1, usecols=(0), dtype=int)
@@ -43,7 +42,7 @@ if __name__ == '__main__':
         uxs = np.append(uxs, float(line.split()[2]))
 
   # plot it
-  if find_executable('latex') and find_executable('dvipng'):
+  if which('latex') and which('dvipng'):
     mpl.rcParams.update({'font.size':18, 'text.usetex':True, 'font.family':'serif', 'ytick.major.pad':4})
   else:
     mpl.rcParams.update({'font.size':18, 'font.family':'serif', 'ytick.major.pad':4})
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Analyses the solvation shell of the solute in each box of a DICE .xyz
+trajectory: the number of solvent molecules closer than a cutoff
+(coordination number), the closest solute-solvent distance and the hydrogen
+bonds between the solute and the solvent.
+
+The solute is the first molecule of its type (as in DICE) and the solvent is
+every other molecule of a type. The pairs of atoms are found with the cell
+lists of diceboxes.py, with periodic boundaries. The hydrogen bonds follow a
+geometric criterion: donor-acceptor distance below a cutoff and angle between
+the donor-hydrogen bond and the donor-acceptor line below a maximum. The
+donors are the hydrogens bonded (in the geometry of the .txt) to one of the
+acceptor elements (N, O and F by default).
+
+The frames are processed in parallel chunks and the results of each frame
+are written as soon as its chunk is done, so trajectories of any length can
+be analysed.
+"""
+
+import argparse
+import sys
+import numpy as np
+from diceboxes import BoxLayout, close_pairs, map_chunks, minimum_image, parse_box
+from diceframes import add_selection_arguments, read_frames, selection_from_args
+from diceio import open_file
+from get_solute_xyz import parse_selection
+
+COLUMNS = ["frame", "coordination", "closest", "hb_donated", "hb_accepted"]
+
+# largest length of a bond between a hydrogen and its donor
+DH_BOND = 1.3
+
+
+def donor_hydrogens(mol, elements):
+  """
+  Pairs (donor, hydrogen) of atoms (0-based) of the molecule mol of the .txt, with the donor being the atom closest to
+  the hydrogen if its atomic number is in elements.
+  """
+  pairs = []
+  z = mol.atomic_numbers
+  for h in np.nonzero(z == 1)[0]:
+    dist = np.linalg.norm(mol.coords - mol.coords[h], axis=1)
+    dist[h] = np.inf
+    d = int(np.argmin(dist))
+    if z[d] in elements and dist[d] <= DH_BOND:
+      pairs.append((d, int(h)))
+  return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+
+def count_hbonds(coords, box, donors, hydrogens, acceptors, distance, cosmin):
+  """
+  Number of hydrogen bonds between the donors (with the hydrogens of the same row) and the acceptors (atoms, 0-based).
+  """
+  if not len(donors) or not len(acceptors):
+    return 0
+  i, j, _ = close_pairs(coords[donors], coords[acceptors], box, distance)
+  if not len(i):
+    return 0
+  dh = minimum_image(coords[hydrogens[i]] - coords[donors[i]], box)
+  da = minimum_image(coords[acceptors[j]] - coords[donors[i]], box)
+  cos = np.sum(dh*da, axis=1) / (np.linalg.norm(dh, axis=1) * np.linalg.norm(da, axis=1))
+  return int(np.count_nonzero(cos >= cosmin))
+
+
+class Shell:
+  """
+  Atoms (0-based in the box) of the solute and of the solvent compared in each frame, and the criteria of the
+  analysis.
+  """
+
+  def __init__(self, layout, solute_type, solvent_type, solute_sites=None, solvent_sites=None, cutoff=3.5,
+               hb_distance=3.5, hb_angle=30., elements=(7, 8, 9)):
+    solute_mol = layout.molecules[solute_type-1]
+    solvent_mol = layout.molecules[solvent_type-1]
+    first = layout.first[solute_type-1]
+    size = layout.sizes[solvent_type-1]
+    # the solvent molecules, the solute excluded when both are of the same type
+    start = layout.first[solvent_type-1] + (size if solute_type == solvent_type else 0)
+    nsolv = layout.nmol[solvent_type-1] - (solute_type == solvent_type)
+    molecules = start + size*np.arange(nsolv)
+
+    solute_sites = np.arange(len(solute_mol)) if solute_sites is None else np.asarray(solute_sites)
+    solvent_sites = np.arange(size) if solvent_sites is None else np.asarray(solvent_sites)
+    self.solute = first + solute_sites
+    self.solvent = (molecules[:, None] + solvent_sites[None, :]).ravel()
+    self.molecule = np.repeat(np.arange(nsolv), len(solvent_sites))
+    self.cutoff = cutoff
+
+    elements = list(elements)
+    dh = donor_hydrogens(solute_mol, elements)
+    self.solute_donors, self.solute_hydrogens = first + dh[:, 0], first + dh[:, 1]
+    self.solute_acceptors = first + np.nonzero(np.isin(solute_mol.atomic_numbers, elements))[0]
+    dh = donor_hydrogens(solvent_mol, elements)
+    self.solvent_donors = (molecules[:, None] + dh[None, :, 0]).ravel()
+    self.solvent_hydrogens = (molecules[:, None] + dh[None, :, 1]).ravel()
+    acc = np.nonzero(np.isin(solvent_mol.atomic_numbers, elements))[0]
+    self.solvent_acceptors = (molecules[:, None] + acc[None, :]).ravel()
+    self.hb_distance = hb_distance
+    self.cosmin = np.cos(np.radians(hb_angle))
+
+  def analyze(self, coords, box):
+    """
+    Coordination number, closest distance, hydrogen bonds donated and accepted by the solute in a frame.
+    """
+    i, j, r = close_pairs(coords[self.solute], coords[self.solvent], box, self.cutoff)
+    coordination = len(np.unique(self.molecule[j]))
+    if len(r):
+      closest = r.min()
+    else:
+      # nothing inside the cutoff, compare all the pairs
+      d = minimum_image(coords[self.solute][:, None, :] - coords[self.solvent][None, :, :], box)
+      closest = np.sqrt(np.sum(d*d, axis=2)).min() if d.size else np.nan
+
+    donated = count_hbonds(coords, box, self.solute_donors, self.solute_hydrogens, self.solvent_acceptors, self.hb_distance, self.cosmin)
+    accepted = count_hbonds(coords, box, self.solvent_donors, self.solvent_hydrogens, self.solute_acceptors, self.hb_distance, self.cosmin)
+    return coordination, closest, donated, accepted
+
+
+def shell_chunk(task):
+  """
+  Rows (frame, coordination, closest, donated, accepted) of the frames of a chunk.
+  """
+  frames, shell = task
+  rows = np.zeros((len(frames), len(COLUMNS)))
+  for k, (frame, block) in enumerate(frames):
+    _, coords, box = parse_box(block)
+    if box is None:
+      raise ValueError("Frame %d has no box lengths (L =) in the comment line" % frame)
+    rows[k] = (frame,) + shell.analyze(coords, box)
+  return rows
+
+
+def chunks(frames, shell, size):
+  chunk = []
+  for item in frames:
+    chunk.append(item)
+    if len(chunk) == size:
+      yield chunk, shell
+      chunk = []
+  if chunk:
+    yield chunk, shell
+
+
+if __name__ == '__main__':
+  parser = argparse.ArgumentParser(description="Coordination number, closest distance and hydrogen bonds of the solute with the solvent in each box of a DICE .xyz trajectory.")
+  parser.add_argument("trajfile", help="the xyz trajectory with the whole boxes (with the box lengths in the comment lines)")
+  parser.add_argument("txtfile", help="the DICE .txt of the simulation")
+  parser.add_argument("nmol", type=int, nargs='+', help="number of molecules of each type of the .txt, in the order of the box")
+  parser.add_argument("--solute", type=int, default=1, help="molecule type (1-based) of the solute, its first molecule is used (default = 1)")
+  parser.add_argument("--solvent", type=int, default=None, help="molecule type (1-based) of the solvent (default = 2, or 1 if there is only one type)")
+  parser.add_argument("--solute-sites", help="atoms of the solute (1-based in the molecule) used for the coordination and closest distance, e.g. 1-5,8 (default = all)")
+  parser.add_argument("--solvent-sites", help="atoms of the solvent molecules (1-based in the molecule) used for the coordination and closest distance, e.g. 1 for the oxygen of water (default = all)")
+  parser.add_argument("-c", "--cutoff", type=float, default=3.5, help="solvent molecules with a site closer than this to a solute site are in the shell (default = 3.5)")
+  parser.add_argument("--hb-distance", type=float, default=3.5, help="largest donor-acceptor distance of a hydrogen bond (default = 3.5)")
+  parser.add_argument("--hb-angle", type=float, default=30., help="largest angle hydrogen-donor-acceptor of a hydrogen bond, in degrees (default = 30)")
+  parser.add_argument("--hb-elements", type=int, nargs='+', default=[7, 8, 9], help="atomic numbers of the donors and acceptors (default = 7 8 9)")
+  parser.add_argument("-nproc", "--nproc", type=int, default=None, help="number of processes (default = number of CPUs)")
+  parser.add_argument("--chunk", type=int, default=100, help="frames processed at once by each process (default = 100)")
+  parser.add_argument("-o", "--output", default="solvation_shell.dat", help="file with the results of each frame, compressed if it ends in .gz, .bz2, .xz or .zst (default = solvation_shell.dat)")
+  add_selection_arguments(parser)
+  args = parser.parse_args()
+
+  layout = BoxLayout(args.txtfile, args.nmol)
+  solvent = args.solvent or (2 if len(layout.sizes) > 1 else 1)
+  for t in (args.solute, solvent):
+    if not 0 < t <= len(layout.sizes):
+      sys.exit("There is no molecule type %d in %s" % (t, args.txtfile))
+  if (args.solute == solvent and layout.nmol[solvent-1] < 2) or not layout.nmol[args.solute-1]:
+    sys.exit("There are no solute and solvent molecules in the box")
+
+  shell = Shell(layout, args.solute, solvent,
+                parse_selection(args.solute_sites) if args.solute_sites else None,
+                parse_selection(args.solvent_sites) if args.solvent_sites else None,
+                args.cutoff, args.hb_distance, args.hb_angle, args.hb_elements)
+
+  frames = read_frames(args.trajfile, selection_from_args(args))
+  total = np.zeros(len(COLUMNS))
+  counts = {}
+  nframes = 0
+  with open_file(args.output, 'w') as out:
+    out.write("# " + "  ".join(COLUMNS) + "\n")
+    try:
+      for rows in map_chunks(shell_chunk, chunks(frames, shell, args.chunk), args.nproc):
+        np.savetxt(out, rows, fmt=["%d", "%d", "%.4f", "%d", "%d"])
+        total += np.nansum(rows, axis=0)
+        for n in rows[:, 1].astype(int).tolist():
+          counts[n] = counts.get(n, 0) + 1
+        nframes += len(rows)
+    except ValueError as e:
+      sys.exit(str(e))
+
+  if not nframes:
+    sys.exit("No frames were selected")
+
+  mean = total / nframes
+  print("%d frames written to %s" % (nframes, args.output))
+  print("Average coordination number: %.3f" % mean[1])
+  print("Average closest distance: %.4f" % mean[2])
+  print("Average hydrogen bonds donated by the solute: %.3f, accepted: %.3f" % (mean[3], mean[4]))
+  print("Coordination number distribution:")
+  for n in sorted(counts):
+    print("%5d %10.5f" % (n, counts[n] / nframes))
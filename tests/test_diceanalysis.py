@@ -0,0 +1,29 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diceanalysis
+
+
+class NonFiniteTest(unittest.TestCase):
+  def test_histogram_drops_the_overflowed_values(self):
+    n, bins, _, mean, std = diceanalysis.histogram(np.array([1., 2., np.nan, 3., np.inf]), 3)
+
+    np.testing.assert_allclose(n, [1/3., 1/3., 1/3.])
+    np.testing.assert_allclose(bins[[0, -1]], [1., 3.])
+    self.assertAlmostEqual(mean, 2.)
+    self.assertAlmostEqual(std, np.sqrt(2/3.))
+
+  def test_autocorrelation_drops_the_overflowed_values(self):
+    x = np.sin(np.arange(20.))
+
+    np.testing.assert_allclose(diceanalysis.estimated_autocorrelation(np.insert(x, 5, np.nan)),
+                               diceanalysis.estimated_autocorrelation(x))
+
+
+if __name__ == '__main__':
+  unittest.main()
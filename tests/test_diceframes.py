@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diceframes
+
+
+class ReadSeriesTest(unittest.TestCase):
+  def setUp(self):
+    tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(tmp.cleanup)
+    self.dir = tmp.name
+
+  def write_e12(self, nblocks, nsteps):
+    fname = os.path.join(self.dir, 'run.e12')
+    header = "NMOVE      E12       ELJ       ECL\n"
+    with open(fname, 'w') as f:
+      for block in range(nblocks):
+        f.write(header)
+        f.write("".join("%9d %9.3f %9.3f %9.3f\n" % (k+1, block*nsteps + k, -k, 2.*k) for k in range(nsteps)))
+    return fname
+
+  def test_joins_the_blocks_of_the_eij_files(self):
+    fname = self.write_e12(4, 50)
+
+    e12 = diceframes.read_series(fname, 'E12')
+
+    self.assertEqual(len(e12), 200)
+    np.testing.assert_array_equal(e12, np.arange(200.))
+    np.testing.assert_array_equal(diceframes.read_series(fname, 1)[49:52], [50., 1., 2.])
+
+  def test_window_of_a_multiblock_eij(self):
+    fname = self.write_e12(3, 10)
+
+    mask = diceframes.window_mask(diceframes.read_series(fname, 'E12'), 8, 12)
+
+    np.testing.assert_array_equal(np.flatnonzero(mask), [8, 9, 10, 11, 12])
+
+  def test_columns_without_labels(self):
+    fname = os.path.join(self.dir, 'phi.dat')
+    with open(fname, 'w') as f:
+      f.write("# frame phi\n0 10.5\n1 -20.\n2 30.\n")
+
+    np.testing.assert_array_equal(diceframes.read_series(fname), [10.5, -20., 30.])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dicereaders
+
+
+def write(directory, name, text):
+  fname = os.path.join(directory, name)
+  with open(fname, 'w') as f:
+    f.write(text)
+  return fname
+
+
+class LazyTableTest(unittest.TestCase):
+  def setUp(self):
+    tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(tmp.cleanup)
+    labels = ['c%d' % i for i in range(6)]
+    rows = np.arange(60, dtype=float).reshape(10, 6)
+    self.rows = rows
+    self.fname = write(tmp.name, 'wide.dst', ' '.join(labels) + '\n' + ''.join(' '.join('%.1f' % x for x in row) + '\n' for row in rows))
+    self.table = dicereaders.LazyTable(self.fname, labels, maxcols=2)
+
+  def test_one_column_parses_only_that_column(self):
+    with mock.patch('pandas.read_csv', wraps=pandas.read_csv) as read_csv:
+      column = self.table['c3']
+
+    self.assertEqual(read_csv.call_count, 1)
+    self.assertEqual(read_csv.call_args.kwargs['usecols'], [3])
+    np.testing.assert_array_equal(column.to_numpy(), self.rows[:, 3])
+    self.assertEqual(list(self.table.cache), ['c3'])
+
+  def test_keeps_the_columns_used_last(self):
+    with mock.patch('pandas.read_csv', wraps=pandas.read_csv) as read_csv:
+      self.table['c0']
+      self.table['c1']
+      self.table['c0']
+      self.table['c2']
+      self.assertEqual(read_csv.call_count, 3)
+      self.assertEqual(list(self.table.cache), ['c0', 'c2'])
+
+      self.table['c1']
+      self.assertEqual(read_csv.call_count, 4)
+
+  def test_skips_overflowed_and_blank_lines(self):
+    fname = write(os.path.dirname(self.fname), 'over.dst', 'a b\n1 2\n\n3 ****\r\n \t\n5 6\n')
+    table = dicereaders.LazyTable(fname, ['a', 'b'])
+
+    self.assertEqual(len(table), 2)
+    self.assertEqual(table['a'].tolist(), [1., 5.])
+    self.assertEqual(table['b'].tolist(), [2., 6.])
+
+
+class ReadHbdTest(unittest.TestCase):
+  def setUp(self):
+    tmp = tempfile.TemporaryDirectory()
+    self.addCleanup(tmp.cleanup)
+    line = "%29s%6d%7.2f%9.3f%9.3f%9.3f%9.3f%9.3f%9.3f%9.3f\n"
+    rows = [line % ("conf", i, i + .5, 1., 2., 3., 4., 5., 6., 7. + i) for i in range(5)]
+    rows[1] = rows[1][:60] + "*********" + rows[1][69:]
+    rows[3] = rows[3][:70] + "\n"
+    labels = ['L%d' % (i+1) for i in range(9)]
+    self.fname = write(tmp.name, 'x.hbd', "# criteria: r < 3.5\na b c d " + " ".join(labels) + "\n" + "".join(rows))
+
+  def test_decodes_only_the_requested_fields(self):
+    with mock.patch('dicereaders.decode_field', wraps=dicereaders.decode_field) as decode:
+      _, labels, data = dicereaders.read_hbd(self.fname, ['L2', 'L9'])
+
+    self.assertEqual(decode.call_count, 2)
+    self.assertEqual(len(labels), 9)
+    self.assertEqual(list(data.columns), ['L2', 'L9'])
+    self.assertEqual(data['L2'].tolist(), [.5, 2.5, 4.5])
+    self.assertEqual(data['L9'].tolist(), [7., 9., 11.])
+
+  def test_table_reads_the_plotted_columns(self):
+    table = dicereaders.HbdTable(self.fname)
+
+    with mock.patch('dicereaders.read_hbd', wraps=dicereaders.read_hbd) as read:
+      plotted = table[['L1', 'L2']]
+      table['L1']
+
+    self.assertEqual(read.call_count, 1)
+    self.assertEqual(read.call_args.args[1], ['L1', 'L2'])
+    self.assertEqual(plotted['L1'].tolist(), [0., 2., 4.])
+    self.assertEqual(len(table), 3)
+
+
+if __name__ == '__main__':
+  unittest.main()
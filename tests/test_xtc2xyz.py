@@ -0,0 +1,116 @@
+import io
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import xtc2xyz
+
+
+class FakeFrame:
+    def __init__(self, step, box, x, hasx=True):
+        self.step = step
+        self.box = np.diag(box).astype(np.float32)
+        self.x = np.asarray(x, dtype=np.float32)
+        self.hasx = hasx
+
+
+class FakeXDRFile:
+    """Stands for the XTCFile and TRRFile of MDAnalysis, reading the frames of FRAMES"""
+
+    FRAMES = []
+
+    def __init__(self, fname):
+        self.pos = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __len__(self):
+        return len(self.FRAMES)
+
+    def seek(self, frame):
+        self.pos = frame
+
+    def read(self):
+        frame = self.FRAMES[self.pos]
+        self.pos += 1
+        return frame
+
+
+def parse_xyz(text):
+    """Split a DICE xyz trajectory in its configuration numbers, box dimensions and coordinates"""
+    lines = text.splitlines()
+    frames = []
+    while lines:
+        natoms = int(lines[0])
+        comment = lines[1]
+        confnum = int(comment.split(":")[1].split("L")[0])
+        dims = [float(x) for x in comment.split("=")[1].split()]
+        coords = np.array([line.split()[1:] for line in lines[2 : 2 + natoms]], dtype=float)
+        frames.append((confnum, dims, coords))
+        lines = lines[2 + natoms :]
+    return frames
+
+
+class ConvertTest(unittest.TestCase):
+    def setUp(self):
+        self.frames = [
+            FakeFrame(100, [2.0, 3.0, 4.0], [[0.1, 0.2, 0.3], [1.0, 1.5, 2.0]]),
+            FakeFrame(200, [2.0, 3.0, 4.0], [[0.0, 0.0, 0.0], [0.0, 0.0, 0.0]], hasx=False),
+            FakeFrame(300, [2.0, 3.0, 4.0], [[2.0, 3.0, 4.0], [0.5, 0.5, 0.5]]),
+        ]
+        FakeXDRFile.FRAMES = self.frames
+
+        libmdaxdr = types.ModuleType("MDAnalysis.lib.formats.libmdaxdr")
+        libmdaxdr.XTCFile = libmdaxdr.TRRFile = FakeXDRFile
+        modules = {
+            "MDAnalysis": types.ModuleType("MDAnalysis"),
+            "MDAnalysis.lib": types.ModuleType("MDAnalysis.lib"),
+            "MDAnalysis.lib.formats": types.ModuleType("MDAnalysis.lib.formats"),
+            "MDAnalysis.lib.formats.libmdaxdr": libmdaxdr,
+        }
+        patches = [mock.patch.dict(sys.modules, modules), mock.patch.object(xtc2xyz, "BACKEND", "MDAnalysis")]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def convert(self, trjname="traj.trr", **kwargs):
+        out = io.BytesIO()
+        xtc2xyz.convert(trjname, out, 2, ["C", "O"], **kwargs)
+        return parse_xyz(out.getvalue().decode())
+
+    def test_scales_to_angstrom_and_centers_the_box(self):
+        confnum, dims, coords = self.convert()[0]
+
+        self.assertEqual(confnum, 100)
+        np.testing.assert_allclose(dims, [20.0, 30.0, 40.0])
+        np.testing.assert_allclose(coords, [[-9.0, -13.0, -17.0], [0.0, 0.0, 0.0]], atol=1e-4)
+
+    def test_skips_trr_frames_without_coordinates(self):
+        frames = self.convert()
+
+        self.assertEqual([f[0] for f in frames], [100, 300])
+        np.testing.assert_allclose(frames[1][2], [[10.0, 15.0, 20.0], [-5.0, -10.0, -15.0]], atol=1e-4)
+
+    def test_reset_step_numbers_the_frames_of_the_trajectory(self):
+        self.assertEqual([f[0] for f in self.convert(reset_step=True)], [1, 3])
+        self.assertEqual([f[0] for f in self.convert(start=2, reset_step=True)], [3])
+        self.assertEqual([f[0] for f in self.convert("traj.xtc", intv=2)], [100, 300])
+
+    def test_wrong_number_of_atoms(self):
+        out = io.BytesIO()
+        with self.assertRaises(xtc2xyz.IncorrectNumberOfAtomsOnTrajectory):
+            xtc2xyz.convert("traj.xtc", out, 3, ["C", "O", "H"])
+
+
+if __name__ == "__main__":
+    unittest.main()
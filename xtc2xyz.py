@@ -0,0 +1,214 @@
+import argparse as arg
+import importlib.util
+import os
+import sys
+
+import numpy as np
+
+from diceio import open_file
+from pdb2xyz import check_slice, check_txt, format_frame, frame_template, get_elements, read_txt
+from pdb2xyz import IncorrectNumberOfAtomsOnTrajectory
+
+
+def find_backend():
+    """Find the library used to read the trajectories without importing it
+
+    Returns:
+        str: "MDAnalysis", "mdtraj" or None if neither is installed
+    """
+    for name in ("MDAnalysis", "mdtraj"):
+        if importlib.util.find_spec(name) is not None:
+            return name
+    return None
+
+
+BACKEND = find_backend()
+
+
+DESCRIPTION = """***********************************************************************
+
+Convert GROMACS trajectory file in xtc or trr format to a DICE xyz file format
+without the intermediate pdb file
+
+Reading the trajectories requires MDAnalysis or mdtraj
+
+***********************************************************************"""
+
+NM_TO_ANGSTROM = 10.0
+
+
+def read_frames(trjname, start=1, final=2147483647, intv=1):
+    """Read the frames start, start + intv, ..., up to final of a xtc or trr trajectory
+
+    Args:
+        trjname (str): name of the xtc or trr trajectory file
+        start (int, optional): first frame to be read. Defaults to 1.
+        final (int, optional): last frame to be considered. Defaults to 2147483647.
+        intv (int, optional): interval between the frames. Defaults to 1.
+
+    Raises:
+        ValueError: when the extension is not xtc or trr
+        ImportError: when neither MDAnalysis nor mdtraj are installed
+
+    Yields:
+        tuple: frame number, step, box dimensions and coordinates (in nm), skipping the trr frames
+               without coordinates
+    """
+    ext = os.path.splitext(trjname)[1].lower()
+    if ext not in (".xtc", ".trr"):
+        raise ValueError(trjname, "The trajectory should be a xtc or trr file")
+
+    if BACKEND == "MDAnalysis":
+        from MDAnalysis.lib.formats.libmdaxdr import TRRFile, XTCFile
+
+        trj = XTCFile(trjname) if ext == ".xtc" else TRRFile(trjname)
+        with trj:
+            nframes = len(trj)  # builds the offsets, so the seeks below are direct
+            for frame in range(start, min(final, nframes) + 1, intv):
+                trj.seek(frame - 1)
+                fr = trj.read()
+                if not getattr(fr, "hasx", True):  # trr frames may have only velocities or forces
+                    continue
+                yield frame, fr.step, np.diag(fr.box), fr.x
+
+    elif BACKEND == "mdtraj":
+        from mdtraj.formats import TRRTrajectoryFile, XTCTrajectoryFile
+
+        trj = XTCTrajectoryFile(trjname, "r") if ext == ".xtc" else TRRTrajectoryFile(trjname, "r")
+        with trj:
+            nframes = len(trj)
+            for frame in range(start, min(final, nframes) + 1, intv):
+                trj.seek(frame - 1)
+                xyz, _, step, box = trj.read(1)[:4]
+                yield frame, step[0], np.diag(box[0]), xyz[0]
+
+    else:
+        raise ImportError("MDAnalysis or mdtraj is needed to read xtc and trr files")
+
+
+def convert(trjname, xyzfile, natoms, elements, start=1, final=2147483647, intv=1, reset_step=False):
+    """Convert the frames start, start + intv, ..., up to final of the xtc or trr trajectory
+
+    Args:
+        trjname (str): name of the xtc or trr trajectory file
+        xyzfile (file): xyz output file opened in binary mode
+        natoms (int): number of atoms in the configuration
+        elements (list): list with the elements in the same order from the txt file
+        start (int, optional): first frame to be converted. Defaults to 1.
+        final (int, optional): last frame to be considered. Defaults to 2147483647.
+        intv (int, optional): interval between the converted frames. Defaults to 1.
+        reset_step (bool, optional): if False the configuration number is the step from the trajectory.
+                                     Otherwise the frame number is used. Defaults to False.
+
+    Raises:
+        IncorrectNumberOfAtomsOnTrajectory: raised when the number of atoms provided differs from the trajectory
+    """
+    template = frame_template(elements)
+
+    for frame, step, dims, coords in read_frames(trjname, start, final, intv):
+        if len(coords) != natoms:
+            raise IncorrectNumberOfAtomsOnTrajectory()
+
+        dims = dims.astype(float) * NM_TO_ANGSTROM
+        coords = coords.astype(float) * NM_TO_ANGSTROM
+        coords -= dims / 2  # put the center of the box in the origin
+
+        xyzfile.write(format_frame(frame if reset_step else int(step), dims, coords, template))
+
+
+if __name__ == "__main__":
+    parser = arg.ArgumentParser(
+        description=DESCRIPTION,
+        formatter_class=arg.RawDescriptionHelpFormatter,
+        add_help=False,
+    )
+
+    grp_input = parser.add_argument_group("Input arguments")
+
+    grp_output = parser.add_argument_group(
+        "Output arguments",
+        description="""The init, final or intv should receive the frame number
+        not the time step (only accepts integer positive numbers) """,
+    )
+
+    information = parser.add_argument_group("Informational arguments")
+
+    grp_input.add_argument("trj", help="name of xtc or trr GROMACS trajectory file")
+
+    grp_input.add_argument(
+        "txt", type=arg.FileType("r"), help="name of txt DICE topology file"
+    )
+
+    grp_input.add_argument(
+        "nmol",
+        type=int,
+        nargs="+",
+        help="""quantity of molecules of each type in the same order
+        as the txt file. Example: 1 1000 (if the system has 2 types)""",
+    )
+
+    grp_output.add_argument(
+        "-o",
+        default="output.xyz",
+        help="""name of xyz trajectory file in DICE format, compressed if it ends in .gz, .bz2,
+        .xz or .zst (default: output.xyz)""",
+        metavar="name",
+    )
+
+    grp_output.add_argument(
+        "-r", action="store_true", help="renumbers the frames of the trajectory from 1"
+    )
+
+    grp_output.add_argument(
+        "-init",
+        type=int,
+        nargs=1,
+        default=[1],
+        help="first frame to be printed (default: 1)",
+        metavar="#",
+    )
+
+    grp_output.add_argument(
+        "-final",
+        type=int,
+        nargs=1,
+        default=[-1],
+        help="last frame to be considered (default: last frame of the trajectory)",
+        metavar="#",
+    )
+
+    grp_output.add_argument(
+        "-intv",
+        type=int,
+        nargs=1,
+        default=[1],
+        help="interval between the frames to be printed (default: 1)",
+        metavar="#",
+    )
+
+    information.add_argument(
+        "-h", "--help", action="help", help="show this help message and exit"
+    )
+    information.add_argument(
+        "-v", "--version", action="version", version="%(prog)s 1.0"
+    )
+
+    args = parser.parse_args()
+
+    if BACKEND is None:
+        print("MDAnalysis or mdtraj is needed to read xtc and trr files. Aborting.")
+        sys.exit(1)
+
+    check_txt(args.txt, args.nmol)
+
+    el = get_elements(args.nmol, read_txt(args.txt))
+
+    start, final, intv = args.init[0], args.final[0], args.intv[0]
+
+    if final == -1:
+        final = 2147483647 # giant number to be considered as final if no argument is given
+
+    check_slice(start, final, intv, 1)
+
+    with open_file(args.o, "wb") as xyz:
+        convert(args.trj, xyz, len(el), el, start, final, intv, args.r)